@@ -22,234 +22,28 @@
 # Common functions for the XTool post processor
 #    export_xtool() returns gcode and an xcs project
 #
+# This is the FreeCAD side. The toolpath work is done in xtool_path.py
+#
 # parts leveraged from linuxcnc_post.py, refactored_linuxcnc_post.py
 #    Copyright (c) 2014 sliptonic <shopinthewoods@gmail.com>
 #    Copyright (c) 2022 Larry Woestman <LarryWoestman2@gmail.com>
 #
 
 import FreeCAD
-from FreeCAD import Units
-from FreeCAD import Vector
 import Path.Post.UtilsArguments as PostUtilsArguments
 
-import Path
-import Path.Geom as PathGeom
-import math
+import contextlib
+import hashlib
+import io
+import os
+import sys
+import time
 
 import xtool_xcs as xt
-
-# needed for fclps() and svgnum()
-PRECISION = ''
-UNIT_FORMAT = ''
-
-# p1, p2, c are vector objects
-def gcode_arc(cmd, p1):
-    p2 = PathGeom.commandEndPoint(cmd, p1)
-    c  = p1 + PathGeom.commandEndPoint(cmd, Vector(0, 0, 0), "I", "J", "K")
-
-    r1 = (p1 - c)
-    r2 = (p2 - c)
-    rad = r1.Length
-
-    a1 = math.atan2(r1.y, r1.x)
-    a2 = math.atan2(r2.y, r2.x)
-
-    if cmd.Name in ['G3', 'G03',]:
-        # CCW
-        tarc = a2 - a1
-        if tarc < 0:
-            tarc += 2 * math.pi
-    else:
-        # CW
-        tarc = a2 - a1
-        if tarc > 0:
-            tarc -= 2 * math.pi
-
-    # chord_err = rad * (1 - cos(arcstep/2))
-    # arcstep = 2 * acos(1 - chord_err / rad)
-    chord_err = 0.01
-    arcstep = 2 * math.acos(1 - chord_err / rad)
-
-    n = int(abs(tarc / arcstep))
-    n = max(n, 2)
-    n = min(n, 128)
-    segs = []
-    for i in range(1, n):
-        a = a1 + tarc * float(i) / float(n-1);
-        x = c.x + rad * math.cos(a)
-        y = c.y + rad * math.sin(a)
-        segs.append(f'G1 X{fculps(x, "X")} Y{fculps(y, "Y")}')
-
-    return segs
-
-
-def svg_finish_path(dout, svg, feed, power, bound):
-    # capture path only if it draws something
-    if not "L" in svg:
-        return
-
-    dout['svgps'].append({'svg' : svg, 'feed' : feed, 'power' : power,
-                          'xmin' : min(bound['x']),
-                          'xmax' : max(bound['x']),
-                          'ymin' : min(bound['y']),
-                          'ymax' : max(bound['y']),
-                        })
-
-    # update the global bounding box
-    tail = len(dout['svgps']) - 1
-    dout['glob_bound']['x'].append(dout['svgps'][tail]['xmin'])
-    dout['glob_bound']['x'].append(dout['svgps'][tail]['xmax'])
-    dout['glob_bound']['y'].append(dout['svgps'][tail]['ymax'])
-    dout['glob_bound']['y'].append(dout['svgps'][tail]['ymin'])
-
-    print(dout['svgps'][tail])
-
-
-def svg_move(cmd, startPoint, bound):
-    endPoint = PathGeom.commandEndPoint(cmd, startPoint)
-    return "M" + svgnum(endPoint.x) + " " + svgnum(-endPoint.y)
-
-
-def svg_line(cmd, startPoint, bound):
-    endPoint = PathGeom.commandEndPoint(cmd, startPoint)
-
-    bound['x'].append(startPoint.x)
-    bound['y'].append(-startPoint.y)
-    bound['x'].append(endPoint.x)
-    bound['y'].append(-endPoint.y)
-
-    return " L" + svgnum(endPoint.x) + " " + svgnum(-endPoint.y)
-
-
-# https://www.w3.org/TR/SVG/implnote.html#ArcImplementationNotes
-# section B.2.3
-# for vector class:
-#   https://github.com/FreeCAD/FreeCAD/blob/master/src/Base/VectorPy.xml
-#   https://github.com/FreeCAD/FreeCAD/blob/master/src/Base/VectorPyImp.cpp
-#
-# p1, p2, c are vector objects
-def svg_arc(cmd, p1, bound):
-    p2 = PathGeom.commandEndPoint(cmd, p1)
-    c  = p1 + PathGeom.commandEndPoint(cmd, Vector(0, 0, 0), "I", "J", "K")
-
-    r = (p1 - c)
-    rad = svgnum(r.Length)
-    ca = (c - p1).normalize()
-    cb = (c - p2).normalize()
-
-    # cross prod = mag(ra) * mag(rb) * sin( angle(bac) )
-    cp = Vector.cross(ca, cb).z
-
-    # four possible ways to "arc" from p1 to p2:
-    # CCW, small angle, cp will be positive
-    #      large angle, cp will be negative
-    # CW,  small angle, cp will be negative
-    #      large angle, cp will be positive
-
-    # svg arc: A radx rady rot fa fs X Y
-    #
-    # svg arcs are elliptical.
-    # rot is rotation of the ellipse
-    #
-    # four possible paths from p1 to p2
-    # fa 1 large arc
-    #    0 small arc
-    # fs 1 sweep rigth, cw
-    #    0 sweep left, ccw
-    # note that the SVG plane is flipped about the x axis
-    # so cw -> ccw, ccw -> cw
-
-    #  A radx rady
-    s = " A" + " " + rad + " " + rad
-
-    # rot fa fs
-    # rot is always 0 since we do circles only
-    if cmd.Name in ['G3', 'G03',]:
-        # CW because Y-axis is inverted for svg
-        if(cp > 0):
-           s += " 0 0 0 "
-        else:
-           s += " 0 1 0 "
-    else:
-        # CCW because Y-axis is inverted for svg
-        if(cp < 0):
-           s += " 0 0 1 "
-        else:
-           s += " 0 1 1 "
-
-    #  x y
-    s += svgnum(p2.x) + " " + svgnum(-p2.y)
-
-    # -------------------
-    # bounding box
-    x = Vector(1,0,0)
-    y = Vector(0,1,0)
-    if cmd.Name in ['G3', 'G03',]:
-        # CW because Y-axis is inverted for svg
-        aax = cb.getAngle(x)
-        abx = ca.getAngle(x)
-        aay = cb.getAngle(y)
-        aby = ca.getAngle(y)
-    else:
-        # CCW because Y-axis is inverted for svg
-        aax = ca.getAngle(x)
-        abx = cb.getAngle(x)
-        aay = ca.getAngle(y)
-        aby = cb.getAngle(y)
-
-    if(aax <= 0 and abx >= 0 ):
-        xmax = 1
-    else:
-        xmax = max(ca.dot(x), cb.dot(x))
-
-    if(aax >= 0 and abx >= 0 ):
-        xmin = -1
-    else:
-        xmin = min(ca.dot(x), cb.dot(x))
-
-    if(aay <= 0 and aby >= 0 ):
-        ymax = 1
-    else:
-        ymax = max(ca.dot(y), cb.dot(y))
-
-    if(aay >= 0 and aby >= 0 ):
-        ymin = -1
-    else:
-        ymin = min(ca.dot(y), cb.dot(y))
-
-    bound['x'].append(xmin * r.Length + c.x)
-    bound['x'].append(xmax * r.Length + c.x)
-    bound['y'].append(-ymin * r.Length + -c.y)
-    bound['y'].append(-ymax * r.Length + -c.y)
-    # -------------------
-
-    # debug, just a line
-    #s = " L" + svgnum(p2.x) + " " + svgnum(p2.y)
-    return s
-
-def svgnum(val):
-    global PRECISION
-    global UNIT_FORMAT
-    precision_string = "." + str(PRECISION) + "f"
-    pos = Units.Quantity(val, FreeCAD.Units.Length)
-    return format( float(pos.getValueAs(UNIT_FORMAT)), precision_string)
-
-def fculps(val, key):
-    global PRECISION
-    global UNIT_FORMAT
-    precision_string = "." + str(PRECISION) + "f"
-    pos  = Units.Quantity(val, FreeCAD.Units.Length)
-    if key == 'Y':
-       pos = -pos
-    return format(float(pos.getValueAs(UNIT_FORMAT)), precision_string)
-
-def linenumber(values):
-    LINENR = values["LINENR"]
-    if values["OUTPUT_LINE_NUMBERS"] is True:
-        LINENR += 10
-        return "N" + str(LINENR) + " "
-    values["LINENR"] = LINENR
-    return ""
+import xtool_path as xp
+import xtool_cache
+import xtool_optimize
+from xtool_path import Bound, linenumber
 
 #def init_xtool_values(values: Values) -> None:
 def init_xtool_values(values):
@@ -330,14 +124,353 @@ M18 (disable steppers)
 
     values["LINENR"] = 100
 
-    # needed for fclps() and svgnum()
-    global PRECISION
-    global UNIT_FORMAT
-    PRECISION = values["AXIS_PRECISION"]
-    UNIT_FORMAT = values["UNIT_FORMAT"]
+    # number of worker processes used to parse operations, see post_operations()
+    values["JOBS"] = 1
+
+    # reuse results of unchanged operations from the last post
+    values["INCREMENTAL"] = True
+
+    # on disk cache of parsed operations, see xtool_cache.py
+    # CACHE_DIR None is ~/.cache/xtool_xcs, CACHE_SIZE is in MB
+    values["CACHE"] = False
+    values["CACHE_DIR"] = None
+    values["CACHE_SIZE"] = 256
+
+    # make the G-code and the svg of each path at the same time, in
+    # "thread"s or worker "process"es, None is off. See
+    # xtool_path.pipeline_parse(). Uses JOBS workers, at least 2.
+    values["PIPELINE"] = None
+
+    # the G-code and xcs posts share one export pass, see export_shared()
+    values["SHARE_EXPORT"] = True
+
+    # fit svg arcs to runs of G1 moves, in mm. 0 is off.
+    values["SVG_ARC_TOLERANCE"] = 0.0
+
+    # cut the paths of an operation in the order with the least rapid
+    # travel, holes before their outline. See xtool_path.order_commands()
+    values["ORDER_PATHS"] = False
+
+    # leave out G0 and G1 moves that go nowhere after rounding to
+    # AXIS_PRECISION. See xtool_path.dedup_table()
+    values["DEDUP"] = False
+
+    # print the estimated run time, see xtool_estimate.py
+    values["ESTIMATE"] = False
+
+    # time the phases of the post, see xtool_xcs.XcsProfiler
+    # PROFILE is None or one of xtool_xcs.PROFILE_MODES,
+    # PROFILE_OUTPUT a file for the json report
+    values["PROFILE"] = None
+    values["PROFILE_OUTPUT"] = None
+
+    # split big jobs over several canvases, see xtool_path.split_elements()
+    # Limits per canvas, 0 is no limit. SPLIT_LENGTH is mm of cut.
+    # SPLIT_FILES is None or a file name to save each canvas to a project
+    # of its own, name_1.xcs, name_2.xcs ...
+    values["SPLIT_ELEMENTS"] = 0
+    values["SPLIT_LENGTH"] = 0.0
+    values["SPLIT_BYTES"] = 0
+    values["SPLIT_FILES"] = None
+
+    # xTool Creative Space version of the project, one of xtool_xcs.XCS_VERSIONS
+    values["XCS_VERSION"] = xt.XCS_VERSION
+
+    # shrink the G-code, see xtool_optimize.py. Tolerance is in mm.
+    values["OPTIMIZE"] = False
+    values["OPTIMIZE_TOLERANCE"] = xtool_optimize.DEFAULT_TOLERANCE
+
+    # needed for fculps() and svgnum()
+    xp.init_format(values)
+
+
+# Arguments shared by xtoolgcode_post and xtoolxcs_post
+def init_xtool_arguments(parser, values):
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=values["JOBS"],
+        help="Number of worker processes used to parse operations, default is 1",
+    )
+    parser.add_argument(
+        "--pipeline",
+        nargs="?",
+        const="process",
+        default=values["PIPELINE"],
+        choices=["thread", "process"],
+        help="Make the G-code and the xcs at the same time in worker processes or threads, "
+        "default mode is process",
+    )
+    parser.add_argument(
+        "--no-incremental",
+        action="store_true",
+        default=not values["INCREMENTAL"],
+        help="Parse every operation again, even if it did not change since the last post",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        default=values["CACHE"],
+        help="Reuse parsed operations from an on disk cache",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=values["CACHE_DIR"],
+        help="Cache directory, default is ~/.cache/xtool_xcs",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=float,
+        default=values["CACHE_SIZE"],
+        help="Cache size limit in MB, least recently used entries are removed first",
+    )
+    parser.add_argument(
+        "--no-share-export",
+        action="store_true",
+        default=not values["SHARE_EXPORT"],
+        help="Export again instead of reusing the output of the other xtool post for the same job",
+    )
+    parser.add_argument(
+        "--svg-arc-tolerance",
+        type=float,
+        default=values["SVG_ARC_TOLERANCE"],
+        help="Draw runs of G1 moves that follow a circle within this many mm as svg arcs, default is 0, off",
+    )
+    parser.add_argument(
+        "--order-paths",
+        action="store_true",
+        default=values["ORDER_PATHS"],
+        help="Reorder the paths of each operation for less rapid travel, inside paths first",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        default=values["DEDUP"],
+        help="Leave out moves that go nowhere after rounding to the axis precision",
+    )
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        default=values["ESTIMATE"],
+        help="Print cut and travel length and estimated run time per operation",
+    )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        default=values["OPTIMIZE"],
+        help="Merge straight G1 runs, drop zero length and Z only moves and repeated F and S words",
+    )
+    parser.add_argument(
+        "--optimize-tolerance",
+        type=float,
+        default=values["OPTIMIZE_TOLERANCE"],
+        help="How far in mm merged G1 moves may stray from a straight line, default is 0.01",
+    )
+    parser.add_argument(
+        "--split-elements",
+        type=int,
+        default=values["SPLIT_ELEMENTS"],
+        help="Start a new canvas after this many elements, default is 0, no limit",
+    )
+    parser.add_argument(
+        "--split-length",
+        type=float,
+        default=values["SPLIT_LENGTH"],
+        help="Start a new canvas after this many mm of cut, default is 0, no limit",
+    )
+    parser.add_argument(
+        "--split-bytes",
+        type=float,
+        default=values["SPLIT_BYTES"] / 1e6,
+        help="Start a new canvas when it would go over this many MB of xcs, default is 0, no limit",
+    )
+    parser.add_argument(
+        "--split-files",
+        default=values["SPLIT_FILES"],
+        help="Save each canvas as a project of its own, name_1.xcs, name_2.xcs ... "
+        "The post output is the first one",
+    )
+    parser.add_argument(
+        "--xcs-version",
+        default=values["XCS_VERSION"],
+        choices=list(xt.XCS_VERSIONS),
+        help=f"xTool Creative Space version to write the project for, default is {values['XCS_VERSION']}",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="time",
+        default=values["PROFILE"],
+        choices=xt.PROFILE_MODES,
+        help="Time the phases of the post and print a report. "
+        "tracemalloc also tracks memory, cprofile profiles every function. Default mode is time",
+    )
+    parser.add_argument(
+        "--profile-output",
+        default=values["PROFILE_OUTPUT"],
+        help="Write the profile report as json to this file, cprofile stats go to file.prof",
+    )
+    return parser
+
+
+def process_xtool_arguments(values, args):
+    values["JOBS"] = args.jobs
+    values["PIPELINE"] = args.pipeline
+    values["INCREMENTAL"] = not args.no_incremental
+    values["CACHE"] = args.cache or args.cache_dir is not None
+    values["CACHE_DIR"] = args.cache_dir
+    values["CACHE_SIZE"] = args.cache_size
+    values["SHARE_EXPORT"] = not args.no_share_export
+    values["SVG_ARC_TOLERANCE"] = args.svg_arc_tolerance
+    values["ORDER_PATHS"] = args.order_paths
+    values["DEDUP"] = args.dedup
+    values["ESTIMATE"] = args.estimate
+    values["OPTIMIZE"] = args.optimize
+    values["OPTIMIZE_TOLERANCE"] = args.optimize_tolerance
+    values["SPLIT_ELEMENTS"] = args.split_elements
+    values["SPLIT_LENGTH"] = args.split_length
+    values["SPLIT_BYTES"] = int(args.split_bytes * 1e6)
+    values["SPLIT_FILES"] = args.split_files
+    values["XCS_VERSION"] = args.xcs_version
+    values["PROFILE"] = args.profile
+    values["PROFILE_OUTPUT"] = args.profile_output
+
+
+def print_values(values):
+    for name in values:
+       print(f'{name:25s}  {values[name]}')
+
+
+# Pick up edits to the helper modules without restarting FreeCAD.
+# xtool_cache is left alone, it holds the session.
+def reload_modules():
+    import importlib
+    importlib.reload(xt)
+    importlib.reload(xp)
+    importlib.reload(sys.modules[__name__])
+
+
+# Since FreeCAD 1.0 the G-code and the xcs come from two posts run one
+# after the other on the same job. The first one exports both and keeps
+# them in the session, the second one returns them if the job and the
+# arguments did not change.
+def export_shared(values, objectslist, filename):
+    if not values.get("PROFILE"):
+        return export_reuse(values, objectslist, filename)
+
+    prof = xt.profile_start(values["PROFILE"])
+    prof.wrap(xp, PROFILE_FUNCTIONS)
+    try:
+        return export_reuse(values, objectslist, filename)
+    finally:
+        xt.profile_stop()
+        print(prof.report())
+        if values.get("JOBS", 1) > 1:
+            print("profile: operations parsed in worker processes are not in the phases")
+        if values.get("PROFILE_OUTPUT"):
+            prof.save(values["PROFILE_OUTPUT"])
+            print(f'profile: saved to {values["PROFILE_OUTPUT"]}')
+
+
+# xtool_path functions timed with --profile. Each call pays for its timer,
+# so the profiled post runs slower than a normal one.
+PROFILE_FUNCTIONS = ["fculps", "svgnum", "gcode_arc", "svg_arc", "arc_bound"]
+
+
+def export_reuse(values, objectslist, filename):
+    if not values.get("SHARE_EXPORT", False):
+        return export_xtool(values, objectslist, filename)
+
+    key = job_fingerprint(values, objectslist, filename)
+    out = xtool_cache.SESSION.get_export(key)
+    if out is not None:
+        print("postprocessing... same job as the last post, reusing its output")
+        return out
+
+    out = export_xtool(values, objectslist, filename)
+    if out is not None:
+        xtool_cache.SESSION.put_export(key, out)
+    return out
+
+
+# Everything export_xtool() looks at: the values, the filename and for
+# every object its commands and the properties used for the pre and post
+# operation blocks.
+def job_fingerprint(values, objectslist, filename):
+    h = hashlib.sha256()
+    h.update(xtool_cache.code_hash().encode())
+    h.update(repr(sorted(values.items())).encode())
+    h.update(repr(filename).encode())
+    for obj in objectslist:
+        props = [getattr(obj, "Name", None), getattr(obj, "Label", None),
+                 getattr(obj, "Active", None), getattr(obj, "CoolantMode", None),
+                 hasattr(obj, "Path")]
+        base = getattr(obj, "Base", None)
+        props += [getattr(base, "Active", None), getattr(base, "CoolantMode", None)]
+        h.update(repr(props).encode())
+        op_content(obj, h)
+    return h.hexdigest()
 
 
 def export_xtool(values, objectslist, filename):
+    if not values.get("PIPELINE"):
+        return export_job(values, objectslist, filename)
+    with pipeline_pool(values) as pool:
+        return export_job(values, objectslist, filename, pool)
+
+
+# Executor of the pipeline, see xtool_path.pipeline_parse()
+def pipeline_pool(values):
+    import concurrent.futures
+    workers = max(2, values.get("JOBS", 1))
+    if values["PIPELINE"] == "thread":
+        return concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    ctx = process_context()
+    if ctx is None:
+        print("pipeline: no python interpreter for worker processes, using threads")
+        return concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+
+
+# Worker processes that are not forked start a new interpreter, by
+# default sys.executable. Inside FreeCAD that is the FreeCAD binary, so
+# look for the python FreeCAD comes with:
+#   Windows   FreeCAD/bin/python.exe next to FreeCAD.exe
+#   macOS     FreeCAD.app/Contents/Resources/bin/python
+#   Linux     usr/bin/python3 of the AppImage, or the system python
+def python_executable():
+    exe = sys.executable or ""
+    if os.path.basename(exe).lower().startswith("python"):
+        return exe
+    version = "python%d.%d" % sys.version_info[:2]
+    dirs = [os.path.dirname(exe),
+            os.path.join(sys.prefix, "bin"), sys.prefix,
+            os.path.join(sys.exec_prefix, "bin"), sys.exec_prefix,
+            os.path.join(os.path.dirname(os.path.dirname(exe)), "Resources", "bin")]
+    names = ["python.exe", "python3.exe", version, "python3", "python"]
+    for d in dirs:
+        for name in names:
+            fn = os.path.join(d, name)
+            if os.path.isfile(fn) and os.access(fn, os.X_OK):
+                return fn
+    return None
+
+
+# multiprocessing context for worker processes, None when there is no
+# python to start them with
+def process_context():
+    import multiprocessing
+    ctx = multiprocessing.get_context()
+    if ctx.get_start_method() == "fork":
+        return ctx
+    python = python_executable()
+    if python is None:
+        return None
+    ctx.set_executable(python)
+    return ctx
+
+
+def export_job(values, objectslist, filename, pool=None):
 
     # This is from the original xtool_xcs_post.py
     # Many fragments in here can migrate to the routines in UtilsExport.py
@@ -361,7 +494,6 @@ def export_xtool(values, objectslist, filename):
 
     print("postprocessing...")
     gcode = ""
-    svg = ""
 
     # write header
     if OUTPUT_HEADER:
@@ -381,10 +513,9 @@ def export_xtool(values, objectslist, filename):
     dout['svgps'] = list()
     dout['speed'] = 0
     dout['feed'] = 0
-    dout['glob_bound'] = dict()
-    dout['glob_bound']['x'] = list()
-    dout['glob_bound']['y'] = list()
+    dout['glob_bound'] = Bound()
 
+    operations = list()
     for obj in objectslist:
 
         # Skip inactive operations
@@ -395,6 +526,22 @@ def export_xtool(values, objectslist, filename):
             if not obj.Base.Active:
                 continue
 
+        operations.append(obj)
+
+    # process the operation gcode
+    with xt.phase("operations"):
+        results = post_operations(values, dout, operations, pool)
+
+    # worker processes make the elements themselves
+    make_elements = pool is None or values["PIPELINE"] == "thread"
+
+    svgps = list()
+    elements = list()
+    # (label, start, end) of each operation in gcode
+    marks = list()
+    for obj, (opgcode, opsvgps) in zip(operations, results):
+        start = len(gcode)
+
         # do the pre_op
         if OUTPUT_COMMENTS:
             gcode += linenumber(values) + "(begin operation: %s)\n" % obj.Label
@@ -423,14 +570,11 @@ def export_xtool(values, objectslist, filename):
         if coolantMode == "Mist":
             gcode += linenumber(values) + "M7" + "\n"
 
-        # process the operation gcode
-
-        dout['gcode'] = ""
-        dout['svgps'] = list()
-        parse(values, dout, obj)
-
-        gcode += dout['gcode']
-        svgps = dout['svgps']
+        gcode += opgcode
+        svgps += opsvgps
+        if make_elements:
+            with xt.phase("elements"):
+                elements += op_elements(values, obj, opsvgps, filename)
 
         # do the post_op
         if OUTPUT_COMMENTS:
@@ -444,6 +588,14 @@ def export_xtool(values, objectslist, filename):
                 gcode += linenumber(values) + "(Coolant Off:" + coolantMode + ")\n"
             gcode += linenumber(values) + "M9" + "\n"
 
+        marks.append((obj.Label, start, len(gcode)))
+
+    # the xcs side carries on while the G-code is finished
+    xcs_future = None
+    if pool is not None:
+        xcs_future = pool.submit(xp.xcs_worker, (values, elements if make_elements else None, svgps,
+                                                 dout['glob_bound'], filename, values.get("ESTIMATE", False)))
+
     # do the post_amble
     if OUTPUT_COMMENTS:
         gcode += "(begin postamble)\n"
@@ -463,6 +615,11 @@ def export_xtool(values, objectslist, filename):
     else:
         final_gcode = gcode
 
+    if values.get("OPTIMIZE", False):
+        with xt.phase("optimize"):
+            final_gcode, stats = xtool_optimize.optimize_gcode(
+                final_gcode, values.get("OPTIMIZE_TOLERANCE", xtool_optimize.DEFAULT_TOLERANCE))
+        print(xtool_optimize.report(stats))
 
 #    if not filename == "-":
 #        gfile = pythonopen(filename, "w")
@@ -472,33 +629,20 @@ def export_xtool(values, objectslist, filename):
     #print(svg)
     #print(svgps)
 
-    gxmin = min(dout['glob_bound']['x'])
-    gxmax = max(dout['glob_bound']['x'])
-    gymin = min(dout['glob_bound']['y'])
-    gymax = max(dout['glob_bound']['y'])
+    gxmin = dout['glob_bound'].xmin
+    gxmax = dout['glob_bound'].xmax
+    gymin = dout['glob_bound'].ymin
+    gymax = dout['glob_bound'].ymax
 
     print("x range: " + str(gxmin) + '  ' + str(gxmax))
     print("y range: " + str(gymin) + '  ' + str(gymax))
 
-    svg = svgps[0]['svg']
-
-    xt.XcsCanvas.canvi = list()
-    canvas1 = xt.XcsCanvas();
-
-    for p in svgps:
-        print(p)
-
-        pa = xt.XcsPath('path').setpath(0, 0, p['svg'])
-
-        # svg paths are place relative to upper left of their bounding
-        # box. This puts group bounding box at 0,0 (upper left)
-        pa.place(-gxmin + p['xmin'], -gymin + p['ymin'])
-
-        power = int(p['power']/10)
-        feed = int(p['feed']/60)
-
-        pa.add_process('VECTOR_CUTTING', power, feed, 1).group(filename)
-        canvas1.add_element(pa);
+    if xcs_future is None:
+        canvases = xp.job_canvases(values, elements, svgps, dout['glob_bound'])
+    else:
+        xcs, canvases = xcs_future.result()
+        if canvases is not None:
+            xt.XcsCanvas.canvi = canvases
 
     # In FreeCAD 1.0 we do not get a filename, just a '-'.
     # Just return serialized xcs json
@@ -524,221 +668,251 @@ def export_xtool(values, objectslist, filename):
 #       # return gcode
 #       return final_gcode
 
-    xt.XcsCanvas.active_canvas = canvas1
-    xcs = xt.XcsSave('-')
+    if values.get("ESTIMATE", False):
+        with xt.phase("estimate"):
+            print_estimate(values, gcode, marks, canvases)
+
+    # the pipeline made the json already
+    if xcs_future is None:
+        if values.get("SPLIT_FILES"):
+            xcs = xp.save_split(values["SPLIT_FILES"], canvases, values["XCS_VERSION"])
+        else:
+            xt.XcsCanvas.active_canvas = canvases[0]
+            xcs = xt.XcsSave('-', values["XCS_VERSION"])
 
     print("done postprocessing.")
 
     return final_gcode, xcs
 
 
-def parse(values, dout, pathobj):
-    # This is from the original xtool_xcs_post.py
-    # Many fragments in here can migriate to the routines in UtilsExport.py
+# Run time of each operation from the G-code, and of the canvases
+def print_estimate(values, gcode, marks, canvases):
+    import xtool_estimate
 
-    OUTPUT_COMMENTS = values["OUTPUT_COMMENTS"]
-    UNIT_SPEED_FORMAT = values["UNIT_SPEED_FORMAT"]
-    OUTPUT_DOUBLES = values["OUTPUT_DOUBLES"]
-    MODAL = values["MODAL"]
-    AXIS_PRECISION = values["AXIS_PRECISION"]
-    COMMAND_SPACE = values["COMMAND_SPACE"]
-    OUTPUT_LINE_NUMBERS = values["OUTPUT_LINE_NUMBERS"]
-
-    print('---------- parse ------------ feed=' + str(dout['feed']) + ' speed=' + str(dout['speed']))
-    out = ""
-    svg = ""
-    svgps = list()
+    machine = xtool_estimate.machine_from_preamble(values["PREAMBLE"])
+    est = xtool_estimate.GcodeEstimator(machine)
+    # header and preamble, for the feeds they set
+    est.estimate(gcode[:marks[0][1]] if marks else gcode)
+    rows = [(label, est.estimate(gcode[a:b])) for label, a, b in marks]
+    print(xtool_estimate.report(rows, "G-code"))
 
-    svg_feed = dout['feed']
-    svg_power = dout['speed']
+    for canvas in canvases:
+        rows, skipped = xtool_estimate.estimate_canvas(machine, canvas)
+        title = "xcs" if len(canvases) == 1 else "xcs " + canvas.title
+        print(xtool_estimate.report(rows, title))
 
-    bound = dict()
-    bound['x'] = list()
-    bound['y'] = list()
 
-    lastcommand = None
-    precision_string = "." + str(AXIS_PRECISION) + "f"
-    currLocation = {}  # keep track for no doubles
-    prevLocation = {}
+# Returns a (gcode, svgps) tuple for each operation, in order.
+#
+# With values["JOBS"] > 1 the operations are parsed in a process pool.
+# Each operation only depends on the feed and speed left behind by the
+# operations before it. Those are found with a quick scan of the commands
+# so every worker can start with the same state the serial loop would have.
+#
+# With values["INCREMENTAL"] set, operations that did not change since the
+# last post reuse its results, see xtool_cache.PostSession.
+#
+# With values["CACHE"] set, operations found in the on disk cache are not
+# parsed again, see xtool_cache.py
+def post_operations(values, dout, operations, pool=None):
+    jobs = values.get("JOBS", 1)
+    session = None
+    if values.get("INCREMENTAL", False):
+        session = xtool_cache.SESSION
+    cache = None
+    if values.get("CACHE", False):
+        cache = xtool_cache.open_cache(values.get("CACHE_DIR"),
+                                       int(values.get("CACHE_SIZE", 256) * 1024 * 1024))
+
+    if session is None and cache is None and pool is None and (jobs <= 1 or len(operations) < 2):
+        results = list()
+        for obj in operations:
+            dout['gcode'] = ""
+            dout['svgps'] = list()
+            parse(values, dout, obj)
+            results.append((dout['gcode'], dout['svgps']))
+        return results
+
+    done = [None] * len(operations)
+    tasks = [None] * len(operations)
+    fingerprints = [None] * len(operations)
+    feed = dout['feed']
+    speed = dout['speed']
+    for n, obj in enumerate(operations):
+        if session is not None:
+            fingerprints[n] = op_fingerprint(values, obj, feed, speed)
+            done[n] = session.get(obj.Name, fingerprints[n])
+            if done[n] is not None:
+                feed, speed = done[n][2], done[n][3]
+                continue
+        with xt.phase("FreeCAD commands"):
+            segs = extract_commands(obj)
+        task_values, segs = xp.order_segments(values, segs, feed, speed)
+        tasks[n] = (task_values, segs, feed, speed)
+        feed, speed = xp.carry_state(task_values, segs, feed, speed)
+
+    keys = [None] * len(operations)
+    if cache is not None:
+        for n, task in enumerate(tasks):
+            if task is not None:
+                keys[n] = cache.key(*task)
+                done[n] = cache.get(keys[n])
+
+    todo = [n for n in range(len(tasks)) if done[n] is None]
+    ctx = None
+    if pool is None and jobs > 1 and len(todo) > 1:
+        ctx = process_context()
+        if ctx is None:
+            print("jobs: no python interpreter for worker processes, posting in this process")
+    if pool is not None:
+        parsed = xp.pipeline_parse(pool, [tasks[n] for n in todo])
+    elif ctx is not None:
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=ctx) as pool:
+            parsed = list(pool.map(xp.parse_worker, [tasks[n] for n in todo]))
+    else:
+        parsed = [xp.parse_worker(tasks[n]) for n in todo]
+
+    for n, result in zip(todo, parsed):
+        done[n] = result
+        if cache is not None:
+            cache.put(keys[n], result)
+
+    if session is not None:
+        for n, obj in enumerate(operations):
+            if tasks[n] is not None:
+                session.put(obj.Name, fingerprints[n], done[n])
+        session.prune(set(obj.Name for obj in operations))
+        reused = sum(1 for t in tasks if t is None)
+        print(f'incremental: reused {reused} of {len(operations)} operations')
+
+    if cache is not None:
+        print(cache.report())
+
+    results = list()
+    for (opgcode, opsvgps, feed, speed) in done:
+        for p in opsvgps:
+            dout['glob_bound'].add(p['xmin'], p['ymin'])
+            dout['glob_bound'].add(p['xmax'], p['ymax'])
+        results.append((opgcode, opsvgps))
 
-    RAPID_MOVES = ["G0", "G00"]
-    FEED_MOVES = ["G1", "G01", "G2", "G02", "G3", "G03"]
+    dout['gcode'] = ""
+    dout['svgps'] = list()
+    dout['feed'] = feed
+    dout['speed'] = speed
+    return results
+
+
+# Cheap check for a changed operation. toGCode() runs in C++ so this is
+# much faster than reading the commands one by one in python.
+def op_fingerprint(values, pathobj, feed, speed):
+    h = hashlib.sha256()
+    h.update(xtool_cache.code_hash().encode())
+    h.update(repr([(k, values.get(k)) for k in xtool_cache.KEY_VALUES]).encode())
+    h.update(repr((feed, speed)).encode())
+    op_content(pathobj, h)
+    return h.hexdigest()
+
+def op_content(pathobj, h):
+    if hasattr(pathobj, "Group"):
+        for p in pathobj.Group:
+            op_content(p, h)
+    elif hasattr(pathobj, "Path"):
+        h.update(b'|')
+        if hasattr(pathobj.Path, "toGCode"):
+            h.update(pathobj.Path.toGCode().encode())
+        else:
+            for name, params in fc_commands(pathobj):
+                h.update(name.encode())
+                h.update(repr(sorted(params.items())).encode())
+
+
+# svg path elements of an operation. Reused from the session when the
+# operation did not change, only their placement is updated.
+def op_elements(values, obj, svgps, group):
+    entry = None
+    if values.get("INCREMENTAL", False):
+        entry = xtool_cache.SESSION.entry(obj.Name)
+    if entry is not None and entry['result'][1] is svgps and entry['elements'] is not None:
+        elements = entry['elements']
+    else:
+        elements = xp.svg_elements(svgps)
+        if entry is not None and entry['result'][1] is svgps:
+            entry['elements'] = elements
+    for e in elements:
+        e.group(group)
+    return elements
+
+
+# Picklable copy of the commands in a path object.
+# One list of (name, parameters) tuples per path, compounds are flattened.
+def extract_commands(pathobj):
+    segs = list()
+    if hasattr(pathobj, "Group"):
+        for p in pathobj.Group:
+            segs += extract_commands(p)
+    elif hasattr(pathobj, "Path"):
+        segs.append(list(fc_commands(pathobj)))
+    return segs
 
-    # the order of parameters
-    params = values["PARAMETER_ORDER"]
 
-    firstmove = Path.Command("G0", {"X": -1, "Y": -1, "Z": -1, "F": 0.0})
-    currLocation.update(firstmove.Parameters)  # set First location Parameters
-    prevLocation.update(firstmove.Parameters)  # set First location Parameters
+# Post the same job with an increasing number of workers and report
+# the speedup over the serial run.
+def benchmark_jobs(values, objectslist, filename, counts=None):
+    if counts is None:
+        ncpu = os.cpu_count() or 1
+        counts = sorted(set([1, 2, 4, 8, 16, ncpu]))
+        counts = [n for n in counts if n <= ncpu] or [1]
+        if counts[0] != 1:
+            counts.insert(0, 1)
+
+    saved = values.get("JOBS", 1)
+    report = list()
+    serial = None
+    for n in counts:
+        values["JOBS"] = n
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            out = export_xtool(values, objectslist, filename)
+            t = time.perf_counter() - t0
+        if serial is None:
+            serial = (t, out)
+        report.append(dict(jobs = n, seconds = t, speedup = serial[0] / t,
+                           identical = out == serial[1]))
+    values["JOBS"] = saved
+
+    print(f'{"jobs":>5s} {"seconds":>10s} {"speedup":>8s}  identical')
+    for r in report:
+        print(f'{r["jobs"]:5d} {r["seconds"]:10.3f} {r["speedup"]:8.2f}  {r["identical"]}')
+    return report
 
-    start_path = False
-    pathing = False
-    finish_path = False
 
+def parse(values, dout, pathobj):
     if hasattr(pathobj, "Group"):  # We have a compound or project.
         # if OUTPUT_COMMENTS:
         #     out += linenumber(values) + "(compound: " + pathobj.Label + ")\n"
         for p in pathobj.Group:
-            parse(dout, p)
-
-        return
-
-    else:  # parsing simple path
-
-        # groups might contain non-path things like stock.
-        if not hasattr(pathobj, "Path"):
-            #return out
-            return dict(gcode = out, svgs = svgs)
-
-        # if OUTPUT_COMMENTS:
-        #     out += linenumber(values) + "(" + pathobj.Label + ")\n"
+            parse(values, dout, p)
+        return dout
 
-        for c in pathobj.Path.Commands:
+    # groups might contain non-path things like stock.
+    if not hasattr(pathobj, "Path"):
+        return dout
 
-            outstring = []
-            command = c.Name
-            outstring.append(command)
+    # if OUTPUT_COMMENTS:
+    #     out += linenumber(values) + "(" + pathobj.Label + ")\n"
 
-            # if modal: suppress the command if it is the same as the last one
-            if MODAL is True:
-                if command == lastcommand:
-                    outstring.pop(0)
+    commands = fc_commands(pathobj)
+    if xt.XcsProfiler.active is not None:
+        # read them all first so the FreeCAD side gets a phase of its own
+        with xt.phase("FreeCAD commands"):
+            commands = list(commands)
 
-            if c.Name[0] == "(" and not OUTPUT_COMMENTS:  # command is a comment
-                continue
-
-            #print(str(prevLocation))
-            #print(str(currLocation))
-            print(c.Name + str(c.Parameters))
-
-            # Now add the remaining parameters in order
-            for param in params:
-                if param in c.Parameters:
-                    if param == "F":
-                        feed_rate = Units.Quantity(
-                            c.Parameters["F"], FreeCAD.Units.Velocity
-                           )
-
-                        if feed_rate.getValueAs(UNIT_SPEED_FORMAT) > 0.0:
-                            outstring.append(
-                                param
-                                + format(
-                                    float(feed_rate.getValueAs(UNIT_SPEED_FORMAT)),
-                                    precision_string,
-                                )
-                            )
-
-                        dout['feed'] = feed_rate.getValueAs(UNIT_SPEED_FORMAT)
-
-                    elif param == "T":
-                        outstring.append(param + str(int(c.Parameters["T"])))
-                    elif param == "H":
-                        outstring.append(param + str(int(c.Parameters["H"])))
-                    elif param == "D":
-                        outstring.append(param + str(int(c.Parameters["D"])))
-                    elif param == "S":
-                        outstring.append(param + str(int(c.Parameters["S"])))
-                        dout['speed'] = int(c.Parameters["S"])
-                        print("new speed = " + str(dout['speed']))
-                    else:
-                        if (
-                            (not OUTPUT_DOUBLES)
-                            and (param in currLocation)
-                            and (currLocation[param] == c.Parameters[param])
-                        ):
-                            continue
-                        else:
-                            # X20.123
-                            # Y12.567
-                            outstring.append(param + fculps(c.Parameters[param], param))
-
-            arc_segs = []
-            if c.Name in ["G2", "G02", "G3", "G03",]:
-                arc_segs = gcode_arc(c, prevVector)
-                outstring = []
-
-            # store the latest command
-            lastcommand = command
-            currLocation.update(c.Parameters)
-            currVector = Vector(currLocation["X"], currLocation["Y"], 0)
-
-            # svg
-            # start a new path if z step down
-
-            if dout['speed'] != svg_power or dout['feed'] != svg_feed:
-                if pathing:
-                    print("speed or feed change: power=" + str(dout['speed']) + " feed=" +  str(dout['feed']))
-                    finish_path = True
-
-            if currLocation["Z"] > prevLocation["Z"]:
-                if pathing:
-                    print("Z up")
-                    finish_path = True
-
-            if currLocation["Z"] < prevLocation["Z"] and c.Name in FEED_MOVES:
-                if not pathing:
-                    start_path = True
-
-            if pathing and finish_path:
-                # start a new svg path. Only save current one if it draws something
-                svg_finish_path(dout, svg, svg_feed, svg_power, bound)
-                svg = ""
-                svg_feed = dout['feed']
-                svg_power = dout['speed']
-                print("finish path, power = " + str(svg_power))
-                finish_path = False
-                pathing = False
-
-
-            if start_path:
-                print("start path: power=" + str(dout['speed']) + " feed=" +  str(dout['feed']))
-                svg += svg_move(c, prevVector, bound)
-                start_path = False
-                pathing = True
-                svg_feed = dout['feed']
-                svg_power = dout['speed']
-                bound['x'] = list()
-                bound['y'] = list()
-
-
-            if pathing and c.Name in FEED_MOVES:
-                #print("pathing ...")
-                if   c.Name in ["G1", "G01",]:
-                    svg += svg_line(c, prevVector, bound)
-                elif c.Name in ["G2", "G02", "G3", "G03",]:
-                    svg += svg_arc(c, prevVector, bound)
-
-            prevLocation.update(c.Parameters)
-            prevVector = Vector(prevLocation["X"], prevLocation["Y"], 0)
-
-
-            if command == "message":
-                if OUTPUT_COMMENTS is False:
-                    out = []
-                else:
-                    outstring.pop(0)  # remove the command
-
-            # prepend a line number and append a newline
-            if len(outstring) >= 1:
-                if OUTPUT_LINE_NUMBERS:
-                    outstring.insert(0, (linenumber(values)))
-
-                # append the line to the final output
-                for w in outstring:
-                    out += w + COMMAND_SPACE
-                # Note: Do *not* strip `out`, since that forces the allocation
-                # of a contiguous string & thus quadratic complexity.
-                out += "\n"
-
-            if len(arc_segs) > 0:
-                for w in arc_segs:
-                    if OUTPUT_LINE_NUMBERS:
-                        w.insert(0, (linenumber(values)))
-                    out += w + "\n"
-
-        svg_finish_path(dout, svg, svg_feed, svg_power, bound)
-
-        dout['gcode'] = dout['gcode'] + out
-        return dout
+    return xp.parse_commands(values, dout, commands)
 
 
+# (name, parameters) tuples for the core.
+# Parameters is built by FreeCAD on each access, so read it once.
+def fc_commands(pathobj):
+    for c in pathobj.Path.Commands:
+        yield (c.Name, c.Parameters)
@@ -0,0 +1,155 @@
+#!python3
+#
+# bench_arc_bound.py
+#
+# Checks xtool_path.arc_extent() and arc_extents() on random arcs and
+# times them against the arc bounds the post used before.
+#
+#    python bench_arc_bound.py
+#    python bench_arc_bound.py -n 100000 --seed 3
+#
+# The reference box comes from many points sampled along the arc, so it
+# can only be smaller than the true one, by at most rad * (1 - cos(step/2)).
+# The new box must hold it and be no more than that larger. The old box
+# is counted the same way, to show where it was off.
+
+import argparse
+import math
+import random
+import time
+
+import xtool_path as xp
+
+
+# arc_bound() as it was, unit vectors and acos angles, svg coordinates
+def legacy_arc_bound(name, p1, p2, c, bound):
+    def unit(ax, ay, bx, by):
+        l = math.hypot(bx - ax, by - ay)
+        return ((bx - ax) / l, (by - ay) / l)
+
+    def angle(d):
+        return math.acos(max(-1.0, min(1.0, d)))
+
+    rlen = math.hypot(p1[0] - c[0], p1[1] - c[1])
+    ca = unit(p1[0], p1[1], c[0], c[1])
+    cb = unit(p2[0], p2[1], c[0], c[1])
+    if name in xp.CCW_MOVES:
+        aax, abx, aay, aby = angle(cb[0]), angle(ca[0]), angle(cb[1]), angle(ca[1])
+    else:
+        aax, abx, aay, aby = angle(ca[0]), angle(cb[0]), angle(ca[1]), angle(cb[1])
+    xmax = 1 if aax <= 0 and abx >= 0 else max(ca[0], cb[0])
+    xmin = -1 if aax >= 0 and abx >= 0 else min(ca[0], cb[0])
+    ymax = 1 if aay <= 0 and aby >= 0 else max(ca[1], cb[1])
+    ymin = -1 if aay >= 0 and aby >= 0 else min(ca[1], cb[1])
+    bound.add(xmin * rlen + c[0], -ymin * rlen + -c[1])
+    bound.add(xmax * rlen + c[0], -ymax * rlen + -c[1])
+    return bound
+
+
+def random_arcs(n, seed):
+    r = random.Random(seed)
+    arcs = list()
+    for i in range(n):
+        c = (r.uniform(-100, 100), r.uniform(-100, 100))
+        rad = r.uniform(0.1, 50)
+        a1 = r.uniform(-math.pi, math.pi)
+        # some arcs end on an axis, where the crossing tests are tight
+        a2 = r.choice([r.uniform(-math.pi, math.pi), r.randint(-2, 2) * math.pi / 2])
+        p1 = (c[0] + rad * math.cos(a1), c[1] + rad * math.sin(a1))
+        p2 = (c[0] + rad * math.cos(a2), c[1] + rad * math.sin(a2))
+        arcs.append((r.choice(['G2', 'G3']), p1, p2, c))
+    return arcs
+
+
+# svg box of points sampled along the arc, and how far it may be inside
+def sampled_bound(name, p1, p2, c, steps=720):
+    rad = math.hypot(p1[0] - c[0], p1[1] - c[1])
+    a1 = math.atan2(p1[1] - c[1], p1[0] - c[0])
+    sweep = xp.arc_sweep(name, a1, math.atan2(p2[1] - c[1], p2[0] - c[0]))
+    b = xp.Bound()
+    n = max(2, int(steps * abs(sweep) / (2 * math.pi)) + 1)
+    for i in range(n + 1):
+        a = a1 + sweep * i / n
+        b.add(c[0] + rad * math.cos(a), -(c[1] + rad * math.sin(a)))
+    return b, rad * (1 - math.cos(abs(sweep) / n / 2))
+
+
+def check(arcs):
+    eps = 1e-9
+    ok = 0
+    old_small = 0
+    old_large = 0
+    for name, p1, p2, c in arcs:
+        ref, slack = sampled_bound(name, p1, p2, c)
+        new = xp.arc_bound(name, p1, p2, c, xp.Bound())
+        old = legacy_arc_bound(name, p1, p2, c, xp.Bound())
+        inner = (ref.xmin, ref.ymin, -ref.xmax, -ref.ymax)
+
+        d = [a - b for a, b in zip(inner, (new.xmin, new.ymin, -new.xmax, -new.ymax))]
+        if all(-eps <= e <= slack + eps for e in d):
+            ok += 1
+        else:
+            print(f'{name} {p1} {p2} {c}: sampled {inner}, exact {(new.xmin, new.ymin, new.xmax, new.ymax)}')
+
+        d = [a - b for a, b in zip(inner, (old.xmin, old.ymin, -old.xmax, -old.ymax))]
+        if any(e < -eps for e in d):
+            old_small += 1
+        elif any(e > slack + eps for e in d):
+            old_large += 1
+    return ok, old_small, old_large
+
+
+def check_batch(arcs):
+    cx, cy, rad, a1, sweep = list(), list(), list(), list(), list()
+    for name, p1, p2, c in arcs:
+        cx.append(c[0])
+        cy.append(c[1])
+        rad.append(math.hypot(p1[0] - c[0], p1[1] - c[1]))
+        a = math.atan2(p1[1] - c[1], p1[0] - c[0])
+        a1.append(a)
+        sweep.append(xp.arc_sweep(name, a, math.atan2(p2[1] - c[1], p2[0] - c[0])))
+
+    # the first call pays for importing numpy
+    xp.arc_extents(cx[:1], cy[:1], rad[:1], a1[:1], sweep[:1])
+    t0 = time.perf_counter()
+    boxes = xp.arc_extents(cx, cy, rad, a1, sweep)
+    t = time.perf_counter() - t0
+    same = sum(1 for box, args in zip(boxes, zip(cx, cy, rad, a1, sweep))
+               if all(abs(a - b) <= 1e-9 for a, b in zip(box, xp.arc_extent(*args))))
+    return same, t
+
+
+def timed(f, arcs, runs=3):
+    best = math.inf
+    for i in range(runs):
+        t0 = time.perf_counter()
+        for name, p1, p2, c in arcs:
+            f(name, p1, p2, c, xp.Bound())
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and time the arc bounds')
+    parser.add_argument('-n', '--arcs', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    arcs = random_arcs(args.arcs, args.seed)
+    ok, old_small, old_large = check(arcs)
+    print(f'{ok} of {len(arcs)} exact boxes hold the sampled arc and no more')
+    print(f'old boxes: {old_small} cut off part of the arc, {old_large} too large,'
+          f' {len(arcs) - old_small - old_large} right')
+
+    same, t_batch = check_batch(arcs)
+    print(f'{same} of {len(arcs)} batch boxes match arc_extent()')
+
+    t_old = timed(legacy_arc_bound, arcs)
+    t_new = timed(xp.arc_bound, arcs)
+    print(f'old arc_bound {t_old / len(arcs) * 1e6:.2f} us/arc,'
+          f' new {t_new / len(arcs) * 1e6:.2f} us/arc,'
+          f' batch {t_batch / len(arcs) * 1e6:.2f} us/arc')
+    return 0 if ok == len(arcs) and same == len(arcs) else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,141 @@
+#!python3
+#
+# bench_bitmap.py
+#
+# Checks and times the bitmap pipeline in xtool_bitmap.py on synthetic
+# images, no image files needed.
+#
+#    python bench_bitmap.py
+#    python bench_bitmap.py --size 6000x4000 --width 150
+#
+# - the wavefront Floyd-Steinberg against the plain loop, bit for bit
+# - the PNG against the pixels it was made from
+# - a project saved with the streamed base64 against plain json.dump
+# - time and peak traced memory of each step on a big image
+
+import argparse
+import base64
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+import numpy as np
+
+import xtool_bitmap as xb
+import xtool_xcs as xt
+
+
+# rgb test image: gradients, rings and noise
+def synthetic_image(w, h, seed=0):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:h, 0:w].astype(np.float32)
+    r = np.hypot(x - w / 2, y - h / 2)
+    img = np.empty((h, w, 3), dtype=np.uint8)
+    img[..., 0] = (255 * x / w).astype(np.uint8)
+    img[..., 1] = (127.5 + 127.5 * np.sin(r / 15)).astype(np.uint8)
+    img[..., 2] = rng.integers(0, 256, (h, w), dtype=np.uint8)
+    return img
+
+
+# pixels back from a PNG made by png_chunks()
+def png_pixels(data):
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    pos = 8
+    idat = b''
+    while pos < len(data):
+        n = int.from_bytes(data[pos:pos + 4], 'big')
+        kind = data[pos + 4:pos + 8]
+        body = data[pos + 8:pos + 8 + n]
+        if kind == b'IHDR':
+            w, h = int.from_bytes(body[0:4], 'big'), int.from_bytes(body[4:8], 'big')
+            bits = body[8]
+        elif kind == b'IDAT':
+            idat += body
+        pos += 12 + n
+    raw = np.frombuffer(zlib.decompress(idat), dtype=np.uint8)
+    stride = (w * bits + 7) // 8 + 1
+    rows = raw.reshape(h, stride)[:, 1:]
+    if bits == 1:
+        return np.unpackbits(rows, axis=1)[:, :w].astype(bool)
+    return rows
+
+
+def check_dither(w, h):
+    gray = xb.grayscale(synthetic_image(w, h))
+    a = xb.floyd_steinberg(gray.copy())
+    b = xb.floyd_steinberg_loop(gray.copy())
+    return np.array_equal(a, b)
+
+
+def check_png():
+    ok = True
+    for mode in xb.MODES:
+        px = xb.process(synthetic_image(700, 500), 40, dpi=300, mode=mode)
+        ok = ok and np.array_equal(png_pixels(b''.join(xb.png_chunks(px))), px)
+    return ok
+
+
+def check_save():
+    xt.XcsCanvas.canvi = list()
+    canvas = xt.XcsCanvas()
+    canvas.add_element(xt.XcsRect('rect', xt.XcsPnt(0, 0), xt.XcsPnt(10, 10)))
+    for i in range(2):
+        e = xb.bitmap_element(synthetic_image(400, 300, i), 30, mode='dither')
+        canvas.add_element(e.place(20 + 40 * i, 0))
+    with tempfile.TemporaryDirectory() as d:
+        fn = os.path.join(d, 'bitmap')
+        xt.XcsSave(fn)
+        with open(fn + '.xcs') as f:
+            streamed = f.read()
+    plain = json.dumps(xt.XcsCanvas.canvi_encode() | dict(version = '1.1.19', extID = 'D1')
+                       | xt.XcsCanvas.device_encode(), cls=xt.XcsEncode)
+
+    # the image data survives the trip
+    d = json.loads(streamed)
+    data = d['canvas'][0]['displays'][1]['base64'].split(',', 1)[1]
+    png = png_pixels(base64.b64decode(data))
+    return json.loads(plain) == d and png.shape == (225, 300), len(streamed)
+
+
+def timed(name, f, *args):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = f(*args)
+    t = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f'{name:14s} {t:8.3f} s {peak / 1e6:9.1f} MB peak')
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and time the bitmap pipeline')
+    parser.add_argument('--size', default='4000x3000', help='source image, pixels')
+    parser.add_argument('--width', type=float, default=100, help='engraved width, mm')
+    parser.add_argument('--dpi', type=float, default=xb.DEFAULT_DPI)
+    args = parser.parse_args()
+
+    dither_ok = check_dither(97, 61)
+    print(f'wavefront dither same as the loop: {dither_ok}')
+    png_ok = check_png()
+    print(f'png pixels round trip: {png_ok}')
+    save_ok, n = check_save()
+    print(f'streamed save same as json.dump: {save_ok}, {n} bytes')
+
+    w, h = (int(v) for v in args.size.split('x'))
+    src = synthetic_image(w, h)
+    size = xb.target_size(src.shape, args.width, dpi=args.dpi)
+    print(f'{w}x{h} rgb, {src.nbytes / 1e6:.1f} MB -> {size[0]}x{size[1]}')
+    small = timed('resize', xb.resize, src, size)
+    gray = timed('grayscale', xb.grayscale, small)
+    timed('threshold', xb.threshold, gray)
+    px = timed('dither', xb.floyd_steinberg, gray.copy())
+    png = timed('png', lambda: sum(len(c) for c in xb.png_chunks(px)))
+    print(f'{png / 1e3:.0f} kB of png')
+    return 0 if dither_ok and png_ok and save_ok else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
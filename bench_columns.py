@@ -0,0 +1,173 @@
+#!python3
+#
+# bench_columns.py
+#
+# Checks and times the columnar elements of xtool_xcs.py, XcsColumns,
+# against the same elements as objects.
+#
+#    python bench_columns.py
+#    python bench_columns.py -n 1000000 --memory
+#
+# - the same project text, byte for byte, from XcsSave() and from json
+#   with XcsEncode, for rects and circles in groups with processes
+# - rows keep their ids to themselves, move like the elements and split
+#   over canvases like them
+# - time to make and save a grid of n rects, as objects and in columns,
+#   and with --memory the peak memory of each
+
+import argparse
+import json
+import math
+import time
+import tracemalloc
+
+import xtool_path as xp
+import xtool_transform as xf
+import xtool_xcs as xt
+
+
+def project():
+    xcs = xt.XcsCanvas.canvi_encode()
+    xcs['version'] = xt.XCS_VERSION
+    xcs['extID'] = xt.XCS_VERSIONS[xt.XCS_VERSION]['extID']
+    xcs['device'] = xt.XcsCanvas.device_encode()['device']
+    return json.dumps(xcs, cls=xt.XcsEncode)
+
+
+def cells(n):
+    for k in range(n):
+        x = (k % 37) * 2.5
+        y = (k // 37) * 1.25
+        w = 1 + k % 3
+        h = 0.5 * (1 + k % 5)
+        proc = None if k % 7 == 0 else ('VECTOR_CUTTING' if k % 2 else 'VECTOR_ENGRAVING', 10 + k % 4, 100, 1)
+        group = '' if k % 3 == 0 else 'group %d' % (k % 3)
+        yield x, y, w, h, proc, group
+
+
+def object_canvas(n, cls):
+    xt.XcsCanvas.canvi = list()
+    canvas = xt.XcsCanvas()
+    canvas.add_element(xt.XcsText('', 'label').place(1, 1).size(0, 3))
+    for k, (x, y, w, h, proc, group) in enumerate(cells(n)):
+        e = xt.TEMPLATE_TYPES[cls]()
+        e.id = cls.type.lower() + '_' + str(k)
+        e.x, e.y, e.width, e.height = float(x), float(y), float(w), float(h)
+        e.group(group)
+        if proc is not None:
+            e.add_process(*proc)
+        canvas.add_element(e)
+    return canvas
+
+
+def column_canvas(n, cls):
+    xt.XcsCanvas.canvi = list()
+    canvas = xt.XcsCanvas()
+    canvas.add_element(xt.XcsText('', 'label').place(1, 1).size(0, 3))
+    cols = xt.XcsColumns(cls)
+    for x, y, w, h, proc, group in cells(n):
+        cols.add(x, y, w, h, proc, group)
+    canvas.add_columns(cols)
+    return canvas
+
+
+def check():
+    ok = True
+    for cls in xt.COLUMN_TYPES:
+        object_canvas(500, cls)
+        want = xt.XcsSave('-'), project()
+        canvas = column_canvas(500, cls)
+        ok = ok and want == (xt.XcsSave('-'), project())
+        # a nan goes the slow way, the text is still the same
+        canvas.columns[0].x[3] = math.nan
+        got = xt.XcsSave('-')
+        e = canvas.columns[0][3]
+        ok = ok and got == project() and xt.encoder().element(e) in got
+    return ok
+
+
+# corners of an element on the canvas, with its angle
+def corners(e):
+    t = math.radians(e.angle)
+    cx, cy = e.x + e.width / 2, e.y + e.height / 2
+    return sorted((round(cx + u * math.cos(t) - v * math.sin(t), 6), round(cy + u * math.sin(t) + v * math.cos(t), 6))
+                  for u in (-e.width / 2, e.width / 2) for v in (-e.height / 2, e.height / 2))
+
+
+def check_rows():
+    canvas = column_canvas(300, xt.XcsRect)
+    cols = canvas.columns[0]
+    e = xt.XcsRect(cols.id(5), xt.XcsPnt(0, 0), xt.XcsPnt(1, 1))
+    canvas.add_element(e)
+    ok = e.id != cols.id(5)
+    other = xt.XcsColumns(xt.XcsRect, prefix=cols.prefix)
+    canvas.add_columns(other)
+    ok = ok and other.prefix != cols.prefix
+
+    # rows stay upright, a quarter turn swaps width and height
+    m = xf.compose(xf.rotation(90, 10, 20), xf.scaling(2, 1.5), xf.translation(3, 4))
+    objects = list(cols)
+    xf.transform(objects, m)
+    xf.transform_canvas(canvas, m)
+    ok = ok and [corners(e) for e in objects] == [corners(e) for e in cols]
+
+    svgps = [dict(length=2 * (e.width + e.height)) for e in cols]
+    want = [len(p) for p in xp.split_elements(list(cols), svgps, 40, 500.0)]
+    got = [sum(map(len, p)) for p in xp.split_elements([], [], 40, 500.0, columns=[cols])]
+    return ok and want == got
+
+
+def grid_objects(nx, ny):
+    xt.XcsCanvas.canvi = list()
+    canvas = xt.XcsCanvas()
+    for j in range(ny):
+        for i in range(nx):
+            canvas.add_element(xt.XcsRect('rect', xt.XcsPnt(i * 1.5, j * 1.5), xt.XcsPnt(i * 1.5 + 1, j * 1.5 + 1))
+                               .add_process('VECTOR_CUTTING', 100, 6, 1))
+    return len(xt.XcsSave('-'))
+
+
+def grid_columns(nx, ny):
+    xt.XcsCanvas.canvi = list()
+    canvas = xt.XcsCanvas()
+    cols = xt.XcsColumns(xt.XcsRect)
+    cols.grid(0, 0, nx, ny, 1.5, 1.5, 1, 1, process=('VECTOR_CUTTING', 100, 6, 1))
+    canvas.add_columns(cols)
+    return len(xt.XcsSave('-'))
+
+
+def measure(f, memory):
+    if memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    size = f()
+    t = time.perf_counter() - t0
+    peak = 0
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return t, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and time columnar canvas elements')
+    parser.add_argument('-n', '--rects', type=int, default=250000, help='rects in the timed grid')
+    parser.add_argument('--memory', action='store_true', help='also the peak memory, slower')
+    args = parser.parse_args()
+
+    ok = check()
+    print(f'columns write the same text as objects: {ok}')
+    rows_ok = check_rows()
+    print(f'rows have their own ids, move and split like objects: {rows_ok}')
+    ok = ok and rows_ok
+
+    nx = int(math.sqrt(args.rects))
+    ny = args.rects // nx
+    for name, f in (('objects', grid_objects), ('columns', grid_columns)):
+        t, size, peak = measure(lambda: f(nx, ny), args.memory)
+        mem = f', peak {peak / 1e6:.0f} MB' if args.memory else ''
+        print(f'{name:8s} {nx * ny} rects {t:7.3f} s, {size / 1e6:.0f} MB of xcs{mem}')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,133 @@
+#!python3
+#
+# bench_encode.py
+#
+# Checks and times the template encoder of xtool_xcs.py against plain
+# json with XcsEncode, the way XcsSave() wrote projects before.
+#
+#    python bench_encode.py
+#    python bench_encode.py -n 500000 --runs 1
+#
+# - the same text, byte for byte, for a mix of every element type, odd
+#   ones that miss their template and a bitmap
+# - time of a post sized job of svg paths, to a string and to a file
+
+import argparse
+import io
+import json
+import math
+import os
+import random
+import tempfile
+import time
+
+import xtool_xcs as xt
+
+
+# the header XcsSave() puts on a project
+def project():
+    xcs = xt.XcsCanvas.canvi_encode()
+    xcs['version'] = xt.XCS_VERSION
+    xcs['extID'] = xt.XCS_VERSIONS[xt.XCS_VERSION]['extID']
+    xcs['device'] = xt.XcsCanvas.device_encode()['device']
+    return xcs
+
+
+def mixed_job(n, seed=0):
+    r = random.Random(seed)
+    xt.XcsCanvas.canvi = list()
+    for c in range(2):
+        canvas = xt.XcsCanvas()
+        for i in range(n):
+            p1 = xt.XcsPnt(r.uniform(0, 100), r.randint(0, 100))
+            p2 = xt.XcsPnt(r.uniform(100, 200), r.uniform(0, 50))
+            e = r.choice([
+                lambda: xt.XcsRect('rect', p1, p2),
+                lambda: xt.XcsCircle('', p1, p2),
+                lambda: xt.XcsLine('line', p1, p2),
+                lambda: xt.XcsPen('pen').setpoints([p1, p2, xt.XcsPnt(1, 2)]),
+                lambda: xt.XcsPath('path').setpath(p1.x, p1.y, 'M0 0 L%.3f %.3f Z' % (p2.x, p2.y)),
+                lambda: xt.XcsText('', str(i)).place(p1.x, p1.y).size(0, 3).origin(5),
+            ])()
+            if r.random() < 0.3:
+                e.group(f'group "{c}" %d')
+            if r.random() < 0.05:
+                e.lineColor = 0xff0000
+            if r.random() < 0.05:
+                e.scale.p.x = 1.0
+            if r.random() < 0.02:
+                e.x = math.nan
+            if r.random() < 0.8:
+                e.add_process(r.choice(['VECTOR_CUTTING', 'VECTOR_ENGRAVING']), r.randint(1, 100),
+                              r.uniform(1, 100), r.randint(1, 3))
+            canvas.add_element(e)
+        canvas.add_element(xt.XcsBitmap('bitmap', lambda: iter([b'\x89PNG', b'ab' * 100]), 10, 5)
+                           .add_process('BITMAP_ENGRAVING', 30, 100, 1))
+        canvas.title = f'part {c}'
+
+
+# svg paths like the posts make them
+def path_job(n, seed=0):
+    r = random.Random(seed)
+    xt.XcsCanvas.canvi = list()
+    canvas = xt.XcsCanvas()
+    for i in range(n):
+        x, y = r.uniform(0, 300), r.uniform(0, 300)
+        d = 'M%.3f %.3f' % (x, y) + ''.join(
+            ' L%.3f %.3f' % (r.uniform(0, 300), r.uniform(0, 300)) for j in range(r.randint(2, 12)))
+        p = xt.XcsPath('svg').setpath(x, y, d).size(r.uniform(0, 300), r.uniform(0, 300))
+        canvas.add_element(p.group('job').add_process('VECTOR_CUTTING', 100, 6, 1))
+
+
+def check():
+    mixed_job(3000)
+    ref = json.dumps(project(), cls=xt.XcsEncode)
+    with tempfile.TemporaryDirectory() as d:
+        fn = os.path.join(d, 'mixed')
+        xt.XcsSave(fn)
+        with open(fn + '.xcs') as f:
+            saved = f.read()
+    return ref == xt.XcsSave('-') == saved
+
+
+def best(f, runs):
+    t = math.inf
+    for i in range(runs):
+        t0 = time.perf_counter()
+        f()
+        t = min(t, time.perf_counter() - t0)
+    return t
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and time the xcs template encoder')
+    parser.add_argument('-n', '--paths', type=int, default=100000, help='svg paths in the timed job')
+    parser.add_argument('--runs', type=int, default=3, help='best of this many runs')
+    args = parser.parse_args()
+
+    ok = check()
+    print(f'templates write the same text as json: {ok}')
+
+    path_job(args.paths)
+    enc = xt.encoder()
+    with tempfile.TemporaryDirectory() as d:
+        fn = os.path.join(d, 'paths.xcs')
+
+        def json_file():
+            with open(fn, 'w') as f:
+                json.dump(project(), f, cls=xt.XcsEncode)
+
+        def template_file():
+            with open(fn, 'w') as f:
+                enc.write(f)
+
+        times = [('json.dumps', best(lambda: json.dumps(project(), cls=xt.XcsEncode), args.runs)),
+                 ('templates', best(lambda: enc.write(io.StringIO()), args.runs)),
+                 ('json.dump file', best(json_file, args.runs)),
+                 ('templates file', best(template_file, args.runs))]
+    for name, t in times:
+        print(f'{name:16s} {t:8.3f} s {t / args.paths * 1e6:7.2f} us/path')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
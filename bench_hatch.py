@@ -0,0 +1,161 @@
+#!python3
+#
+# bench_hatch.py
+#
+# Checks and times the hatch fill in xtool_hatch.py.
+#
+#    python bench_hatch.py
+#    python bench_hatch.py --rows 1000000
+#
+# - segments against a plain per scanline loop, on random polygons
+# - nothing inside the holes of a shape with holes
+# - a rectangle hatches to one zig-zag, the joins of random polygons stay
+#   inside them
+# - the svg of the hatch element reads back to the same lines
+# - time to hatch a circle and a path with holes with many scanlines
+
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+
+import xtool_estimate
+import xtool_hatch as xh
+import xtool_xcs as xt
+
+
+def random_polygon(r, n, cx=0.0, cy=0.0, rmin=5.0, rmax=20.0):
+    angles = sorted(r.uniform(0, 2 * math.pi) for i in range(n))
+    return [(cx + d * math.cos(a), cy + d * math.sin(a))
+            for a, d in ((a, r.uniform(rmin, rmax)) for a in angles)]
+
+
+# segments of row y the slow way, a sorted list of (xa, xb)
+def reference_row(outlines, y):
+    xs = list()
+    for p in outlines:
+        for i in range(len(p)):
+            (x0, y0), (x1, y1) = p[i], p[(i + 1) % len(p)]
+            if min(y0, y1) <= y < max(y0, y1):
+                xs.append(x0 + (y - y0) * (x1 - x0) / (y1 - y0))
+    xs.sort()
+    return list(zip(xs[0::2], xs[1::2]))
+
+
+def check_reference(seed, spacing=0.37):
+    r = random.Random(seed)
+    outlines = [random_polygon(r, 12), random_polygon(r, 7, rmin=1, rmax=3)]
+    lines = xh.hatch_lines(outlines, spacing, bidirectional=False)
+    got = dict()
+    for pts in lines:
+        got.setdefault(round(pts[0, 1], 9), list()).append((pts[0, 0], pts[1, 0]))
+    ys = [y for p in outlines for x, y in p]
+    ok = True
+    for j in range(math.floor(min(ys) / spacing) - 1, math.ceil(max(ys) / spacing) + 1):
+        y = (j + 0.5) * spacing
+        ref = reference_row(outlines, y)
+        seg = sorted(got.get(round(y, 9), list()))
+        ok = ok and len(ref) == len(seg) and all(
+            abs(a - c) < 1e-9 and abs(b - d) < 1e-9 for (a, b), (c, d) in zip(ref, seg))
+    return ok
+
+
+def check_holes():
+    outer = [(0, 0), (30, 0), (30, 30), (0, 30)]
+    holes = [[(5, 5), (12, 5), (12, 12), (5, 12)], [(18, 18), (25, 18), (25, 25), (18, 25)]]
+    lines = xh.hatch_lines([outer] + holes, 0.5, angle=30)
+    for pts in lines:
+        for (xa, ya), (xb, yb) in zip(pts[0::2], pts[1::2]):
+            for t in (0.1, 0.5, 0.9):
+                x = xa + t * (xb - xa)
+                y = ya + t * (yb - ya)
+                for h in holes:
+                    if h[0][0] < x < h[1][0] and h[0][1] < y < h[2][1]:
+                        return False, len(lines)
+    return True, len(lines)
+
+
+# x, y inside the outlines by the even-odd rule or on an edge
+def inside(outlines, x, y, tol=1e-7):
+    n = 0
+    for p in outlines:
+        for i in range(len(p)):
+            (x0, y0), (x1, y1) = p[i], p[(i + 1) % len(p)]
+            dx, dy = x1 - x0, y1 - y0
+            t = min(1.0, max(0.0, ((x - x0) * dx + (y - y0) * dy) / (dx * dx + dy * dy)))
+            if math.hypot(x0 + t * dx - x, y0 + t * dy - y) < tol:
+                return True
+            if min(y0, y1) <= y < max(y0, y1) and x < x0 + (y - y0) * dx / dy:
+                n += 1
+    return n % 2 == 1
+
+
+# the lines joining the rows of the zig-zags do not leave the shape
+def check_joins(seed, spacing=0.3):
+    r = random.Random(seed)
+    outlines = [random_polygon(r, 16), random_polygon(r, 6, rmin=1, rmax=3)]
+    for pts in xh.hatch_lines(outlines, spacing, angle=r.uniform(0, 180)):
+        for (xa, ya), (xb, yb) in zip(pts[1:-1:2], pts[2::2]):
+            for t in (0.25, 0.5, 0.75):
+                if not inside(outlines, xa + t * (xb - xa), ya + t * (yb - ya)):
+                    return False
+    return True
+
+
+def check_element():
+    rect = xt.XcsRect('r', xt.XcsPnt(10, 20), xt.XcsPnt(50, 40))
+    one = len(xh.hatch_lines(xh.element_outlines(rect), 0.5)) == 1
+
+    lines = xh.hatch_lines(xh.element_outlines(rect), 0.5, angle=15)
+    e = xh.hatch_element(rect, 0.5, angle=15)
+    back = xtool_estimate.element_polylines(e.encode())
+    same = len(back) == len(lines) and all(
+        np.allclose(np.asarray(b), a, atol=2e-3) for a, b in zip(lines, back))
+    return one and same
+
+
+def timed(name, f, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = f(*args, **kwargs)
+    t = time.perf_counter() - t0
+    return out, t
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and time the hatch fill')
+    parser.add_argument('--rows', type=int, default=100000, help='scanlines for the timing')
+    args = parser.parse_args()
+
+    ref_ok = all(check_reference(seed) for seed in range(20))
+    print(f'segments same as the per row loop: {ref_ok}')
+    holes_ok, n = check_holes()
+    print(f'nothing inside the holes: {holes_ok}, {n} polylines')
+    elem_ok = check_element()
+    print(f'rectangle is one zig-zag, element svg reads back: {elem_ok}')
+    joins_ok = all(check_joins(seed) for seed in range(20))
+    print(f'joins stay inside random polygons: {joins_ok}')
+
+    size = 100.0
+    spacing = size / args.rows
+    circle = xt.XcsCircle('c', xt.XcsPnt(0, 0), xt.XcsPnt(size, size))
+    outlines = xh.element_outlines(circle)
+    lines, t = timed('circle', xh.hatch_lines, outlines, spacing, 45)
+    nseg = sum(len(p) for p in lines) // 2
+    print(f'circle, {len(outlines[0])} edges: {nseg} segments in {len(lines)} polylines, {t:.3f} s')
+
+    r = random.Random(1)
+    shape = [[(0, 0), (size, 0), (size, size), (0, size)]]
+    for i in range(200):
+        shape.append(random_polygon(r, 24, r.uniform(10, 90), r.uniform(10, 90), 0.5, 2.0))
+    nedges = sum(len(p) for p in shape)
+    lines, t = timed('holes', xh.hatch_lines, shape, spacing, 0)
+    nseg = sum(len(p) for p in lines) // 2
+    print(f'square with 200 holes, {nedges} edges: {nseg} segments in {len(lines)} polylines, {t:.3f} s')
+    _, t = timed('svg', xh.hatch_svg, lines)
+    print(f'svg of it {t:.3f} s')
+    return 0 if ref_ok and holes_ok and elem_ok and joins_ok else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
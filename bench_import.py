@@ -0,0 +1,71 @@
+#!python3
+#
+# bench_import.py
+#
+# Import time of the post processor modules. Each run is a fresh python
+# process, so nothing is cached between runs.
+#
+#    python bench_import.py --path /usr/lib/freecad/lib
+#    python bench_import.py -n 20 xtoolgcode_post
+#
+# "import" is the bare import, what FreeCAD pays to fill the post dialog.
+# "tooltip" is the first access of TOOLTIP_ARGS, which builds the parsers.
+#
+# Run it with the python that comes with FreeCAD, or point --path at
+# the FreeCAD lib directory, so the FreeCAD modules can be found. Without
+# them the stand ins in fcstub/ are used, like bench_post.py does.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = '''
+import sys, time, json, importlib.util
+sys.path[:0] = {path!r}
+if importlib.util.find_spec('FreeCAD') is None:
+    sys.path.insert(0, {stub!r})
+t0 = time.perf_counter()
+import {module} as m
+t1 = time.perf_counter()
+m.TOOLTIP_ARGS
+t2 = time.perf_counter()
+print(json.dumps(dict(imp = t1 - t0, tooltip = t2 - t1)))
+'''
+
+
+def measure(module, path, runs):
+    here = os.path.dirname(os.path.abspath(__file__))
+    code = PROBE.format(module=module, path=path + [here], stub=os.path.join(here, 'fcstub'))
+    imp = list()
+    tooltip = list()
+    for i in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+        if out.returncode != 0:
+            print(out.stderr)
+            raise SystemExit(f'{module}: import failed')
+        d = json.loads(out.stdout.strip().splitlines()[-1])
+        imp.append(d['imp'])
+        tooltip.append(d['tooltip'])
+    return imp, tooltip
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time of the post processors')
+    parser.add_argument('modules', nargs='*', default=['xtoolgcode_post', 'xtoolxcs_post'])
+    parser.add_argument('-n', '--runs', type=int, default=10)
+    parser.add_argument('--path', action='append', default=[],
+                        help='directory to put in front of sys.path, may be repeated')
+    args = parser.parse_args()
+
+    print(f'{"module":20s} {"import ms":>16s} {"tooltip ms":>16s}')
+    print(f'{"":20s} {"min":>7s} {"median":>8s} {"min":>7s} {"median":>8s}')
+    for m in args.modules:
+        imp, tooltip = measure(m, args.path, args.runs)
+        print(f'{m:20s} {min(imp)*1e3:7.2f} {statistics.median(imp)*1e3:8.2f}'
+              f' {min(tooltip)*1e3:7.2f} {statistics.median(tooltip)*1e3:8.2f}')
+
+if __name__ == '__main__':
+    main()
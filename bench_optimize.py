@@ -0,0 +1,189 @@
+#!python3
+#
+# bench_optimize.py
+#
+# Checks and times the G-code optimizer in xtool_optimize.py.
+#
+#    python bench_optimize.py
+#    python bench_optimize.py --lines 1000000
+#
+# Random G-code is replayed before and after optimizing it. Every cut,
+# a G1 that moves in X or Y, must end at the same X and Y with the same
+# F and S. Cuts merged into one must have all their ends within the
+# tolerance of it. F and S are replayed both shared by G0 and G1 and
+# kept per move type. The G-code has
+# - G91 sections with relative moves
+# - modal motion, lines with no G word
+# - Z only moves with F and S on them
+# - collinear runs of short moves, zero length moves and F and S that
+#   change nothing
+# - time to optimize a long file
+
+import argparse
+import math
+import random
+import time
+
+import xtool_optimize as xo
+
+
+# Cuts of G-code, lists of (start, end, F, S). per_mode keeps F and S
+# per G0 and G1, else they are shared.
+def replay(gcode, per_mode=False):
+    mode = None
+    relative = False
+    pos = {'X' : 0.0, 'Y' : 0.0, 'Z' : 0.0}
+    shared = {'F' : None, 'S' : None}
+    modal = {'G0' : {'F' : None, 'S' : None}, 'G1' : {'F' : None, 'S' : None}}
+    cuts = list()
+    for line in gcode.splitlines():
+        words = xo.WORD.findall(xo.COMMENT.sub('', line).upper())
+        axes = dict()
+        settings = dict()
+        # F and S of an M3 line and the like go for both move types
+        other = any(letter not in xo.MOVE_WORDS for letter, text in words)
+        for letter, text in words:
+            v = float(text)
+            if letter == 'G':
+                g = 'G' + text
+                if g in xo.MOTION:
+                    mode = xo.MOTION[g]
+                elif v == 90:
+                    relative = False
+                elif v == 91:
+                    relative = True
+            elif letter in pos:
+                axes[letter] = v
+            elif letter in shared:
+                settings[letter] = v
+        if mode is None and not other:
+            continue
+
+        for k, v in settings.items():
+            shared[k] = v
+            for m in (modal if other else (mode,)):
+                modal[m][k] = v
+        start = (pos['X'], pos['Y'])
+        for k, v in axes.items():
+            pos[k] = pos[k] + v if relative else v
+        end = (pos['X'], pos['Y'])
+        if mode == 'G1' and end != start:
+            fs = modal['G1'] if per_mode else shared
+            cuts.append((start, end, fs['F'], fs['S']))
+    return cuts
+
+
+def _distance(p, a, b):
+    dx = b[0] - a[0]
+    dy = b[1] - a[1]
+    l2 = dx * dx + dy * dy
+    t = 0.0 if l2 == 0 else max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / l2))
+    return math.hypot(a[0] + t * dx - p[0], a[1] + t * dy - p[1])
+
+
+# every cut of after is a run of the cuts of before, in order, from the
+# same start to the same end at the same F and S
+def same_cuts(before, after, tol, eps=1e-9):
+    i = 0
+    for start, end, f, s in after:
+        if i == len(before) or math.dist(before[i][0], start) > eps:
+            return False
+        while True:
+            if i == len(before):
+                return False
+            b = before[i]
+            i += 1
+            if b[2:] != (f, s) or _distance(b[1], start, end) > tol + eps:
+                return False
+            if math.dist(b[1], end) <= eps:
+                break
+    return i == len(before)
+
+
+def _num(r, v):
+    return r.choice(('%.3f', '%.4f', '%g')) % v
+
+
+# random G-code, n blocks of cuts, rapids and the rest
+def random_gcode(r, n):
+    out = ['G21', 'G90', 'M4 S0']
+    x = y = 0.0
+    for k in range(n):
+        c = r.random()
+        if c < 0.1:
+            # relative section
+            out.append('G91')
+            for j in range(r.randint(1, 5)):
+                dx = r.uniform(-5, 5)
+                dy = r.uniform(-5, 5)
+                x += dx
+                y += dy
+                f = f' F{r.choice((600, 1200))}' if r.random() < 0.3 else ''
+                out.append(f'G1 X{_num(r, dx)} Y{_num(r, dy)}{f}')
+            out.append('G90')
+        elif c < 0.25:
+            # Z only moves that carry F or S
+            z = r.choice(('G0 Z5', 'G1 Z-1', 'Z0', 'G0 Z5.000'))
+            fs = r.choice(('', ' F600', ' S300', ' F1800 S0', ' S1000'))
+            out.append(z + fs)
+        elif c < 0.4:
+            # collinear run of short moves
+            a = r.uniform(0, 2 * math.pi)
+            step = r.uniform(0.05, 1.0)
+            out.append('G1' + (f' S{r.choice((200, 500, 1000))}' if r.random() < 0.5 else ''))
+            for j in range(r.randint(2, 12)):
+                x += step * math.cos(a)
+                y += step * math.sin(a)
+                noise = r.uniform(-0.004, 0.004)
+                out.append(f'X{_num(r, x + noise * math.sin(a))} Y{_num(r, y - noise * math.cos(a))}')
+        elif c < 0.5:
+            out.append(f'G0 X{_num(r, x)} Y{_num(r, y)}' + r.choice(('', ' F3000', ' S0')))
+        elif c < 0.55:
+            out.append(r.choice(('F1200', 'S500', 'F600 S200', 'G1 F1200')))
+        elif c < 0.6:
+            out.append(r.choice(('(comment)', 'M5', 'M4 S0', 'G4 P0.1', '; note')))
+        else:
+            x = r.uniform(0, 100)
+            y = r.uniform(0, 100)
+            g = r.choice(('G0 ', 'G1 ', 'G01 ', ''))
+            fs = r.choice(('', ' F1200', ' S800', ' F600 S1000', ' S0'))
+            out.append(f'{g}X{_num(r, x)} Y{_num(r, y)}{fs}')
+    out.append('M5')
+    return '\n'.join(out) + '\n'
+
+
+def check(seed, n=300, tol=xo.DEFAULT_TOLERANCE):
+    r = random.Random(seed)
+    gcode = random_gcode(r, n)
+    small, stats = xo.optimize_gcode(gcode, tol)
+    ok = all(same_cuts(replay(gcode, per_mode), replay(small, per_mode), tol)
+             for per_mode in (False, True))
+    return ok, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and time the G-code optimizer')
+    parser.add_argument('--lines', type=int, default=200000, help='blocks of G-code for the timing')
+    parser.add_argument('--seeds', type=int, default=50, help='random files to check')
+    args = parser.parse_args()
+
+    total = dict()
+    ok = True
+    for seed in range(args.seeds):
+        good, stats = check(seed)
+        ok = ok and good
+        for k, v in stats.items():
+            total[k] = total.get(k, 0) + v
+    print(f'cuts end at the same X, Y, F and S: {ok}')
+    print(f'{total["merged"]} merged, {total["zero_length"]} zero length, {total["z_moves"]} Z moves,'
+          f' {total["words"]} words dropped')
+
+    gcode = random_gcode(random.Random(1), args.lines)
+    t0 = time.perf_counter()
+    small, stats = xo.optimize_gcode(gcode)
+    t = time.perf_counter() - t0
+    print(f'{stats["lines_in"]} lines to {stats["lines_out"]} in {t:.3f} s')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
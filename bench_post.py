@@ -0,0 +1,304 @@
+#!python3
+#
+# bench_post.py
+#
+# Throughput of the post processor on synthetic jobs. Runs on a plain
+# python install, the FreeCAD stand-ins in fcstub/ are used when FreeCAD
+# can not be imported.
+#
+#    python bench_post.py                     200k commands
+#    python bench_post.py -c 2000000 -n 3     2M commands, best of 3
+#    python bench_post.py --compare           results of earlier runs
+#    python bench_post.py --pipeline          G-code and xcs at the same time
+#
+# A job is made of operations, each a grid of parts cut in Z step-downs:
+# rounded rectangles (G1 and G3), circles (G2), zig-zag hatching (G1) and
+# G0 travel between them. Power (S) changes with every pass and the feed
+# (F) with every operation, like a real laser job.
+#
+# With --order-paths it also checks that every cut keeps its feed and
+# power when the paths are reordered, with parts that leave F and S out
+# and cut at the ones before them.
+#
+# commands/s counts the FreeCAD commands going in, MB/s the G-code and
+# xcs coming out. Each run is appended to bench_results.jsonl with the
+# commit it ran on, --compare prints them side by side.
+
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+if importlib.util.find_spec('FreeCAD') is None:
+    sys.path.insert(0, os.path.join(HERE, 'fcstub'))
+
+import Path
+
+import UtilsXTool
+import xtool_path as xp
+
+RESULTS = os.path.join(HERE, 'bench_results.jsonl')
+
+
+# Stands in for a CAM operation
+class SyntheticOp:
+    def __init__(self, name, commands):
+        self.Name = name
+        self.Label = name
+        self.Path = Path.Path(commands)
+        self.Active = True
+
+
+def C(name, **params):
+    return Path.Command(name, params)
+
+
+def rounded_rect(x, y, w, h, r):
+    return [
+        C('G0', X=x + r, Y=y),
+        ('plunge',),
+        C('G1', X=x + w - r, Y=y),
+        C('G3', X=x + w, Y=y + r, I=0.0, J=r),
+        C('G1', X=x + w, Y=y + h - r),
+        C('G3', X=x + w - r, Y=y + h, I=-r, J=0.0),
+        C('G1', X=x + r, Y=y + h),
+        C('G3', X=x, Y=y + h - r, I=0.0, J=-r),
+        C('G1', X=x, Y=y + r),
+        C('G3', X=x + r, Y=y, I=r, J=0.0),
+    ]
+
+
+def circle(cx, cy, r):
+    return [
+        C('G0', X=cx + r, Y=cy),
+        ('plunge',),
+        C('G2', X=cx - r, Y=cy, I=-r, J=0.0),
+        C('G2', X=cx + r, Y=cy, I=r, J=0.0),
+    ]
+
+
+def hatch(x, y, w, h, step):
+    cmds = [C('G0', X=x, Y=y), ('plunge',)]
+    n = max(1, int(h / step))
+    for i in range(n):
+        yy = y + i * step
+        x0, x1 = (x, x + w) if i % 2 == 0 else (x + w, x)
+        cmds += [C('G1', X=x0, Y=yy), C('G1', X=x1, Y=yy)]
+    return cmds
+
+
+# The cuts of one part. ('plunge',) marks where the pass goes down to z.
+def part(r, x, y, size):
+    kind = r.random()
+    if kind < 0.5:
+        return rounded_rect(x, y, size, size * r.uniform(0.5, 1.0), size * r.uniform(0.05, 0.25))
+    if kind < 0.8:
+        return circle(x + size / 2, y + size / 2, size * r.uniform(0.2, 0.5))
+    return hatch(x, y, size, size / 2, size / r.randint(8, 20))
+
+
+# Commands of one operation, about ncommands of them
+def synthetic_commands(r, ncommands, feed, passes=3, pitch=12.0):
+    cmds = [C('(synthetic operation)'), C('G0', Z=5.0)]
+    columns = max(1, int(math.sqrt(ncommands / 12)))
+    i = 0
+    while len(cmds) < ncommands:
+        x = (i % columns) * pitch
+        y = (i // columns) * pitch
+        i += 1
+        cuts = part(r, x, y, pitch * 0.8)
+        for n in range(passes):
+            for c in cuts:
+                if isinstance(c, tuple):
+                    cmds.append(C('G1', Z=-0.5 * (n + 1), F=feed, S=float(200 + 250 * n)))
+                else:
+                    cmds.append(c)
+            cmds.append(C('G0', Z=5.0))
+    return cmds
+
+
+# A job of about ncommands commands in nops operations
+def synthetic_job(ncommands, nops=4, seed=0):
+    r = random.Random(seed)
+    ops = list()
+    for k in range(nops):
+        cmds = synthetic_commands(r, ncommands // nops, feed=10.0 + 5 * k)
+        ops.append(SyntheticOp(f'Synthetic{k:03d}', cmds))
+    return ops
+
+
+def job_commands(ops):
+    return sum(len(op.Path.Commands) for op in ops)
+
+
+def bench_values(args):
+    values = dict()
+    UtilsXTool.init_xtool_values(values)
+    # every run a full post, nothing reused from the one before
+    values["INCREMENTAL"] = False
+    values["SHARE_EXPORT"] = False
+    values["JOBS"] = args.jobs
+    values["PIPELINE"] = args.pipeline
+    values["ORDER_PATHS"] = args.order_paths
+    values["SVG_ARC_TOLERANCE"] = args.arc_tolerance
+    values["DEDUP"] = args.dedup
+    return values
+
+
+# seconds of each run and the output of the last one
+def run(values, ops, runs):
+    times = list()
+    out = None
+    for i in range(runs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            out = UtilsXTool.export_xtool(values, ops, 'bench')
+            times.append(time.perf_counter() - t0)
+    return times, out
+
+
+# (feed, power) of every cut of a job of squares, by its svg path, with
+# and without reordering. Some parts leave out F or S.
+def order_feeds(seed=0, parts=60):
+    r = random.Random(seed)
+    cmds = list()
+    for k in range(parts):
+        sq = xp.square_commands(r.uniform(0, 200), r.uniform(0, 200), r.uniform(2, 20), 1,
+                                r.choice([5.0, 10.0, 20.0]), r.choice([100, 300, 500]))
+        # the plunge has the F, the first cut the S
+        if r.random() < 0.4:
+            del sq[2][1]['F']
+        if r.random() < 0.4:
+            del sq[3][1]['S']
+        cmds += sq
+    feeds = list()
+    for order in (False, True):
+        values = xp.default_values()
+        values["ORDER_PATHS"] = order
+        xp.init_format(values)
+        dout = xp.parse_commands(values, xp.new_dout(600.0, 200), cmds)
+        feeds.append(sorted((p['svg'], p['feed'], p['power']) for p in dout['svgps']))
+    return feeds[0] == feeds[1]
+
+
+def git_commit():
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                             capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=HERE,
+                               capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return 'unknown'
+    if not rev:
+        return 'unknown'
+    return rev + ('+' if dirty else '')
+
+
+def load_results(fn):
+    results = list()
+    try:
+        with open(fn, 'r') as f:
+            for line in f:
+                if line.strip():
+                    results.append(json.loads(line))
+    except OSError:
+        pass
+    return results
+
+
+def compare(fn):
+    results = load_results(fn)
+    if not results:
+        print(f'no results in {fn}')
+        return
+    print(f'{"date":19s} {"commit":10s} {"commands":>9s} {"jobs":>4s} {"seconds":>8s}'
+          f' {"cmd/s":>9s} {"MB/s":>6s} {"vs first":>8s}')
+    first = dict()
+    for r in results:
+        # compare like with like
+        key = (r['commands'], r['jobs'], r.get('options'))
+        base = first.setdefault(key, r['commands_per_s'])
+        print(f'{r["date"]:19s} {r["commit"]:10s} {r["commands"]:9d} {r["jobs"]:4d}'
+              f' {r["seconds"]:8.3f} {r["commands_per_s"]:9.0f} {r["mb_per_s"]:6.2f}'
+              f' {r["commands_per_s"] / base:7.2f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput of the xTool post processor')
+    parser.add_argument('-c', '--commands', type=float, default=200000,
+                        help='commands in the job, default 200000')
+    parser.add_argument('--ops', type=int, default=4, help='operations in the job, default 4')
+    parser.add_argument('-n', '--runs', type=int, default=1, help='runs, the best one counts')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--jobs', type=int, default=1, help='parse operations in parallel')
+    parser.add_argument('--pipeline', nargs='?', const='process', choices=['thread', 'process'],
+                        help='make the G-code and the xcs at the same time, also checks the output'
+                        ' against a serial post')
+    parser.add_argument('--order-paths', action='store_true')
+    parser.add_argument('--arc-tolerance', type=float, default=0.0)
+    parser.add_argument('--dedup', action='store_true')
+    parser.add_argument('--results', default=RESULTS, help='results file')
+    parser.add_argument('--no-save', action='store_true', help='do not add this run to the results')
+    parser.add_argument('--compare', action='store_true', help='print the results of earlier runs')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.results)
+        return
+
+    xp.VERBOSE = False
+    values = bench_values(args)
+
+    t0 = time.perf_counter()
+    ops = synthetic_job(int(args.commands), args.ops, args.seed)
+    ncommands = job_commands(ops)
+    print(f'{ncommands} commands in {len(ops)} operations, made in {time.perf_counter() - t0:.1f} s')
+
+    if args.order_paths:
+        print(f'reordered cuts keep their feed and power: {order_feeds(args.seed)}')
+
+    times, (gcode, xcs) = run(values, ops, args.runs)
+    t = min(times)
+    if args.pipeline:
+        values["PIPELINE"] = None
+        serial_times, serial = run(values, ops, 1)
+        print(f'serial post {serial_times[0]:.3f} s, same output: {serial == (gcode, xcs)}')
+    nbytes = len(gcode) + len(xcs)
+    result = dict(
+        date = datetime.datetime.now().isoformat(timespec='seconds'),
+        commit = git_commit(),
+        python = platform.python_version(),
+        machine = platform.machine(),
+        commands = ncommands,
+        ops = len(ops),
+        jobs = args.jobs,
+        options = f'order_paths={args.order_paths} arc_tolerance={args.arc_tolerance}'
+                  + (' dedup' if args.dedup else '')
+                  + (f' pipeline={args.pipeline}' if args.pipeline else ''),
+        seconds = t,
+        gcode_bytes = len(gcode),
+        xcs_bytes = len(xcs),
+        commands_per_s = ncommands / t,
+        mb_per_s = nbytes / t / 1e6,
+    )
+    print(f'{t:.3f} s, {result["commands_per_s"]:.0f} commands/s, {result["mb_per_s"]:.2f} MB/s'
+          f' ({len(gcode) / 1e6:.1f} MB G-code, {len(xcs) / 1e6:.1f} MB xcs)')
+
+    if not args.no_save:
+        with open(args.results, 'a') as f:
+            f.write(json.dumps(result) + '\n')
+        print(f'saved to {args.results} as {result["commit"]}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!python3
+#
+# bench_transform.py
+#
+# Checks and times the batch transforms in xtool_transform.py.
+#
+#    python bench_transform.py
+#    python bench_transform.py -n 200000
+#
+# - PATH, PEN and LINE elements draw the same lines as before, through the
+#   matrix, for a matrix that turns, scales, skews and mirrors
+# - the corners of RECT and CIRCLE elements go through a matrix that
+#   turns, scales and mirrors
+# - group bounds move with the group
+# - time to turn a canvas of svg paths, all at once and one element at
+#   a time, and to move it next to a place() loop, which is as fast
+
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+
+import xtool_estimate
+import xtool_transform as xf
+import xtool_xcs as xt
+
+
+# largest distance of a point of one set of polylines to the segments of
+# the other one, both ways
+def distance(p, q):
+    def one_way(p, q):
+        segs = [(a, b) for poly in q for a, b in zip(poly[:-1], poly[1:])]
+        a = np.asarray([s[0] for s in segs], dtype=float)
+        ab = np.asarray([s[1] for s in segs], dtype=float) - a
+        worst = 0.0
+        for pt in (pt for poly in p for pt in poly):
+            ap = np.asarray(pt) - a
+            t = np.clip((ap * ab).sum(axis=1) / np.maximum((ab * ab).sum(axis=1), 1e-30), 0, 1)
+            worst = max(worst, float(np.hypot(*(ap - ab * t[:, None]).T).min()))
+        return worst
+    return max(one_way(p, q), one_way(q, p))
+
+
+def drawn(e):
+    return xtool_estimate.element_polylines(e.encode())
+
+
+def point_elements(r):
+    elements = [
+        xt.XcsPath('lines').setpath(3, 4, 'M10 10 L20 10 l0 5 H12 v-3 h-1 V10 Z'),
+        xt.XcsPath('curves').setpath(0, 0, 'M0 0 C10 0 10 10 20 10 S30 20 40 20 Q50 0 60 10 T80 10'),
+        xt.XcsPath('arcs').setpath(20, 5, 'M0 0 A10 5 30 0 1 15 5 a4 4 0 1 0 6 0 L0 0'),
+        xt.XcsPath('hatch').setpath(7, 7, 'M1.5 2.5l10 0 0 1 -10 0 0 1 10 0'),
+        xt.XcsPen('pen').setpoints([xt.XcsPnt(r.uniform(0, 50), r.uniform(0, 50)) for i in range(6)]),
+        xt.XcsLine('line', xt.XcsPnt(1, 2), xt.XcsPnt(30, 12)),
+    ]
+    elements[-2].place(5, 6)
+    return elements
+
+
+def check_points(seed=0):
+    r = random.Random(seed)
+    elements = point_elements(r)
+    m = xf.compose(xf.skewing(12), xf.scaling(1.5, -0.8), xf.rotation(33, 10, 10), xf.translation(7, -3))
+    before = [drawn(e) for e in elements]
+    xf.transform(elements, m)
+    worst = 0.0
+    for e, polys in zip(elements, before):
+        want = [[xf.apply(m, x, y) for x, y in p] for p in polys]
+        worst = max(worst, distance(drawn(e), want))
+    # the curves are drawn with straight lines before and after
+    return worst < 0.1, worst
+
+
+def corners(e):
+    x, y, w, h = e.x, e.y, e.width, e.height
+    t = math.radians(e.angle)
+    cx, cy = x + w / 2, y + h / 2
+    pts = [(-w / 2, -h / 2), (w / 2, -h / 2), (w / 2, h / 2), (-w / 2, h / 2)]
+    return sorted((round(cx + u * math.cos(t) - v * math.sin(t), 6), round(cy + u * math.sin(t) + v * math.cos(t), 6))
+                  for u, v in pts)
+
+
+def check_boxes():
+    rect = xt.XcsRect('r', xt.XcsPnt(10, 20), xt.XcsPnt(50, 40))
+    circle = xt.XcsCircle('c', xt.XcsPnt(0, 0), xt.XcsPnt(8, 8))
+    m = xf.compose(xf.rotation(25, 3, 4), xf.scaling(-2, 2), xf.translation(1, 1))
+    want = [sorted((round(a, 6), round(b, 6)) for a, b in (xf.apply(m, x, y) for x, y in corners(e)))
+            for e in (rect, circle)]
+    xf.transform([rect, circle], m)
+    ok = want == [corners(rect), corners(circle)]
+
+    try:
+        xf.transform([rect], xf.skewing(10))
+        ok = False
+    except ValueError:
+        pass
+    return ok
+
+
+def check_groups():
+    xt.XcsCanvas.canvi = list()
+    canvas = xt.XcsCanvas()
+    r = random.Random(2)
+    for g in ('a', 'b'):
+        for e in point_elements(r):
+            canvas.add_element(e.group(g))
+    before = xf.group_bounds(canvas.elements)
+    xf.transform_group(canvas, 'a', xf.translation(100, 50))
+    after = xf.group_bounds(canvas.elements)
+    moved = all(abs(p - q - t) < 1e-9 for p, q, t in zip(after['a'], before['a'], (100, 50, 100, 50)))
+    return moved and after['b'] == before['b']
+
+
+# svg paths like the posts make them
+def path_canvas(n, seed=0):
+    r = random.Random(seed)
+    xt.XcsCanvas.canvi = list()
+    canvas = xt.XcsCanvas()
+    for i in range(n):
+        x, y = r.uniform(0, 300), r.uniform(0, 300)
+        d = 'M%.3f %.3f' % (x, y) + ''.join(
+            ' L%.3f %.3f' % (r.uniform(0, 300), r.uniform(0, 300)) for j in range(r.randint(2, 12)))
+        canvas.add_element(xt.XcsPath('svg').setpath(x, y, d).group('job'))
+    return canvas
+
+
+def timed(f):
+    t0 = time.perf_counter()
+    f()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and time the batch transforms')
+    parser.add_argument('-n', '--paths', type=int, default=100000, help='svg paths in the timed canvas')
+    args = parser.parse_args()
+
+    points_ok, worst = check_points()
+    print(f'paths, pens and lines draw the same: {points_ok}, {worst:.4f} mm')
+    boxes_ok = check_boxes()
+    print(f'rect and circle corners, no skew: {boxes_ok}')
+    groups_ok = check_groups()
+    print(f'group bounds move with the group: {groups_ok}')
+
+    m = xf.rotation(30, 150, 150)
+    canvas = path_canvas(args.paths)
+    t_batch = timed(lambda: xf.transform_canvas(canvas, m))
+    canvas = path_canvas(args.paths)
+    t_one = timed(lambda: [xf.transform([e], m) for e in canvas.elements])
+    print(f'turn {args.paths} paths: {t_batch:.3f} s at once, {t_one:.3f} s one at a time')
+
+    t_move = timed(lambda: xf.transform_canvas(canvas, xf.translation(5, 5)))
+    t_place = timed(lambda: [e.place(e.x + 5, e.y + 5) for e in canvas.elements])
+    print(f'move {args.paths} paths: {t_move:.3f} s, place() loop {t_place:.3f} s')
+    return 0 if points_ok and boxes_ok and groups_ok else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,182 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 whodafloater
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# **************************************************************************
+#
+# FreeCAD.py
+#
+# Stand-in for the FreeCAD module, see README.md
+
+import math
+
+GuiUp = False
+
+
+class Vector:
+    __slots__ = ('x', 'y', 'z')
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        if isinstance(x, Vector):
+            x, y, z = x.x, x.y, x.z
+        self.x = float(x)
+        self.y = float(y)
+        self.z = float(z)
+
+    def __repr__(self):
+        return f'Vector ({self.x}, {self.y}, {self.z})'
+
+    def __eq__(self, o):
+        return self.x == o.x and self.y == o.y and self.z == o.z
+
+    def __add__(self, o):
+        return Vector(self.x + o.x, self.y + o.y, self.z + o.z)
+
+    def __sub__(self, o):
+        return Vector(self.x - o.x, self.y - o.y, self.z - o.z)
+
+    def __neg__(self):
+        return Vector(-self.x, -self.y, -self.z)
+
+    def __mul__(self, o):
+        if isinstance(o, Vector):
+            return self.dot(o)
+        return Vector(self.x * o, self.y * o, self.z * o)
+
+    __rmul__ = __mul__
+
+    @property
+    def Length(self):
+        return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+
+    def normalize(self):
+        l = self.Length
+        self.x /= l
+        self.y /= l
+        self.z /= l
+        return self
+
+    def dot(self, o):
+        return self.x * o.x + self.y * o.y + self.z * o.z
+
+    def cross(self, o):
+        return Vector(self.y * o.z - self.z * o.y,
+                      self.z * o.x - self.x * o.z,
+                      self.x * o.y - self.y * o.x)
+
+    def getAngle(self, o):
+        d = self.dot(o) / (self.Length * o.Length)
+        return math.acos(max(-1.0, min(1.0, d)))
+
+    def distanceToPoint(self, o):
+        return (self - o).Length
+
+
+class Units:
+    Length = 'Length'
+    Velocity = 'Velocity'
+
+    # value of one unit in FreeCAD internal units, mm and mm/s
+    UNITS = {'mm' : 1.0, 'cm' : 10.0, 'm' : 1000.0, 'in' : 25.4,
+             'mm/s' : 1.0, 'mm/min' : 1.0 / 60.0, 'm/min' : 1000.0 / 60.0,
+             'in/s' : 25.4, 'in/min' : 25.4 / 60.0}
+
+    class Quantity:
+        # Quantity(12.5, FreeCAD.Units.Length) is 12.5 mm,
+        # Quantity('1 in') is 25.4 mm
+        def __init__(self, value=0.0, unit=None):
+            if isinstance(value, str):
+                parts = value.split()
+                value = float(parts[0])
+                if len(parts) > 1:
+                    value *= Units.UNITS[parts[1]]
+            self.Value = float(value)
+            self.Unit = unit
+
+        def getValueAs(self, unit):
+            return Units.Quantity(self.Value / Units.UNITS[unit], self.Unit)
+
+        def __float__(self):
+            return self.Value
+
+        def __int__(self):
+            return int(self.Value)
+
+        def __neg__(self):
+            return Units.Quantity(-self.Value, self.Unit)
+
+        # quantities compare and count with each other and with numbers,
+        # by their value in internal units
+        @staticmethod
+        def _value(o):
+            return o.Value if isinstance(o, Units.Quantity) else float(o)
+
+        def __eq__(self, o):
+            try:
+                return self.Value == self._value(o)
+            except (TypeError, ValueError):
+                return NotImplemented
+
+        def __hash__(self):
+            return hash(self.Value)
+
+        def __lt__(self, o):
+            return self.Value < self._value(o)
+
+        def __le__(self, o):
+            return self.Value <= self._value(o)
+
+        def __gt__(self, o):
+            return self.Value > self._value(o)
+
+        def __ge__(self, o):
+            return self.Value >= self._value(o)
+
+        def __add__(self, o):
+            return Units.Quantity(self.Value + self._value(o), self.Unit)
+
+        def __radd__(self, o):
+            return Units.Quantity(self._value(o) + self.Value, self.Unit)
+
+        def __sub__(self, o):
+            return Units.Quantity(self.Value - self._value(o), self.Unit)
+
+        def __rsub__(self, o):
+            return Units.Quantity(self._value(o) - self.Value, self.Unit)
+
+        def __mul__(self, o):
+            return Units.Quantity(self.Value * self._value(o), self.Unit)
+
+        def __rmul__(self, o):
+            return Units.Quantity(self._value(o) * self.Value, self.Unit)
+
+        def __truediv__(self, o):
+            return Units.Quantity(self.Value / self._value(o), self.Unit)
+
+        def __rtruediv__(self, o):
+            return Units.Quantity(self._value(o) / self.Value, self.Unit)
+
+        def __str__(self):
+            return str(self.Value)
+
+        def __format__(self, spec):
+            return format(self.Value, spec)
+
+
+def Console():
+    pass
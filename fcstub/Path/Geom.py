@@ -0,0 +1,35 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 whodafloater
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# **************************************************************************
+#
+# Path/Geom.py
+#
+# Stand-in for FreeCAD Path.Geom, see README.md
+
+from FreeCAD import Vector
+
+
+# Vector of the end point of cmd. Axes cmd does not have come from
+# defaultPoint.
+def commandEndPoint(cmd, defaultPoint=Vector(), X='X', Y='Y', Z='Z'):
+    x = cmd.Parameters.get(X, defaultPoint.x)
+    y = cmd.Parameters.get(Y, defaultPoint.y)
+    z = cmd.Parameters.get(Z, defaultPoint.z)
+    return Vector(x, y, z)
@@ -0,0 +1,144 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 whodafloater
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# **************************************************************************
+#
+# Path/Post/UtilsArguments.py
+#
+# Stand-in for FreeCAD Path.Post.UtilsArguments, see README.md
+#
+# The values and arguments the xTool posts read, with the FreeCAD
+# defaults. Argument visibility is not modelled, every argument is shown.
+
+import argparse
+import shlex
+
+
+def init_shared_values(values):
+    values["AXIS_PRECISION"] = 3
+    values["COMMAND_SPACE"] = " "
+    values["COMMENT_SYMBOL"] = "("
+    values["ENABLE_COOLANT"] = False
+    values["LINENR"] = 100
+    values["LINE_INCREMENT"] = 10
+    values["MACHINE_NAME"] = "unknown machine"
+    values["MODAL"] = False
+    values["OUTPUT_COMMENTS"] = True
+    values["OUTPUT_DOUBLES"] = True
+    values["OUTPUT_HEADER"] = True
+    values["OUTPUT_LINE_NUMBERS"] = False
+    values["OUTPUT_PATH_LABELS"] = False
+    values["PARAMETER_ORDER"] = ["X", "Y", "Z", "A", "B", "C", "I", "J", "F", "S",
+                                 "T", "Q", "R", "L", "H", "D", "P"]
+    values["POSTAMBLE"] = ""
+    values["POSTPROCESSOR_FILE_NAME"] = ""
+    values["POST_OPERATION"] = ""
+    values["PREAMBLE"] = ""
+    values["PRE_OPERATION"] = ""
+    values["SHOW_EDITOR"] = False
+    values["UNITS"] = "G21"
+    values["UNIT_FORMAT"] = "mm"
+    values["UNIT_SPEED_FORMAT"] = "mm/min"
+
+
+def init_argument_defaults(argument_defaults):
+    argument_defaults["axis-modal"] = False
+    argument_defaults["comments"] = True
+    argument_defaults["header"] = True
+    argument_defaults["line-numbers"] = False
+    argument_defaults["metric_inch"] = True
+    argument_defaults["modal"] = False
+    argument_defaults["show-editor"] = True
+
+
+def init_arguments_visible(arguments_visible):
+    for k in ("axis-modal", "comments", "header", "line-numbers", "metric_inch",
+              "modal", "postamble", "preamble", "precision", "show-editor"):
+        arguments_visible[k] = True
+
+
+def init_shared_arguments(values, argument_defaults, arguments_visible):
+    parser = argparse.ArgumentParser(
+        prog=values["MACHINE_NAME"], usage=argparse.SUPPRESS, add_help=False)
+    shared = parser.add_argument_group("Arguments that are shared with all postprocessors")
+    shared.add_argument("--axis-modal", action="store_true",
+                        help="Don't output axis values if they are the same as the previous line")
+    shared.add_argument("--comments", action="store_true", default=None,
+                        help="Output comments (default)")
+    shared.add_argument("--no-comments", action="store_true",
+                        help="Suppress comment output")
+    shared.add_argument("--header", action="store_true", default=None,
+                        help="Output headers (default)")
+    shared.add_argument("--no-header", action="store_true",
+                        help="Suppress header output")
+    shared.add_argument("--line-numbers", action="store_true",
+                        help="Prefix with line numbers")
+    shared.add_argument("--modal", action="store_true",
+                        help="Don't output the G-command name if it is the same as the previous line")
+    shared.add_argument("--precision", default=None,
+                        help="Number of digits of precision, default is 3")
+    shared.add_argument("--preamble", help="Set commands to be issued before the first command")
+    shared.add_argument("--postamble", help="Set commands to be issued after the last command")
+    shared.add_argument("--show-editor", action="store_true", default=None,
+                        help="Pop up editor before writing output")
+    shared.add_argument("--no-show-editor", action="store_true",
+                        help="Don't pop up editor before writing output")
+    shared.add_argument("--output_all_arguments", action="store_true",
+                        help="Output all of the available arguments")
+    shared.add_argument("--output_visible_arguments", action="store_true",
+                        help="Output all of the visible arguments")
+    return parser
+
+
+# (True, args) to go on, (False, text) to return text instead of G-code
+def process_shared_arguments(values, parser, argstring, all_visible, filename):
+    try:
+        args = parser.parse_args(shlex.split(argstring))
+    except SystemExit:
+        return (False, "")
+    if args.output_all_arguments:
+        return (False, all_visible.format_help())
+    if args.output_visible_arguments:
+        return (False, parser.format_help())
+
+    if args.axis_modal:
+        values["OUTPUT_DOUBLES"] = False
+    if args.no_comments:
+        values["OUTPUT_COMMENTS"] = False
+    if args.comments:
+        values["OUTPUT_COMMENTS"] = True
+    if args.no_header:
+        values["OUTPUT_HEADER"] = False
+    if args.header:
+        values["OUTPUT_HEADER"] = True
+    if args.line_numbers:
+        values["OUTPUT_LINE_NUMBERS"] = True
+    if args.modal:
+        values["MODAL"] = True
+    if args.precision is not None:
+        values["AXIS_PRECISION"] = int(args.precision)
+    if args.preamble is not None:
+        values["PREAMBLE"] = args.preamble.replace("\\n", "\n")
+    if args.postamble is not None:
+        values["POSTAMBLE"] = args.postamble.replace("\\n", "\n")
+    if args.no_show_editor:
+        values["SHOW_EDITOR"] = False
+    if args.show_editor:
+        values["SHOW_EDITOR"] = True
+    return (True, args)
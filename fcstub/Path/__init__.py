@@ -0,0 +1,56 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 whodafloater
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# **************************************************************************
+#
+# Path/__init__.py
+#
+# Stand-in for the FreeCAD Path module, see README.md
+
+
+class Command:
+    __slots__ = ('Name', 'Parameters')
+
+    def __init__(self, name='', parameters=None):
+        self.Name = name
+        self.Parameters = dict(parameters or {})
+
+    def toGCode(self):
+        return self.Name + ''.join(f' {k}{v:f}' for k, v in self.Parameters.items())
+
+    def __repr__(self):
+        return f'Command {self.toGCode()}'
+
+
+class Path:
+    def __init__(self, commands=None):
+        self.Commands = list(commands or [])
+
+    def addCommands(self, commands):
+        if isinstance(commands, Command):
+            commands = [commands]
+        self.Commands += commands
+        return self
+
+    @property
+    def Size(self):
+        return len(self.Commands)
+
+    def toGCode(self):
+        return ''.join(c.toGCode() + '\n' for c in self.Commands)
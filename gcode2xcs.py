@@ -0,0 +1,139 @@
+#!python3
+# ***************************************************************************
+# *   Copyright (c) 2024 whodafloater
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# **************************************************************************
+#
+# gcode2xcs.py
+#
+# Convert G-code from other CAM tools to an XTool Creative Space project.
+# No FreeCAD needed.
+#
+#    python gcode2xcs.py part.nc
+#    python gcode2xcs.py --rapid-lift -o job a.gcode b.gcode
+#
+# Each input file becomes a canvas, or several with the --split options.
+# Paths are split on Z, feed and power changes the same way the FreeCAD
+# post does it. The input is read one line at a time and goes through the
+# post in chunks of CHUNK_COMMANDS commands, cut between paths, so only
+# the svg paths of the whole file are kept. --order-paths needs all the
+# paths of a file at once and reads it as one chunk.
+
+import argparse
+import os
+import time
+
+import xtool_xcs as xt
+import xtool_path as xp
+import xtool_gcode as xg
+
+
+# commands read before they go through the post, about 20 MB of them
+CHUNK_COMMANDS = 100000
+
+
+def convert(filename, values, use_mmap=False, flip_y=False, rapid_lift=False):
+    dout = xp.new_dout()
+    cmds = xg.read_gcode(filename, use_mmap, flip_y, rapid_lift)
+    if values.get("ORDER_PATHS", False):
+        xp.parse_commands(values, dout, cmds)
+        return dout
+    for position, chunk in xp.command_chunks(cmds, CHUNK_COMMANDS):
+        xp.parse_commands(values, dout, chunk, position)
+    return dout
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Convert G-code files to an XTool Creative Space project')
+    parser.add_argument('files', nargs='+', help='G-code files, one canvas each')
+    parser.add_argument('-o', '--output', default=None,
+                        help='project name, .xcs is added. Default is the first input file name')
+    parser.add_argument('--mmap', action='store_true',
+                        help='memory map the input files')
+    parser.add_argument('--flip-y', action='store_true',
+                        help='input Y axis points down, like xTool D1 G-code')
+    parser.add_argument('--rapid-lift', action='store_true',
+                        help='input has no Z moves, cut on feed moves and travel on rapids')
+    parser.add_argument('--precision', type=int, default=3,
+                        help='number of digits after the decimal point')
+    parser.add_argument('--arc-tolerance', type=float, default=0.0,
+                        help='draw runs of lines that follow a circle within this many mm as arcs')
+    parser.add_argument('--order-paths', action='store_true',
+                        help='reorder the paths for less rapid travel, inside paths first')
+    parser.add_argument('--dedup', action='store_true',
+                        help='leave out moves that go nowhere after rounding to --precision')
+    parser.add_argument('--split-elements', type=int, default=0,
+                        help='start a new canvas after this many elements')
+    parser.add_argument('--split-length', type=float, default=0.0,
+                        help='start a new canvas after this many mm of cut')
+    parser.add_argument('--split-bytes', type=float, default=0.0,
+                        help='start a new canvas when it would go over this many MB')
+    parser.add_argument('--xcs-version', default=xt.XCS_VERSION, choices=list(xt.XCS_VERSIONS),
+                        help='xTool Creative Space version to write the project for')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='print every command')
+    args = parser.parse_args(argv)
+
+    xp.VERBOSE = args.verbose
+
+    values = xp.default_values()
+    values["AXIS_PRECISION"] = args.precision
+    values["OUTPUT_GCODE"] = False
+    values["SVG_ARC_TOLERANCE"] = args.arc_tolerance
+    values["ORDER_PATHS"] = args.order_paths
+    values["DEDUP"] = args.dedup
+    xp.init_format(values)
+
+    output = args.output
+    if output is None:
+        output = os.path.splitext(args.files[0])[0]
+
+    xt.XcsCanvas.canvi = list()
+    for f in args.files:
+        t0 = time.perf_counter()
+        try:
+            dout = convert(f, values, args.mmap, args.flip_y, args.rapid_lift)
+        except ValueError as e:
+            print(f'{f}: {e}')
+            return 1
+        t = time.perf_counter() - t0
+
+        group = os.path.splitext(os.path.basename(f))[0]
+        if len(dout['svgps']) == 0:
+            print(f'{f}: no paths found')
+            continue
+        canvases = xp.svg_canvases(dout['svgps'], dout['glob_bound'], group,
+                                   args.split_elements, args.split_length,
+                                   int(args.split_bytes * 1e6))
+        for n, canvas in enumerate(canvases, 1):
+            canvas.title = group if len(canvases) == 1 else f'{group} {n}'
+        print(f'{f}: {len(dout["svgps"])} paths in {t:.3f} s')
+        if len(canvases) > 1:
+            print(f'{f}: split over {len(canvases)} canvases')
+
+    if len(xt.XcsCanvas.canvi) == 0:
+        return 1
+
+    xt.XcsCanvas.active_canvas = xt.XcsCanvas.canvi[0]
+    xt.XcsSave(output, args.xcs_version)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,132 @@
+#!python3
+# ***************************************************************************
+# *   Copyright (c) 2024 whodafloater
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# **************************************************************************
+#
+# test_cards.py
+#
+# Test cards for a table of materials, one .xcs project each, the cards
+# test_cuts.py makes without editing it for every material.
+#
+#    python test_cards.py
+#    python test_cards.py my_materials.json -o cards --jobs 4
+#    python test_cards.py --only 3mm_cardboard
+#
+# The table is json, see test_cards.json. Each material has a name and
+# speed and power sweeps as [start, stop, count]. shape is "box" or "U",
+# passes the repeat count and frame adds a box around the card to cut it
+# from the panel. width, height, shape and passes at the top of the table
+# are the defaults for all materials.
+#
+# The cards are made and written in a process pool, the time of each card
+# is measured in its worker.
+
+import argparse
+import json
+import os
+import time
+
+import xtool_xcs as xt
+import test_cuts
+
+SHAPES = ('box', 'U')
+
+
+def read_table(filename):
+    with open(filename) as f:
+        table = json.load(f)
+    defaults = dict(width = table.get('width', 10), height = table.get('height', 20),
+                    shape = table.get('shape', 'box'), passes = table.get('passes', 1),
+                    frame = table.get('frame', False))
+    materials = list()
+    names = set()
+    for m in table['materials']:
+        m = defaults | m
+        if 'name' not in m:
+            raise ValueError(f'{filename}: a material has no name')
+        if m['name'] in names:
+            raise ValueError(f'{filename}: {m["name"]} is in the table twice')
+        names.add(m['name'])
+        if m['shape'] not in SHAPES:
+            raise ValueError(f'{m["name"]}: shape {m["shape"]} is not one of {", ".join(SHAPES)}')
+        for key in ('speed', 'power'):
+            if len(m.get(key, ())) != 3 or m[key][2] < 2:
+                raise ValueError(f'{m["name"]}: {key} must be [start, stop, count] with count 2 or more')
+        materials.append(m)
+    return materials
+
+
+# Makes one card and saves it as outdir/name.xcs. Runs in a worker, the
+# canvas list is global so it starts with a new one every time.
+def make_card(material, outdir):
+    t0 = time.perf_counter()
+    xt.XcsCanvas.canvi = list()
+    canvas = xt.XcsCanvas()
+    canvas.title = material['name']
+    test_cuts.addtestcard(canvas, material['width'], material['height'],
+                          test_cuts.steps(*material['speed']),
+                          test_cuts.steps(*material['power']),
+                          material['passes'], material['shape'], material['frame'])
+    filename = os.path.join(outdir, material['name'])
+    xt.XcsSave(filename)
+    t = time.perf_counter() - t0
+    return material['name'], filename + '.xcs', len(canvas.elements), os.path.getsize(filename + '.xcs'), t
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Make laser test cards for a table of materials')
+    parser.add_argument('table', nargs='?', default='test_cards.json',
+                        help='json table of materials and sweeps')
+    parser.add_argument('-o', '--output-dir', default='.',
+                        help='directory for the .xcs files')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='worker processes, 1 makes the cards one by one')
+    parser.add_argument('--only', nargs='+', default=None, metavar='NAME',
+                        help='make only these materials')
+    args = parser.parse_args(argv)
+
+    try:
+        materials = read_table(args.table)
+    except (OSError, ValueError, KeyError) as e:
+        parser.error(f'{args.table}: {e}')
+    if args.only:
+        missing = set(args.only) - set(m['name'] for m in materials)
+        if missing:
+            parser.error(f'not in {args.table}: {", ".join(sorted(missing))}')
+        materials = [m for m in materials if m['name'] in args.only]
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    t0 = time.perf_counter()
+    if args.jobs > 1 and len(materials) > 1:
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(args.jobs, len(materials))) as pool:
+            futures = [pool.submit(make_card, m, args.output_dir) for m in materials]
+            cards = [f.result() for f in futures]
+    else:
+        cards = [make_card(m, args.output_dir) for m in materials]
+    wall = time.perf_counter() - t0
+
+    for name, filename, elements, size, t in cards:
+        print(f'{name:20s} {elements:5d} elements {size / 1e3:8.1f} kB {t:8.3f} s  {filename}')
+    print(f'{len(cards)} cards in {wall:.3f} s, {sum(c[4] for c in cards):.3f} s of card time')
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -39,96 +39,45 @@ def addtestU(canvas, w, h, x, y, p, s, n):
     canvas.add_element(annotation(str(int(s)), x+w/2, y+h*2/4))
     canvas.add_element(annotation(str(int(n)), x+w/2, y+h*3/4))
 
+def addtestcard(canvas, w, h, speed, power, npass, shape='box', frame=False):
+    # rows of power, columns of speed
+    add = addtestU if shape == 'U' else addtestbox
+    margin = 5 if frame else 0
+    for pi in range(len(power)):
+        for si in range(len(speed)):
+            x = margin + si*(w+5)
+            y = margin + pi*(h+5)
+            add(canvas, w, h, x, y, power[pi], speed[si], npass)
+
+    if frame:
+        # surrounding box at last speed and power setting
+        # to cut this test card from the panel
+        r = xt.XcsRect('rect', xt.XcsPnt(0,0), xt.XcsPnt(10,10))
+        r. place(0, 0). size(5+(w+5)*len(speed), 5+(h+5)*len(power)) .add_process('VECTOR_CUTTING', power[-1], speed[-1], npass)
+        canvas.add_element(r)
+    return canvas
+
 def main():
 
     w = 10
     h = 20
 
-    n = 6
-    m = 3
-
-    npass = 1
-    speed = steps(80, 10,  n)
-    power = steps(50, 100, m)
-
     canvas1 = xt.XcsCanvas()
-
-    for pi in range(m):
-        for si in range(n):
-            x = si*(w+5)
-            y = pi*(h+5)
-            s = speed[si]
-            p = power[pi]
-            addtestbox(canvas1, w, h, x, y, p, s, npass)
-
-    n = 6
-    m = 3
-    npass = 2
-    speed = steps(5,   10, n)
-    power = steps(70, 100, m)
+    addtestcard(canvas1, w, h, steps(80, 10, 6), steps(50, 100, 3), 1)
 
     canvas2 = xt.XcsCanvas()
-    for pi in range(m):
-        for si in range(n):
-            x = si*(w+5)
-            y = pi*(h+5)
-            s = speed[si]
-            p = power[pi]
-            #addtestbox(canvas2, w, h, x, y, p, s, npass)
-            addtestU(canvas2, w, h, x, y, p, s, npass)
-
+    addtestcard(canvas2, w, h, steps(5, 10, 6), steps(70, 100, 3), 2, shape='U')
 
     # 3mm corrugated cardboard
-    n = 3
-    m = 3
-    npass = 1
-    speed = steps(30,  10, n)
-    power = steps(70, 100, m)
-
     canvas3 = xt.XcsCanvas()
-    for pi in range(m):
-        for si in range(n):
-            x = 5 + si*(w+5)
-            y = 5 + pi*(h+5)
-            s = speed[si]
-            p = power[pi]
-            addtestU(canvas3, w, h, x, y, p, s, npass)
-
-    # surrounding box at last speed and power setting
-    # to cut this test card from the panel
-    r = xt.XcsRect('rect', xt.XcsPnt(0,0), xt.XcsPnt(10,10))
-    r. place(0, 0). size(5+(w+5)*n, 5+(h+5)*m) .add_process('VECTOR_CUTTING', p, s, npass)
-    canvas3.add_element(r)
-
-
+    addtestcard(canvas3, w, h, steps(30, 10, 3), steps(70, 100, 3), 1, shape='U', frame=True)
 
     # 4mm foam core
     # none of these worked. foam just melts between paper and reflows.
     # if you get it hot enough backsdie paper will burn but not cut.
     # yes, using air.
-    n = 3
-    m = 3
-    npass = 4
-    speed = steps(15, 5,  n)
-    power = steps(30, 60, m)
-
     canvas4 = xt.XcsCanvas()
-    for pi in range(m):
-        for si in range(n):
-            x = 5 + si*(w+5)
-            y = 5 + pi*(h+5)
-            s = speed[si]
-            p = power[pi]
-            addtestU(canvas4, w, h, x, y, p, s, npass)
-
-    # surrounding box at last speed and power setting
-    # to cut this test card from the panel
-    r = xt.XcsRect('rect', xt.XcsPnt(0,0), xt.XcsPnt(10,10))
-    r. place(0, 0). size(5+(w+5)*n, 5+(h+5)*m) .add_process('VECTOR_CUTTING', p, s, npass)
-    canvas4.add_element(r)
-
-
-
+    addtestcard(canvas4, w, h, steps(15, 5, 3), steps(30, 60, 3), 4, shape='U', frame=True)
 
     xt.XcsCanvas.active_canvas = canvas1
     xt.XcsSave('test_cuts')
@@ -0,0 +1,384 @@
+#!python3
+# ***************************************************************************
+# *   Copyright (c) 2024 whodafloater
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# **************************************************************************
+#
+# xtool_bitmap.py
+#
+# Images for engraving: load, resize to the engraving resolution, make
+# gray, threshold or dither, and encode as PNG for an xtool_xcs.XcsBitmap.
+#
+#    python xtool_bitmap.py photo.jpg --width 80 --dpi 254 -o photo
+#
+# Needs numpy. Pillow is used to read images if it is installed, without
+# it only Netpbm files (.pgm .ppm .pnm) can be read. Binary Netpbm files
+# are memory mapped, so a big image is not read in until it is resized.
+#
+# Pixels are 0 black to 255 white, black is engraved. After dithering or
+# a threshold an image is a bool array, True is white.
+#
+# The PNG is written by png_chunks(), a few rows at a time, with zlib. It
+# does not need Pillow.
+
+import argparse
+import math
+import struct
+import zlib
+
+import numpy as np
+
+import xtool_xcs as xt
+
+# Engraving resolution, 10 lines per mm
+DEFAULT_DPI = 254
+
+MODES = ('grayscale', 'threshold', 'dither')
+
+# rows per PNG compress call
+PNG_ROWS = 256
+
+# target rows resized at a time
+RESIZE_ROWS = 64
+
+# Floyd-Steinberg weights: right, down left, down, down right
+FS_RIGHT = 7 / 16
+FS_DOWN_LEFT = 3 / 16
+FS_DOWN = 5 / 16
+FS_DOWN_RIGHT = 1 / 16
+
+
+# ---------------------------------------------------------------------
+# Reading
+
+# (array, maxval) of the image in file fn. The array is (h, w) gray or
+# (h, w, 3) rgb, 0 to maxval. With a width in mm Pillow decodes a JPEG
+# at a fraction of its size if that is still big enough, which is much
+# faster for photos.
+def load_image(fn, width=None, height=None, dpi=DEFAULT_DPI):
+    try:
+        from PIL import Image
+    except ImportError:
+        return read_netpbm(fn)
+
+    img = Image.open(fn)
+    size = None
+    if width is not None:
+        size = target_size((img.size[1], img.size[0]), width, height, dpi)
+        img.draft('RGB', size)
+    # reduce() only takes some modes, convert first
+    img = _gray_or_rgb(img)
+    if size is not None:
+        factor = min(img.size[0] // size[0], img.size[1] // size[1])
+        if factor >= 2:
+            img = img.reduce(factor)
+    return np.asarray(img), 255
+
+
+# Pillow image as 8 bit L or RGB
+#   - transparent is white, not engraved
+#   - 1 bit is L
+#   - 16 bit gray, I;16 or I from a 16 bit PNG, is scaled to 8 bits, not
+#     clipped at 255
+def _gray_or_rgb(img):
+    from PIL import Image
+
+    mode = img.mode
+    if mode in ('RGBA', 'RGBa', 'LA', 'La', 'PA', 'P') or 'transparency' in img.info:
+        gray = mode in ('LA', 'La', 'L')
+        img = img.convert('RGBA')
+        white = Image.new('RGBA', img.size, (255, 255, 255, 255))
+        return Image.alpha_composite(white, img).convert('L' if gray else 'RGB')
+    if mode == '1':
+        return img.convert('L')
+    if mode == 'I' or mode.startswith('I;16'):
+        a = np.asarray(img).astype(np.int64).clip(0, 65535)
+        return Image.fromarray(((a * 255 + 32767) // 65535).astype(np.uint8))
+    if mode not in ('L', 'RGB'):
+        return img.convert('RGB')
+    return img
+
+
+def _netpbm_tokens(data, count):
+    tokens = list()
+    pos = 0
+    while len(tokens) < count:
+        while data[pos:pos + 1].isspace():
+            pos += 1
+        if data[pos:pos + 1] == b'#':
+            while data[pos:pos + 1] not in (b'\n', b'\r', b''):
+                pos += 1
+            continue
+        start = pos
+        while pos < len(data) and not data[pos:pos + 1].isspace():
+            pos += 1
+        tokens.append(data[start:pos])
+    # one white space after the header
+    return tokens, pos + 1
+
+
+# (array, maxval) of a P2 P3 P5 or P6 file. Binary ones are memory mapped.
+def read_netpbm(fn):
+    with open(fn, 'rb') as f:
+        head = f.read(1024)
+    tokens, offset = _netpbm_tokens(head, 4)
+    magic = tokens[0]
+    if magic not in (b'P2', b'P3', b'P5', b'P6'):
+        raise ValueError(f'{fn}: not a gray or rgb Netpbm file, install Pillow for other images')
+    w, h, maxval = int(tokens[1]), int(tokens[2]), int(tokens[3])
+    shape = (h, w, 3) if magic in (b'P3', b'P6') else (h, w)
+
+    if magic in (b'P5', b'P6'):
+        dtype = np.uint8 if maxval < 256 else np.dtype('>u2')
+        return np.memmap(fn, dtype=dtype, mode='r', offset=offset, shape=shape), maxval
+
+    with open(fn, 'rb') as f:
+        data = f.read()
+    tokens, offset = _netpbm_tokens(data, 4)
+    values = data[offset:].split()[:math.prod(shape)]
+    return np.array(values, dtype=np.int32).reshape(shape), maxval
+
+
+# ---------------------------------------------------------------------
+# Pipeline
+
+# pixels (w, h) for a width and height in mm
+def target_size(shape, width, height=None, dpi=DEFAULT_DPI):
+    if height is None:
+        height = width * shape[0] / shape[1]
+    return (max(1, round(width / 25.4 * dpi)), max(1, round(height / 25.4 * dpi)))
+
+
+# source index ranges [edges[i], edges[i + 1]) of n target pixels, or
+# for growing, the source pixel of each target pixel
+def _resize_map(m, n):
+    if n < m:
+        return (np.arange(n + 1) * m) // n
+    return ((np.arange(n) + 0.5) * m / n).astype(np.intp)
+
+
+def _resize_axis(img, m, n, edges, axis):
+    if n == m:
+        return img
+    if n < m:
+        # mean of the source pixels that fall in each target pixel
+        sums = np.add.reduceat(img, edges[:-1] - edges[0], axis=axis, dtype=np.float32)
+        counts = np.diff(edges).astype(np.float32)
+        shape = [1] * img.ndim
+        shape[axis] = len(counts)
+        return sums / counts.reshape(shape)
+    # nearest source pixel
+    return np.take(img, edges, axis=axis)
+
+
+# float32 image of size (w, h). Shrinks by area averaging, grows by
+# repeating pixels. Done in bands of RESIZE_ROWS target rows, so only a
+# band of a big image is turned to floats at a time.
+def resize(img, size):
+    w, h = size
+    m, n = img.shape[0], img.shape[1]
+    rows = _resize_map(m, h)
+    cols = _resize_map(n, w)
+    out = np.empty((h, w) + img.shape[2:], dtype=np.float32)
+    for y in range(0, h, RESIZE_ROWS):
+        y1 = min(h, y + RESIZE_ROWS)
+        if h < m:
+            band = img[rows[y]:rows[y1]]
+            band = _resize_axis(band, m, h, rows[y:y1 + 1], 0)
+        else:
+            band = img[rows[y:y1]]
+        out[y:y1] = _resize_axis(band, n, w, cols, 1)
+    return out
+
+
+# (h, w) float32 of a gray or rgb image, ITU-R 601 luma
+def grayscale(img):
+    if img.ndim == 2:
+        return np.asarray(img, dtype=np.float32)
+    return (img[..., 0] * np.float32(0.299) + img[..., 1] * np.float32(0.587)
+            + img[..., 2] * np.float32(0.114)).astype(np.float32)
+
+
+def threshold(gray, level=128):
+    return gray >= level
+
+
+# Floyd-Steinberg error diffusion, vectorized along wavefronts.
+#
+# A pixel takes error from its left neighbour and from three pixels in
+# the row above. Pixels with the same x + 2y take nothing from each
+# other, so each such wavefront is done in one go, W + 2H steps of numpy
+# instead of W * H steps of python. The errors are added in the same
+# order as in the plain loop, floyd_steinberg_loop(), so the result is
+# the same to the bit.
+#
+# gray is a float32 (h, w) array, it is used for the errors and ends up
+# changed.
+def floyd_steinberg(gray, level=128):
+    h, w = gray.shape
+    out = np.zeros((h, w), dtype=bool)
+    for d in range(w + 2 * (h - 1)):
+        y0 = max(0, (d - w + 2) // 2)
+        y1 = min(h - 1, d // 2)
+        if y0 > y1:
+            continue
+        ys = np.arange(y0, y1 + 1)
+        xs = d - 2 * ys
+
+        old = gray[ys, xs]
+        new = old >= level
+        out[ys, xs] = new
+        err = old - np.where(new, np.float32(255), np.float32(0))
+
+        # the order matters where two pixels of a wavefront send error
+        # to the same pixel: down left of (x + 2, y - 1) before right of
+        # (x, y), like the loop does
+        down = ys + 1 < h
+        m = down & (xs > 0)
+        gray[ys[m] + 1, xs[m] - 1] += err[m] * np.float32(FS_DOWN_LEFT)
+        m = xs + 1 < w
+        gray[ys[m], xs[m] + 1] += err[m] * np.float32(FS_RIGHT)
+        gray[ys[down] + 1, xs[down]] += err[down] * np.float32(FS_DOWN)
+        m = down & (xs + 1 < w)
+        gray[ys[m] + 1, xs[m] + 1] += err[m] * np.float32(FS_DOWN_RIGHT)
+    return out
+
+
+# Plain Floyd-Steinberg, one pixel at a time. The reference for
+# floyd_steinberg(), far too slow for real images.
+def floyd_steinberg_loop(gray, level=128):
+    h, w = gray.shape
+    out = np.zeros((h, w), dtype=bool)
+    for y in range(h):
+        for x in range(w):
+            old = gray[y, x]
+            new = old >= level
+            out[y, x] = new
+            err = old - (np.float32(255) if new else np.float32(0))
+            if x + 1 < w:
+                gray[y, x + 1] += err * np.float32(FS_RIGHT)
+            if y + 1 < h:
+                if x > 0:
+                    gray[y + 1, x - 1] += err * np.float32(FS_DOWN_LEFT)
+                gray[y + 1, x] += err * np.float32(FS_DOWN)
+                if x + 1 < w:
+                    gray[y + 1, x + 1] += err * np.float32(FS_DOWN_RIGHT)
+    return out
+
+
+# The whole pipeline. img is a file name or an array of 0 to 255. Returns
+# a uint8 gray image or, for threshold and dither, a bool image.
+def process(img, width, height=None, dpi=DEFAULT_DPI, mode='dither', level=128, invert=False):
+    if mode not in MODES:
+        raise ValueError(f'unknown bitmap mode {mode}, use one of {", ".join(MODES)}')
+    maxval = 255
+    if isinstance(img, str):
+        img, maxval = load_image(img, width, height, dpi)
+
+    gray = grayscale(resize(img, target_size(img.shape, width, height, dpi)))
+    if maxval != 255:
+        gray *= np.float32(255 / maxval)
+    if invert:
+        np.subtract(np.float32(255), gray, out=gray)
+    if mode == 'grayscale':
+        return np.clip(gray + np.float32(0.5), 0, 255).astype(np.uint8)
+    if mode == 'threshold':
+        return threshold(gray, level)
+    return floyd_steinberg(gray, level)
+
+
+# ---------------------------------------------------------------------
+# PNG
+
+def _png_chunk(kind, data):
+    return (struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+
+# PNG of a uint8 gray or bool image, as byte chunks, PNG_ROWS rows at a
+# time. Bool images are written 1 bit per pixel.
+def png_chunks(img, level=6):
+    h, w = img.shape
+    bits = 1 if img.dtype == bool else 8
+    yield b'\x89PNG\r\n\x1a\n'
+    yield _png_chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, bits, 0, 0, 0, 0))
+    z = zlib.compressobj(level)
+    for y in range(0, h, PNG_ROWS):
+        rows = img[y:y + PNG_ROWS]
+        if bits == 1:
+            rows = np.packbits(rows, axis=1)
+        # filter type 0 in front of every row
+        rows = np.hstack((np.zeros((len(rows), 1), dtype=np.uint8), rows))
+        data = z.compress(rows.tobytes())
+        if data:
+            yield _png_chunk(b'IDAT', data)
+    yield _png_chunk(b'IDAT', z.flush())
+    yield _png_chunk(b'IEND', b'')
+
+
+# ---------------------------------------------------------------------
+# Canvas
+
+# An XcsBitmap of an image, width and height in mm. height None keeps the
+# aspect ratio. Engraved at dpi with power and speed, like add_process().
+def bitmap_element(img, width, height=None, dpi=DEFAULT_DPI, mode='dither', level=128,
+                   invert=False, power=30, speed=100, repeat=1, id='bitmap'):
+    pixels = process(img, width, height, dpi, mode, level, invert)
+    if height is None:
+        height = width * pixels.shape[0] / pixels.shape[1]
+    e = xt.XcsBitmap(id, lambda: png_chunks(pixels), width, height)
+    e.add_process('BITMAP_ENGRAVING', power, speed, repeat,
+                  density = round(dpi / 25.4), mode = mode)
+    return e
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Make an xTool project to engrave an image')
+    parser.add_argument('image', help='image file, .pgm .ppm .pnm, or anything Pillow reads')
+    parser.add_argument('--width', type=float, required=True, help='width in mm')
+    parser.add_argument('--height', type=float, default=None,
+                        help='height in mm, default keeps the aspect ratio')
+    parser.add_argument('--dpi', type=float, default=DEFAULT_DPI,
+                        help=f'engraving resolution, default {DEFAULT_DPI}')
+    parser.add_argument('--mode', choices=MODES, default='dither')
+    parser.add_argument('--level', type=float, default=128,
+                        help='gray level between black and white, 0 to 255, default 128')
+    parser.add_argument('--invert', action='store_true', help='engrave the light parts')
+    parser.add_argument('--power', type=int, default=30)
+    parser.add_argument('--speed', type=int, default=100)
+    parser.add_argument('-o', '--output', default=None,
+                        help='project name, .xcs is added. Default is the image name')
+    parser.add_argument('--png', default=None, help='also save the processed image as png')
+    args = parser.parse_args(argv)
+
+    e = bitmap_element(args.image, args.width, args.height, args.dpi, args.mode,
+                       args.level, args.invert, args.power, args.speed)
+    if args.png:
+        with open(args.png, 'wb') as f:
+            for c in e.png_chunks():
+                f.write(c)
+
+    xt.XcsCanvas.canvi = list()
+    xt.XcsCanvas().add_element(e)
+    output = args.output or args.image.rsplit('.', 1)[0]
+    xt.XcsSave(output)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,254 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 whodafloater
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# **************************************************************************
+#
+# xtool_cache.py
+#
+# On disk cache of parsed operations.
+#
+# An entry holds what xtool_path.parse_worker() returns for one operation:
+# the G-code fragment, the svg path records and the feed and speed left
+# behind. The key is a hash of the operation's commands, the feed and
+# speed it starts with, the values that change the output and the source
+# of xtool_path, so editing the post invalidates old entries.
+#
+# One json file per entry. A hit touches the file, eviction removes the
+# oldest files until the cache fits in max_bytes.
+
+import hashlib
+import json
+import os
+
+import xtool_path as xp
+
+# values that change what parse_commands() writes
+KEY_VALUES = [
+    "AXIS_PRECISION",
+    "UNIT_FORMAT",
+    "UNIT_SPEED_FORMAT",
+    "UNITS",
+    "PREAMBLE",
+    "OUTPUT_COMMENTS",
+    "OUTPUT_DOUBLES",
+    "OUTPUT_LINE_NUMBERS",
+    "OUTPUT_GCODE",
+    "MODAL",
+    "COMMAND_SPACE",
+    "LINENR",
+    "PARAMETER_ORDER",
+    "SVG_ARC_TOLERANCE",
+    "ORDER_PATHS",
+    "DEDUP",
+]
+
+DEFAULT_SIZE = 256 * 1024 * 1024
+
+_code_hash = None
+_caches = dict()
+
+
+def default_dir():
+    base = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'xtool_xcs')
+
+
+# hash of the parser source, part of every key
+def code_hash():
+    global _code_hash
+    if _code_hash is None:
+        with open(xp.__file__, 'rb') as f:
+            _code_hash = hashlib.sha256(f.read()).hexdigest()
+    return _code_hash
+
+
+# One cache per directory, so the statistics add up over a FreeCAD session
+def open_cache(directory=None, max_bytes=DEFAULT_SIZE):
+    if not directory:
+        directory = default_dir()
+    c = _caches.get(directory)
+    if c is None:
+        c = PostCache(directory, max_bytes)
+        _caches[directory] = c
+    c.max_bytes = max_bytes
+    return c
+
+
+class PostCache:
+    def __init__(self, directory, max_bytes=DEFAULT_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.size = None
+        os.makedirs(directory, exist_ok=True)
+
+    # segs is a list of (name, parameters) lists, see UtilsXTool.extract_commands()
+    def key(self, values, segs, feed, speed):
+        h = hashlib.sha256()
+        h.update(code_hash().encode())
+        h.update(repr([(k, values.get(k)) for k in KEY_VALUES]).encode())
+        h.update(repr((feed, speed)).encode())
+        for seg in segs:
+            h.update(b'|')
+            for name, params in seg:
+                h.update(name.encode())
+                h.update(repr(sorted(params.items())).encode())
+        return h.hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    # (gcode, svgps, feed, speed) or None
+    def get(self, key):
+        fn = self.filename(key)
+        try:
+            with open(fn, 'r') as f:
+                d = json.load(f)
+            os.utime(fn)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return d['gcode'], d['svgps'], d['feed'], d['speed']
+
+    def put(self, key, result):
+        gcode, svgps, feed, speed = result
+        data = json.dumps(dict(gcode = gcode, svgps = svgps, feed = feed, speed = speed))
+
+        fn = self.filename(key)
+        tmp = fn + '.' + str(os.getpid()) + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                f.write(data)
+            os.replace(tmp, fn)
+        except OSError as e:
+            print(f'cache: could not write {fn}: {e}')
+            return
+        self.stores += 1
+
+        if self.size is not None:
+            self.size += len(data)
+        self.evict()
+
+    def entries(self):
+        e = list()
+        for d in os.scandir(self.directory):
+            if d.name.endswith('.json'):
+                try:
+                    st = d.stat()
+                except OSError:
+                    continue
+                e.append((st.st_mtime, st.st_size, d.path))
+        return e
+
+    # drop least recently used entries until the cache fits
+    def evict(self):
+        if self.size is not None and self.size <= self.max_bytes:
+            return
+        e = self.entries()
+        self.size = sum(s for t, s, p in e)
+        if self.size <= self.max_bytes:
+            return
+        e.sort()
+        for t, s, p in e:
+            try:
+                os.remove(p)
+            except OSError:
+                continue
+            self.size -= s
+            self.evictions += 1
+            if self.size <= self.max_bytes:
+                break
+
+    def clear(self):
+        for t, s, p in self.entries():
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+        self.size = 0
+
+    def stats(self):
+        if self.size is None:
+            self.size = sum(s for t, s, p in self.entries())
+        lookups = self.hits + self.misses
+        return dict(hits = self.hits, misses = self.misses, stores = self.stores,
+                    evictions = self.evictions, bytes = self.size,
+                    hit_rate = self.hits / lookups if lookups else 0.0)
+
+    def report(self):
+        st = self.stats()
+        return (f'cache: {st["hits"]} hits, {st["misses"]} misses, '
+                f'{st["evictions"]} evicted, {st["bytes"] / 1e6:.1f} MB in {self.directory}')
+
+
+# In memory results of the last post, by operation name.
+#
+# Lives here rather than in UtilsXTool so it survives a reload of the
+# post processor modules. An entry holds the fingerprint of the operation
+# (see UtilsXTool.op_fingerprint()), the parse result and the canvas
+# elements made from it.
+#
+# The output of the last export is kept too, so the G-code post and the
+# xcs post can share one export pass, see UtilsXTool.export_shared().
+class PostSession:
+    def __init__(self):
+        self.ops = dict()
+        self.hits = 0
+        self.misses = 0
+        self.export = None
+
+    def get(self, name, fingerprint):
+        e = self.ops.get(name)
+        if e is None or e['fingerprint'] != fingerprint:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return e['result']
+
+    def put(self, name, fingerprint, result):
+        self.ops[name] = dict(fingerprint = fingerprint, result = result, elements = None)
+
+    def entry(self, name):
+        return self.ops.get(name)
+
+    # forget operations that are no longer in the job
+    def prune(self, names):
+        for name in list(self.ops):
+            if name not in names:
+                del self.ops[name]
+
+    # (gcode, xcs) of the last export if its key matches, else None
+    def get_export(self, key):
+        if self.export is None or self.export[0] != key:
+            return None
+        return self.export[1]
+
+    def put_export(self, key, output):
+        self.export = (key, output)
+
+    def clear(self):
+        self.ops = dict()
+        self.export = None
+
+
+SESSION = PostSession()
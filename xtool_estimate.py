@@ -0,0 +1,595 @@
+#!python3
+# ***************************************************************************
+# *   Copyright (c) 2024 whodafloater
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# **************************************************************************
+#
+# xtool_estimate.py
+#
+# How long a job runs on the laser, before sending it.
+#
+#    python xtool_estimate.py part.gcode
+#    python xtool_estimate.py part.xcs
+#
+# G-code is walked move by move: G0 at the rapid rate, G1 G2 G3 at the
+# cut feed. In an xcs project every element with a vector process is cut
+# at its speed, repeat times, with rapid travel between elements.
+#
+# Motion model: each move speeds up and slows down at the machine
+# acceleration (trapezoid profile). Where two moves meet the speed is cut
+# by the cosine of the angle between them, a full stop for 90 degrees or
+# more. A change between rapid and cut stops too. A forward and a
+# backward pass make sure no move needs more acceleration than there is.
+#
+# Machine settings come from the post preamble, see machine_from_preamble().
+
+import argparse
+import json
+import math
+import re
+
+import xtool_gcode as xg
+
+# xTool D1 defaults, same as the preamble in UtilsXTool.init_xtool_values()
+ACCEL_X = 426.0     # mm/s^2, M205 X
+ACCEL_Y = 403.0     # mm/s^2, M205 Y
+RAPID = 3000 / 60   # mm/s, G0 F
+FEED = 1860 / 60    # mm/s, G1 F
+
+# angle step when curves and arcs are turned into lines
+CURVE_STEP = math.pi / 32
+CURVE_POINTS = 8
+
+VECTOR_PROCESSES = ('VECTOR_CUTTING', 'VECTOR_ENGRAVING')
+
+
+class Machine:
+    def __init__(self, accel_x=ACCEL_X, accel_y=ACCEL_Y, rapid=RAPID, feed=FEED):
+        self.accel_x = accel_x
+        self.accel_y = accel_y
+        self.rapid = rapid
+        self.feed = feed
+
+    # acceleration along unit vector u, no axis may go over its limit
+    def accel(self, ux, uy):
+        a = math.inf
+        if ux != 0:
+            a = self.accel_x / abs(ux)
+        if uy != 0:
+            a = min(a, self.accel_y / abs(uy))
+        return a
+
+
+# The D1 takes its acceleration from M205 X Y, the rapid rate from
+# G0 F and the cut feed from G1 F.
+def machine_from_preamble(preamble):
+    m = Machine()
+    for name, params in xg.commands(preamble.encode().splitlines()):
+        if name == 'M205':
+            m.accel_x = params.get('X', m.accel_x)
+            m.accel_y = params.get('Y', m.accel_y)
+        elif name == 'G0' and 'F' in params:
+            m.rapid = params['F']
+        elif name == 'G1' and 'F' in params:
+            m.feed = params['F']
+    return m
+
+
+# time to go length at up to vmax, starting at v0 and ending at v1
+def trapezoid_time(length, v0, v1, vmax, accel):
+    da = (vmax * vmax - v0 * v0) / (2 * accel)
+    dd = (vmax * vmax - v1 * v1) / (2 * accel)
+    if da + dd <= length:
+        return (vmax - v0) / accel + (vmax - v1) / accel + (length - da - dd) / vmax
+    # never gets to vmax
+    vp = math.sqrt(max(0.0, (2 * accel * length + v0 * v0 + v1 * v1) / 2))
+    return max(0.0, (vp - v0) / accel) + max(0.0, (vp - v1) / accel)
+
+
+def new_stats():
+    return dict(cut_length = 0.0, travel_length = 0.0, cut_time = 0.0,
+                travel_time = 0.0, time = 0.0, moves = 0)
+
+
+def add_stats(a, b, times=1):
+    for k in a:
+        a[k] += b[k] * times
+    return a
+
+
+# A chain of straight moves, run back to back
+class Planner:
+    def __init__(self, machine):
+        self.machine = machine
+        # length, vmax, accel, ux, uy, cut
+        self.moves = list()
+
+    def line(self, x0, y0, x1, y1, v, cut):
+        dx = x1 - x0
+        dy = y1 - y0
+        l = math.hypot(dx, dy)
+        if l == 0 or v <= 0:
+            return
+        ux = dx / l
+        uy = dy / l
+        self.moves.append((l, v, self.machine.accel(ux, uy), ux, uy, cut))
+
+    def polyline(self, pts, v, cut):
+        for k in range(1, len(pts)):
+            self.line(pts[k-1][0], pts[k-1][1], pts[k][0], pts[k][1], v, cut)
+
+    def stats(self):
+        moves = self.moves
+        n = len(moves)
+        st = new_stats()
+        if n == 0:
+            return st
+
+        # speed limit where move k starts
+        entry = [0.0] * (n + 1)
+        for k in range(1, n):
+            l0, v0, a0, ux0, uy0, cut0 = moves[k-1]
+            l1, v1, a1, ux1, uy1, cut1 = moves[k]
+            if cut0 == cut1:
+                c = ux0 * ux1 + uy0 * uy1
+                if c > 0:
+                    entry[k] = min(v0, v1) * c
+
+        # backward, slow enough to stop at the end
+        for k in range(n - 1, -1, -1):
+            l, v, a = moves[k][0:3]
+            entry[k] = min(entry[k], math.sqrt(entry[k+1] ** 2 + 2 * a * l))
+        # forward, no faster than the acceleration allows
+        for k in range(n):
+            l, v, a = moves[k][0:3]
+            entry[k+1] = min(entry[k+1], math.sqrt(entry[k] ** 2 + 2 * a * l))
+
+        for k in range(n):
+            l, v, a, ux, uy, cut = moves[k]
+            t = trapezoid_time(l, min(entry[k], v), min(entry[k+1], v), v, a)
+            if cut:
+                st['cut_length'] += l
+                st['cut_time'] += t
+            else:
+                st['travel_length'] += l
+                st['travel_time'] += t
+            st['time'] += t
+        st['moves'] = n
+        return st
+
+
+# points on an arc from p1 to p2 around c, p1 left out
+def arc_points(ccw, p1, p2, c):
+    r = math.hypot(p1[0] - c[0], p1[1] - c[1])
+    a1 = math.atan2(p1[1] - c[1], p1[0] - c[0])
+    a2 = math.atan2(p2[1] - c[1], p2[0] - c[0])
+    sweep = a2 - a1
+    if ccw:
+        if sweep <= 0:
+            sweep += 2 * math.pi
+    else:
+        if sweep >= 0:
+            sweep -= 2 * math.pi
+    n = max(2, int(math.ceil(abs(sweep) / CURVE_STEP)))
+    pts = [(c[0] + r * math.cos(a1 + sweep * k / n), c[1] + r * math.sin(a1 + sweep * k / n))
+           for k in range(1, n)]
+    pts.append((p2[0], p2[1]))
+    return pts
+
+
+# Walks G-code. Position and feeds carry over from one call to the next,
+# so a job can be estimated one operation at a time.
+class GcodeEstimator:
+    def __init__(self, machine):
+        self.machine = machine
+        self.x = 0.0
+        self.y = 0.0
+        # the D1 keeps a feed for G0 and one for G1
+        self.rapid = machine.rapid
+        self.feed = machine.feed
+
+    def estimate(self, gcode):
+        if isinstance(gcode, str):
+            gcode = gcode.encode()
+        if isinstance(gcode, bytes):
+            gcode = gcode.splitlines()
+        return self.estimate_commands(xg.commands(gcode))
+
+    # (name, parameters) commands, feeds in mm/s
+    def estimate_commands(self, commands):
+        plan = Planner(self.machine)
+        for name, params in commands:
+            if name == 'G0':
+                if 'F' in params:
+                    self.rapid = params['F']
+            elif name in ('G1', 'G2', 'G3'):
+                if 'F' in params:
+                    self.feed = params['F']
+            else:
+                continue
+            x = params.get('X', self.x)
+            y = params.get('Y', self.y)
+            if name == 'G0':
+                plan.line(self.x, self.y, x, y, self.rapid, False)
+            elif name == 'G1':
+                plan.line(self.x, self.y, x, y, self.feed, True)
+            else:
+                c = (self.x + params.get('I', 0.0), self.y + params.get('J', 0.0))
+                plan.polyline([(self.x, self.y)] + arc_points(name == 'G3', (self.x, self.y), (x, y), c),
+                              self.feed, True)
+            self.x = x
+            self.y = y
+        return plan.stats()
+
+
+# -------------------------------------------------------------------------
+# svg paths
+
+SVG_TOKEN = re.compile(r'[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+
+def _bezier(pts, n=CURVE_POINTS):
+    out = list()
+    for k in range(1, n + 1):
+        t = k / n
+        if len(pts) == 4:
+            a, b, c, d = (1-t)**3, 3*(1-t)**2*t, 3*(1-t)*t*t, t**3
+            out.append((a*pts[0][0] + b*pts[1][0] + c*pts[2][0] + d*pts[3][0],
+                        a*pts[0][1] + b*pts[1][1] + c*pts[2][1] + d*pts[3][1]))
+        else:
+            a, b, c = (1-t)**2, 2*(1-t)*t, t*t
+            out.append((a*pts[0][0] + b*pts[1][0] + c*pts[2][0],
+                        a*pts[0][1] + b*pts[1][1] + c*pts[2][1]))
+    return out
+
+
+# https://www.w3.org/TR/SVG/implnote.html#ArcImplementationNotes
+# section B.2.4, endpoint to center parameterization
+def _svg_arc(x1, y1, rx, ry, phi, fa, fs, x2, y2):
+    if x1 == x2 and y1 == y2:
+        return []
+    rx = abs(rx)
+    ry = abs(ry)
+    if rx == 0 or ry == 0:
+        return [(x2, y2)]
+    cp = math.cos(math.radians(phi))
+    sp = math.sin(math.radians(phi))
+    dx = (x1 - x2) / 2
+    dy = (y1 - y2) / 2
+    x1p = cp * dx + sp * dy
+    y1p = -sp * dx + cp * dy
+    lam = (x1p / rx) ** 2 + (y1p / ry) ** 2
+    if lam > 1:
+        rx *= math.sqrt(lam)
+        ry *= math.sqrt(lam)
+    num = rx * rx * ry * ry - rx * rx * y1p * y1p - ry * ry * x1p * x1p
+    den = rx * rx * y1p * y1p + ry * ry * x1p * x1p
+    coef = math.sqrt(max(0.0, num / den))
+    if fa == fs:
+        coef = -coef
+    cxp = coef * rx * y1p / ry
+    cyp = -coef * ry * x1p / rx
+    cx = cp * cxp - sp * cyp + (x1 + x2) / 2
+    cy = sp * cxp + cp * cyp + (y1 + y2) / 2
+    t1 = math.atan2((y1p - cyp) / ry, (x1p - cxp) / rx)
+    t2 = math.atan2((-y1p - cyp) / ry, (-x1p - cxp) / rx)
+    dt = t2 - t1
+    if fs == 0 and dt > 0:
+        dt -= 2 * math.pi
+    elif fs == 1 and dt < 0:
+        dt += 2 * math.pi
+    n = max(2, int(math.ceil(abs(dt) / CURVE_STEP)))
+    pts = list()
+    for k in range(1, n):
+        t = t1 + dt * k / n
+        ex = rx * math.cos(t)
+        ey = ry * math.sin(t)
+        pts.append((cx + cp * ex - sp * ey, cy + sp * ex + cp * ey))
+    pts.append((x2, y2))
+    return pts
+
+
+# svg path data as polylines, one per subpath. Curves and arcs are
+# turned into lines.
+def svg_polylines(d):
+    tokens = SVG_TOKEN.findall(d)
+    polys = list()
+    poly = None
+    x = y = 0.0
+    sx = sy = 0.0
+    cmd = None
+    last_ctrl = None
+    k = 0
+
+    def num():
+        nonlocal k
+        v = float(tokens[k])
+        k += 1
+        return v
+
+    # arc flags may be run together, "a1 1 0 011 2"
+    def flag():
+        nonlocal k
+        t = tokens[k]
+        if len(t) > 1 and t[0] in '01':
+            tokens[k] = t[1:]
+            return int(t[0])
+        k += 1
+        return int(float(t))
+
+    while k < len(tokens):
+        t = tokens[k]
+        if t.isalpha():
+            cmd = t
+            k += 1
+            if cmd in 'Zz':
+                if poly is not None and len(poly) > 1 and poly[-1] != (sx, sy):
+                    poly.append((sx, sy))
+                x, y = sx, sy
+                poly = None
+                last_ctrl = None
+                continue
+        elif cmd is None:
+            k += 1
+            continue
+
+        rel = cmd.islower()
+        c = cmd.upper()
+        ox, oy = (x, y) if rel else (0.0, 0.0)
+
+        if poly is None and c != 'M':
+            poly = [(x, y)]
+            polys.append(poly)
+            sx, sy = x, y
+
+        if c == 'M':
+            x, y = num() + ox, num() + oy
+            sx, sy = x, y
+            poly = [(x, y)]
+            polys.append(poly)
+            # more pairs after a moveto are linetos
+            cmd = 'l' if rel else 'L'
+            last_ctrl = None
+        elif c == 'L':
+            x, y = num() + ox, num() + oy
+            poly.append((x, y))
+            last_ctrl = None
+        elif c == 'H':
+            x = num() + ox
+            poly.append((x, y))
+            last_ctrl = None
+        elif c == 'V':
+            y = num() + oy
+            poly.append((x, y))
+            last_ctrl = None
+        elif c in 'CS':
+            if c == 'C':
+                p1 = (num() + ox, num() + oy)
+            elif last_ctrl is not None and last_ctrl[0] == 'C':
+                p1 = (2 * x - last_ctrl[1][0], 2 * y - last_ctrl[1][1])
+            else:
+                p1 = (x, y)
+            p2 = (num() + ox, num() + oy)
+            p3 = (num() + ox, num() + oy)
+            poly += _bezier([(x, y), p1, p2, p3])
+            last_ctrl = ('C', p2)
+            x, y = p3
+        elif c in 'QT':
+            if c == 'Q':
+                p1 = (num() + ox, num() + oy)
+            elif last_ctrl is not None and last_ctrl[0] == 'Q':
+                p1 = (2 * x - last_ctrl[1][0], 2 * y - last_ctrl[1][1])
+            else:
+                p1 = (x, y)
+            p2 = (num() + ox, num() + oy)
+            poly += _bezier([(x, y), p1, p2])
+            last_ctrl = ('Q', p1)
+            x, y = p2
+        elif c == 'A':
+            rx, ry, phi = num(), num(), num()
+            fa, fs = flag(), flag()
+            x2, y2 = num() + ox, num() + oy
+            poly += _svg_arc(x, y, rx, ry, phi, fa, fs, x2, y2)
+            x, y = x2, y2
+            last_ctrl = None
+        else:
+            k += 1
+
+    return [p for p in polys if len(p) > 1]
+
+
+# -------------------------------------------------------------------------
+# xcs canvas
+
+def _xy(p):
+    if isinstance(p, dict):
+        return (p['x'], p['y'])
+    return (p.x, p.y)
+
+
+def _ellipse(cx, cy, rx, ry, n=64):
+    return [(cx + rx * math.cos(2 * math.pi * k / n), cy + ry * math.sin(2 * math.pi * k / n))
+            for k in range(n + 1)]
+
+
+# element types we know how to cut, estimate_canvas does not encode
+# the others (a BITMAP encode redoes its png)
+POLYLINE_TYPES = ('RECT', 'CIRCLE', 'LINE', 'PEN', 'PATH')
+
+
+# Polylines of an encoded element in canvas coordinates, None if we do
+# not know how it is cut. PATH and PEN elements keep the size of their
+# points and are moved so their bounding box starts at x, y.
+def element_polylines(e):
+    t = e.get('type')
+    x = e.get('x', 0)
+    y = e.get('y', 0)
+    w = e.get('width', 0)
+    h = e.get('height', 0)
+    if t == 'RECT':
+        return [[(x, y), (x + w, y), (x + w, y + h), (x, y + h), (x, y)]]
+    if t == 'CIRCLE':
+        return [_ellipse(x + w / 2, y + h / 2, w / 2, h / 2)]
+    if t == 'LINE':
+        return [[(x, y), _xy(e['endPoint'])]]
+    if t == 'PEN':
+        polys = [[_xy(p) for p in e.get('points', [])]]
+        if e.get('isClosePath') and len(polys[0]) > 1:
+            polys[0].append(polys[0][0])
+    elif t == 'PATH':
+        polys = svg_polylines(e.get('dPath', ''))
+    else:
+        return None
+
+    polys = [p for p in polys if len(p) > 1]
+    if not polys:
+        return polys
+    xmin = min(px for p in polys for px, py in p)
+    ymin = min(py for p in polys for px, py in p)
+    return [[(px - xmin + x, py - ymin + y) for px, py in p] for p in polys]
+
+
+# processingType, power, speed, repeat of an encoded process, None to skip
+def process_params(proc):
+    sel = proc.get('processingType')
+    data = proc.get('data', {}).get(sel)
+    if data is None or data.get('processIgnore'):
+        return None
+    p = data.get('parameter', {})
+    p = p.get(data.get('materialType', 'customize')) or p.get('customize')
+    if p is None:
+        return None
+    return sel, p.get('power', 0), p.get('speed', 0), p.get('repeat', 1)
+
+
+# Estimate (element, process) pairs, both encoded to dicts. One row per
+# group, elements that are not in a group are rows of their type.
+def estimate_elements(machine, pairs, x=0.0, y=0.0):
+    rows = dict()
+    skipped = 0
+    for e, proc in pairs:
+        pp = process_params(proc) if proc is not None else None
+        polys = element_polylines(e) if pp is not None else None
+        if pp is None or polys is None or pp[0] not in VECTOR_PROCESSES:
+            skipped += 1
+            continue
+        sel, power, speed, repeat = pp
+
+        st = rows.setdefault(e.get('groupTag') or e.get('type'), new_stats())
+        for poly in polys:
+            travel = Planner(machine)
+            travel.line(x, y, poly[0][0], poly[0][1], machine.rapid, False)
+            add_stats(st, travel.stats())
+
+            cut = Planner(machine)
+            cut.polyline(poly, speed, True)
+            add_stats(st, cut.stats(), max(1, repeat))
+
+            if repeat > 1 and poly[-1] != poly[0]:
+                back = Planner(machine)
+                back.line(poly[-1][0], poly[-1][1], poly[0][0], poly[0][1], machine.rapid, False)
+                add_stats(st, back.stats(), repeat - 1)
+            x, y = poly[-1]
+
+    return list(rows.items()), skipped
+
+
+# rows of an XcsCanvas
+def estimate_canvas(machine, canvas):
+    pairs = list()
+    skipped = 0
+    for e in canvas.all_elements():
+        if e.type not in POLYLINE_TYPES:
+            skipped += 1
+            continue
+        proc = e.process.encode() if hasattr(e, 'process') else None
+        pairs.append((e.encode(), proc))
+    rows, more = estimate_elements(machine, pairs)
+    return rows, skipped + more
+
+
+# {canvas title : (rows, skipped)} of a saved xcs project, a file name,
+# the json text or the decoded dict
+def estimate_xcs(machine, xcs):
+    if isinstance(xcs, str):
+        if xcs.lstrip().startswith('{'):
+            xcs = json.loads(xcs)
+        else:
+            with open(xcs, 'r') as f:
+                xcs = json.load(f)
+
+    procs = dict()
+    for cid, op in xcs.get('device', {}).get('data', {}).get('value', []):
+        procs[cid] = dict((eid, p) for eid, p in op.get('displays', {}).get('value', []))
+
+    out = dict()
+    for c in xcs.get('canvas', []):
+        cp = procs.get(c.get('id'), {})
+        pairs = [(e, cp.get(e.get('id'))) for e in c.get('displays', [])]
+        out[c.get('title', c.get('id'))] = estimate_elements(machine, pairs)
+    return out
+
+
+# -------------------------------------------------------------------------
+# report
+
+def hms(t):
+    t = int(round(t))
+    return f'{t // 3600}:{t // 60 % 60:02d}:{t % 60:02d}'
+
+
+# rows are (name, stats)
+def report(rows, title='estimate'):
+    total = new_stats()
+    lines = [f'{title:30s} {"cut mm":>12s} {"travel mm":>12s} {"cut":>9s} {"travel":>9s} {"time":>9s}']
+    for name, st in rows:
+        add_stats(total, st)
+        lines.append(f'{str(name)[:30]:30s} {st["cut_length"]:12.1f} {st["travel_length"]:12.1f}'
+                     f' {hms(st["cut_time"]):>9s} {hms(st["travel_time"]):>9s} {hms(st["time"]):>9s}')
+    if len(rows) != 1:
+        lines.append(f'{"total":30s} {total["cut_length"]:12.1f} {total["travel_length"]:12.1f}'
+                     f' {hms(total["cut_time"]):>9s} {hms(total["travel_time"]):>9s} {hms(total["time"]):>9s}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Estimate how long a laser job runs')
+    parser.add_argument('files', nargs='+', help='G-code or .xcs files')
+    parser.add_argument('--accel', type=float, nargs=2, default=(ACCEL_X, ACCEL_Y),
+                        metavar=('X', 'Y'), help='acceleration in mm/s^2')
+    parser.add_argument('--rapid', type=float, default=RAPID * 60, help='rapid rate in mm/min')
+    parser.add_argument('--feed', type=float, default=FEED * 60,
+                        help='cut feed in mm/min until the G-code sets one')
+    args = parser.parse_args(argv)
+
+    machine = Machine(args.accel[0], args.accel[1], args.rapid / 60, args.feed / 60)
+    for f in args.files:
+        if f.endswith('.xcs'):
+            for title, (rows, skipped) in estimate_xcs(machine, f).items():
+                print(report(rows, f'{f} {title}'))
+                if skipped:
+                    print(f'{skipped} elements not estimated')
+        else:
+            with open(f, 'rb') as g:
+                st = GcodeEstimator(machine).estimate(g)
+            print(report([(f, st)], 'G-code'))
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,219 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 whodafloater
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# **************************************************************************
+#
+# xtool_gcode.py
+#
+# Streaming G-code reader.
+#
+# read_gcode() turns a G-code file into the (name, parameters) commands
+# used by xtool_path, one line at a time. Lengths come out in mm and feeds
+# in mm/s, the same as a FreeCAD Path.Command.
+
+import math
+import mmap
+import re
+
+# letter and number, "X12.5", "G01", "F 1200"
+WORD = re.compile(rb'([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))')
+COMMENT = re.compile(rb'\([^)]*\)|;.*')
+
+MOTION = {0 : 'G0', 1 : 'G1', 2 : 'G2', 3 : 'G3'}
+LENGTH_WORDS = b'XYZIJKR'
+
+# Z used by rapid_lift for rapids and cuts
+LIFT_Z = 1.0
+CUT_Z = 0.0
+
+# how much longer than 2 R the chord of an R arc may be from rounding, mm
+R_TOLERANCE = 0.001
+
+
+# Lines of a file, without reading all of it.
+# With use_mmap the OS pages the file in as needed.
+def read_lines(filename, use_mmap=False):
+    with open(filename, 'rb') as f:
+        if not use_mmap:
+            yield from f
+            return
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file
+            return
+        with mm:
+            yield from iter(mm.readline, b'')
+
+
+# Split one line into words. Comments are dropped, N words too.
+def tokenize(line):
+    line = line.upper()
+    if b'(' in line or b';' in line:
+        line = COMMENT.sub(b'', line)
+    return [(w, float(v)) for w, v in WORD.findall(line) if w != b'N']
+
+
+# Center offset (I, J) of an arc given by its radius, "G2 X20 Y0 R5".
+# The center is on the perpendicular of the chord, right of it for G2 and
+# left for G3. Negative R is the long way round, the other side.
+def r_center(name, x1, y1, x2, y2, r):
+    dx = x2 - x1
+    dy = y2 - y1
+    d = math.hypot(dx, dy)
+    if d == 0 or r == 0:
+        raise ValueError(f'{name} R{r:g} from ({x1:g}, {y1:g}) to ({x2:g}, {y2:g}) has no center,'
+                         ' use I and J for a full circle')
+    h2 = r * r - d * d / 4
+    if h2 < 0:
+        if d / 2 - abs(r) > R_TOLERANCE:
+            raise ValueError(f'{name} R{r:g} is too small for the {d:g} mm'
+                             f' from ({x1:g}, {y1:g}) to ({x2:g}, {y2:g})')
+        h2 = 0.0
+    side = 1.0 if name == 'G3' else -1.0
+    if r < 0:
+        side = -side
+    h = side * math.sqrt(h2) / d
+    # center = midpoint + h * left normal of the chord
+    return dx / 2 - h * dy, dy / 2 + h * dx
+
+
+# Commands in a G-code file
+#
+#   flip_y      input Y axis points down, like xTool D1 G-code.
+#               Y and J are negated and G2/G3 swapped.
+#   rapid_lift  input has no Z moves, like most laser G-code.
+#               Rapids get Z LIFT_Z and cuts Z CUT_Z so parse_commands()
+#               starts and finishes paths on them.
+#
+# G20/G21 and G90/G91 are followed. F and S on lines of their own before
+# the first motion word go with the first motion command. Arcs given by R get I and J, see
+# r_center(). Everything else passes through with its name, e.g.
+# ('M3', {'S' : 1000.0})
+def read_gcode(filename, use_mmap=False, flip_y=False, rapid_lift=False):
+    return commands(read_lines(filename, use_mmap), flip_y, rapid_lift)
+
+
+def commands(lines, flip_y=False, rapid_lift=False):
+    motion = None
+    scale = 1.0
+    absolute = True
+    lifted = True
+    # F and S given before the first motion word
+    pending = dict()
+    pos = {'X' : 0.0, 'Y' : 0.0, 'Z' : 0.0}
+
+    for line in lines:
+        words = tokenize(line)
+        if not words:
+            continue
+
+        name = None
+        params = dict()
+        others = list()
+        for w, v in words:
+            if w == b'G':
+                g = int(v)
+                if v != g:
+                    # G91.1 and friends
+                    others.append('G' + format(v, 'g'))
+                elif g in MOTION:
+                    motion = MOTION[g]
+                    name = motion
+                elif g == 20:
+                    scale = 25.4
+                elif g == 21:
+                    scale = 1.0
+                elif g == 90:
+                    absolute = True
+                elif g == 91:
+                    absolute = False
+                else:
+                    others.append('G' + str(g))
+            elif w == b'M' or w == b'T':
+                others.append(w.decode() + str(int(v)))
+            elif w in LENGTH_WORDS:
+                params[w.decode()] = v * scale
+            elif w == b'F':
+                # units/min to mm/s
+                params['F'] = v * scale / 60.0
+            else:
+                params[w.decode()] = v
+
+        if flip_y:
+            if 'Y' in params:
+                params['Y'] = -params['Y']
+            if 'J' in params:
+                params['J'] = -params['J']
+
+        start = (pos['X'], pos['Y'])
+        for a in ('X', 'Y', 'Z'):
+            if a in params:
+                if not absolute:
+                    params[a] += pos[a]
+                pos[a] = params[a]
+
+        # non motion words on the line, S on an M3 line goes with the
+        # first of them
+        for i, o in enumerate(others):
+            yield (o, params if name is None and i == 0 else dict())
+
+        if name is None:
+            if others:
+                # a later S on an M3 line is the one in force
+                for k in params:
+                    pending.pop(k, None)
+                continue
+            if not any(a in params for a in ('X', 'Y', 'Z', 'I', 'J')):
+                # "F1200" or "S500" on a line of its own
+                if params and motion is not None:
+                    yield (motion, params)
+                elif params:
+                    pending.update(params)
+                continue
+            # modal motion, "X10 Y20" after a G1
+            name = motion
+            if name is None:
+                continue
+
+        if pending:
+            params = {**pending, **params}
+            pending = dict()
+
+        if flip_y and name in ('G2', 'G3'):
+            name = 'G3' if name == 'G2' else 'G2'
+
+        if name in ('G2', 'G3') and 'R' in params and 'I' not in params and 'J' not in params:
+            try:
+                params['I'], params['J'] = r_center(name, *start, pos['X'], pos['Y'], params.pop('R'))
+            except ValueError as e:
+                raise ValueError(f'{e}: {line.strip().decode(errors="replace")}') from None
+
+        if rapid_lift and 'Z' not in params:
+            if name == 'G0':
+                params['Z'] = LIFT_Z
+                lifted = True
+            else:
+                if lifted:
+                    # plunge on its own so the path starts where the rapid ended
+                    yield ('G1', {'Z' : CUT_Z})
+                    lifted = False
+                params['Z'] = CUT_Z
+
+        yield (name, params)
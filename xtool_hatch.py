@@ -0,0 +1,272 @@
+#!python3
+# ***************************************************************************
+# *   Copyright (c) 2024 whodafloater
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# **************************************************************************
+#
+# xtool_hatch.py
+#
+# Hatch fill of closed shapes, as lines we cut ourselves instead of the
+# xTool fill.
+#
+#    rect = xt.XcsRect('r', xt.XcsPnt(0, 0), xt.XcsPnt(40, 20))
+#    fill = xh.hatch_element(rect, spacing=0.2, angle=45)
+#    canvas.add_element(fill.add_process('VECTOR_ENGRAVING', 40, 200, 1))
+#
+# Scanlines at spacing mm, turned by angle degrees, are cut with all the
+# edges of the outlines at once with numpy. Inside is by the even-odd
+# rule, so a hole is any outline inside another one.
+#
+# Bidirectional hatching goes back and forth. Where the end of a line and
+# the start of the next one are on the same outline edge, they are joined
+# into one polyline, the join runs along the edge. They are also joined
+# across a corner that points out of the shape, from one edge to the
+# next. A rectangle or a circle is one zig-zag, a shape with holes is a
+# zig-zag per column between the holes.
+#
+# Needs numpy.
+
+import math
+
+import numpy as np
+
+import xtool_xcs as xt
+import xtool_estimate
+
+# chord error of circles, mm
+CIRCLE_TOLERANCE = 0.01
+
+
+# closed outlines, lists of (x, y), of an XcsRect, XcsCircle, XcsPen or
+# XcsPath in canvas coordinates. An element with an angle is turned about
+# the center of its box, clockwise on the canvas like xTool does.
+def element_outlines(e):
+    d = e.encode()
+    if d['type'] == 'CIRCLE':
+        rx = d['width'] / 2
+        ry = d['height'] / 2
+        r = max(rx, ry, CIRCLE_TOLERANCE)
+        n = max(16, int(math.ceil(math.pi / math.acos(max(-1.0, 1 - CIRCLE_TOLERANCE / r)))))
+        cx = d['x'] + rx
+        cy = d['y'] + ry
+        outlines = [[(cx + rx * math.cos(2 * math.pi * k / n), cy + ry * math.sin(2 * math.pi * k / n))
+                     for k in range(n)]]
+    elif d['type'] in ('RECT', 'PEN', 'PATH'):
+        outlines = xtool_estimate.element_polylines(d)
+    else:
+        raise ValueError(f'can not hatch a {d["type"]}, only RECT, CIRCLE, PEN and PATH')
+
+    angle = d.get('angle', 0)
+    if not angle:
+        return outlines
+    t = math.radians(angle)
+    co = math.cos(t)
+    si = math.sin(t)
+    cx = d['x'] + d['width'] / 2
+    cy = d['y'] + d['height'] / 2
+    return [[(cx + (x - cx) * co - (y - cy) * si, cy + (x - cx) * si + (y - cy) * co) for x, y in p]
+            for p in outlines]
+
+
+# (x0, y0, x1, y1) arrays of the edges of the outlines, each closed
+def outline_edges(outlines):
+    starts = list()
+    ends = list()
+    for p in outlines:
+        a = np.asarray(p, dtype=float).reshape(-1, 2)
+        if len(a) < 3:
+            continue
+        starts.append(a)
+        ends.append(np.roll(a, -1, axis=0))
+    if not starts:
+        z = np.zeros(0)
+        return z, z, z, z
+    s = np.concatenate(starts)
+    e = np.concatenate(ends)
+    return s[:, 0], s[:, 1], e[:, 0], e[:, 1]
+
+
+# (before, after) arrays, the edges before and after each edge of
+# outline_edges() on the same outline, around its ends
+def edge_neighbours(outlines):
+    sizes = [len(p) for p in outlines if len(p) >= 3]
+    if not sizes:
+        z = np.zeros(0, dtype=np.int64)
+        return z, z
+    size = np.repeat(sizes, sizes)
+    first = np.repeat(np.cumsum(sizes) - sizes, sizes)
+    k = np.arange(len(size)) - first
+    return first + (k - 1) % size, first + (k + 1) % size
+
+
+# All scanline crossings of the edges, as (row, x, edge) arrays sorted by
+# row then x. Row j is at y = (j + 0.5) * spacing. An edge crosses the
+# rows with ylo <= y < yhi, so a vertex counts once and each row has an
+# even number of crossings.
+def crossings(x0, y0, x1, y1, spacing):
+    ylo = np.minimum(y0, y1)
+    yhi = np.maximum(y0, y1)
+    jlo = np.ceil(ylo / spacing - 0.5).astype(np.int64)
+    jhi = np.ceil(yhi / spacing - 0.5).astype(np.int64)
+    counts = jhi - jlo
+    keep = counts > 0
+    edges = np.nonzero(keep)[0]
+    counts = counts[keep]
+
+    # one entry per crossing: its edge and its row
+    edge = np.repeat(edges, counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    row = jlo[edge] + np.arange(len(edge)) - first
+
+    y = (row + 0.5) * spacing
+    x = x0[edge] + (y - y0[edge]) * (x1[edge] - x0[edge]) / (y1[edge] - y0[edge])
+
+    order = np.lexsort((x, row))
+    return row[order], x[order], edge[order]
+
+
+# Hatch lines of closed outlines, a list of (n, 2) arrays of points.
+# spacing is the distance between lines in mm, angle the direction of
+# the lines in degrees.
+def hatch_lines(outlines, spacing, angle=0.0, bidirectional=True):
+    if spacing <= 0:
+        raise ValueError('hatch spacing must be more than 0')
+    x0, y0, x1, y1 = outline_edges(outlines)
+
+    # turn the outlines so the hatch lines are along x
+    a = math.radians(angle)
+    c = math.cos(a)
+    s = math.sin(a)
+    rx0, ry0 = x0 * c + y0 * s, -x0 * s + y0 * c
+    rx1, ry1 = x1 * c + y1 * s, -x1 * s + y1 * c
+
+    row, x, edge = crossings(rx0, ry0, rx1, ry1, spacing)
+    if len(row) == 0:
+        return list()
+
+    # pairs of crossings are the segments inside
+    row = row[0::2]
+    xa = x[0::2]
+    xb = x[1::2]
+    ea = edge[0::2]
+    eb = edge[1::2]
+
+    if bidirectional:
+        # every other row goes right to left, its segments in reverse
+        back = (row - row[0]) % 2 == 1
+        order = np.lexsort((np.where(back, -xa, xa), row))
+        row, xa, xb, ea, eb, back = row[order], xa[order], xb[order], ea[order], eb[order], back[order]
+        xs = np.where(back, xb, xa)
+        xe = np.where(back, xa, xb)
+        es = np.where(back, eb, ea)
+        ee = np.where(back, ea, eb)
+        edges = (rx0, ry0, rx1, ry1, *edge_neighbours(outlines))
+        chains = join_segments(row, xs, xe, es, ee, edges, spacing)
+    else:
+        xs, xe = xa, xb
+        chains = [[i] for i in range(len(row))]
+
+    y = (row + 0.5) * spacing
+    lines = list()
+    for chain in chains:
+        ch = np.asarray(chain)
+        pts = np.empty((2 * len(ch), 2))
+        pts[0::2, 0] = xs[ch]
+        pts[1::2, 0] = xe[ch]
+        pts[0::2, 1] = y[ch]
+        pts[1::2, 1] = y[ch]
+        # turn back
+        lines.append(np.column_stack((pts[:, 0] * c - pts[:, 1] * s, pts[:, 0] * s + pts[:, 1] * c)))
+    return lines
+
+
+# Chains of segments, lists of segment indexes. Segment t follows
+# segment s if it is on the next row and starts on the edge s ends on,
+# or on the edge before or after it on the same outline. Then the join
+# cuts across the corner between the two edges, which it only may where
+# the corner points out of the shape, away from the segments.
+def join_segments(row, xs, xe, es, ee, edges, spacing):
+    x0, y0, x1, y1, before, after = edges
+    nedges = len(x0)
+    n = len(row)
+    start_key = row * nedges + es
+    by_start = np.argsort(start_key, kind='stable')
+    sorted_key = start_key[by_start]
+
+    # segment starting on edge on the next row, -1 if none
+    def follower(edge):
+        end_key = (row + 1) * nedges + edge
+        pos = np.minimum(np.searchsorted(sorted_key, end_key), n - 1)
+        cand = by_start[pos]
+        return np.where(start_key[cand] == end_key, cand, -1)
+
+    # t where corner vx, vy is between the rows and outside the join, else -1
+    def corner(t, vx, vy):
+        y = (row + 0.5) * spacing
+        x = xe + (vy - y) * (xs[t] - xe) / spacing
+        between = (vy >= y) & (vy <= y + spacing)
+        return np.where((t >= 0) & between & ((vx - x) * (xe - xs) >= 0), t, -1)
+
+    nxt = follower(ee)
+    for edge, vx, vy in ((after[ee], x1[ee], y1[ee]), (before[ee], x0[ee], y0[ee])):
+        t = corner(follower(edge), vx, vy)
+        nxt = np.where(nxt >= 0, nxt, t)
+    nxt = nxt.tolist()
+
+    used = bytearray(n)
+    chains = list()
+    for i in range(n):
+        if used[i]:
+            continue
+        chain = list()
+        while i >= 0 and not used[i]:
+            used[i] = 1
+            chain.append(i)
+            i = nxt[i]
+        chains.append(chain)
+    return chains
+
+
+# svg path data of hatch lines, moves and lines, relative after the
+# first point of each line to keep it short. The points are rounded
+# before the differences are taken, so the rounding does not add up.
+def hatch_svg(lines, precision=3):
+    f = '%.' + str(precision) + 'f'
+    pair = f + ' ' + f
+    out = list()
+    for pts in lines:
+        r = np.round(pts, precision)
+        d = np.diff(r, axis=0).ravel().tolist()
+        out.append('M' + pair % (r[0, 0], r[0, 1]) + 'l' + ' '.join([pair] * (len(d) // 2)) % tuple(d))
+    return ''.join(out)
+
+
+# XcsPath of the hatch of an element. Placed where the lines are, with no
+# process, add one like to any element.
+def hatch_element(e, spacing, angle=0.0, bidirectional=True, id=None, precision=3):
+    lines = hatch_lines(element_outlines(e), spacing, angle, bidirectional)
+    if not lines:
+        return None
+    pts = np.concatenate(lines)
+    xmin, ymin = pts.min(axis=0)
+    p = xt.XcsPath(id or e.id + '_hatch').setpath(float(xmin), float(ymin), hatch_svg(lines, precision))
+    p.isClosePath = False
+    if e.groupTag:
+        p.group(e.groupTag)
+    return p
@@ -0,0 +1,364 @@
+#!python3
+# ***************************************************************************
+# *   Copyright (c) 2024 whodafloater
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# **************************************************************************
+#
+# xtool_optimize.py
+#
+# Makes G-code for the xTool D1 smaller. Works on the G-code text, so it
+# can clean up the output of the post or any other file.
+#
+#    python xtool_optimize.py part.gcode -o part_small.gcode
+#
+# - G1 runs that stay within tolerance of a straight line become one G1.
+#   Arcs come out of the post as many short G1 moves, so do scanned or
+#   digitized outlines.
+# - moves that go nowhere are dropped
+# - F and S words that do not change the feed or power are dropped
+# - Z only moves are dropped, the D1 has no Z axis. An F or S on them
+#   goes to the next move.
+#
+# Only plain G0 and G1 lines are touched. Comments, M codes and anything
+# else pass through and end a G1 run. G91 (relative) passes everything
+# through until G90.
+#
+# F and S are treated as shared by G0 and G1 and also as kept per move
+# type. A word is dropped only if it is redundant both ways.
+
+import argparse
+import math
+import re
+
+WORD = re.compile(r'([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))')
+COMMENT = re.compile(r'\([^)]*\)|;.*')
+
+MOTION = {'G0' : 'G0', 'G00' : 'G0', 'G1' : 'G1', 'G01' : 'G1'}
+MOVE_WORDS = 'NGXYZFS'
+
+# same as the chord error gcode_arc() tessellates with
+DEFAULT_TOLERANCE = 0.01
+
+
+# A G0 or G1 line. words are (letter, text, value), text as written so
+# untouched numbers keep their format.
+class Move:
+    __slots__ = ('number', 'cmd', 'mode', 'words')
+
+    def __init__(self, number, cmd, words):
+        self.number = number
+        self.cmd = cmd
+        self.mode = MOTION.get(cmd) if cmd else None
+        self.words = words
+
+    def has(self, letter):
+        for w in self.words:
+            if w[0] == letter:
+                return True
+        return False
+
+
+# A Move, or None if the line is something else
+def parse_line(line):
+    if '(' in line or ';' in line:
+        return None
+    words = WORD.findall(line)
+    if not words:
+        return None
+    # anything between the words we do not understand
+    if WORD.sub('', line).strip():
+        return None
+
+    number = None
+    cmd = None
+    mwords = list()
+    for letter, text in words:
+        if letter not in MOVE_WORDS:
+            return None
+        if letter == 'N':
+            number = text
+        elif letter == 'G':
+            if cmd is not None or ('G' + text) not in MOTION:
+                return None
+            cmd = 'G' + text
+        else:
+            for w in mwords:
+                if w[0] == letter:
+                    return None
+            mwords.append((letter, text, float(text)))
+    return Move(number, cmd, mwords)
+
+
+# distance of the points from the line p0 p1 is within tol and they
+# follow each other along it
+def _collinear(p0, p1, pts, tol):
+    dx = p1[0] - p0[0]
+    dy = p1[1] - p0[1]
+    l = math.hypot(dx, dy)
+    if l == 0:
+        return False
+    last = 0.0
+    for p in pts:
+        ex = p[0] - p0[0]
+        ey = p[1] - p0[1]
+        t = (ex * dx + ey * dy) / l
+        if t < last - tol or t > l + tol:
+            return False
+        if abs(ex * dy - ey * dx) / l > tol:
+            return False
+        last = t
+    return True
+
+
+class Optimizer:
+    def __init__(self, tolerance=DEFAULT_TOLERANCE, drop_z=True):
+        self.tolerance = tolerance
+        self.drop_z = drop_z
+        self.stats = dict(lines_in = 0, lines_out = 0, bytes_in = 0, bytes_out = 0,
+                          merged = 0, zero_length = 0, z_moves = 0, words = 0)
+        self.relative = False
+        # motion mode of the input and of what has been written
+        self.mode = None
+        self.out_mode = None
+        # position as (value, text) per axis, None is unknown
+        self.pos = {'X' : None, 'Y' : None, 'Z' : None}
+        # F and S, shared and per move type
+        self.modal = {'F' : None, 'S' : None}
+        self.modal_mode = {'G0' : {'F' : None, 'S' : None},
+                           'G1' : {'F' : None, 'S' : None}}
+        # F and S words of dropped Z moves, (mode, [words])
+        self.pending = None
+        # G1 run: start point, points absorbed, last move not written yet
+        self.run_start = None
+        self.run_pts = list()
+        self.run_move = None
+        self.run_end = None
+
+    # optimized lines of an iterable of lines
+    def lines(self, lines):
+        for line in lines:
+            line = line.rstrip('\r\n')
+            self.stats['lines_in'] += 1
+            self.stats['bytes_in'] += len(line) + 1
+            yield from self.count(self.line(line))
+        yield from self.count(self.finish())
+
+    def count(self, out):
+        for line in out:
+            self.stats['lines_out'] += 1
+            self.stats['bytes_out'] += len(line) + 1
+            yield line
+
+    def finish(self):
+        out = self.flush_run()
+        out += self.flush_pending()
+        return out
+
+    def line(self, line):
+        m = None if self.relative else parse_line(line)
+        if m is None or (m.mode is None and self.mode is None):
+            return self.other(line)
+
+        if m.mode is None:
+            m.mode = self.mode
+        self.mode = m.mode
+        return self.move(m)
+
+    # a line we do not optimize
+    def other(self, line):
+        out = self.finish()
+        code = COMMENT.sub('', line).upper()
+        for letter, text in WORD.findall(code):
+            if letter == 'G':
+                if text in ('90', '90.0'):
+                    self.relative = False
+                elif text in ('91', '91.0'):
+                    self.relative = True
+                elif ('G' + text) in MOTION:
+                    self.mode = MOTION['G' + text]
+                    self.out_mode = self.mode
+            elif letter in self.pos:
+                self.pos[letter] = None
+            elif letter in self.modal:
+                self.modal[letter] = None
+                for mm in self.modal_mode.values():
+                    mm[letter] = None
+        if self.relative:
+            self.pos = {'X' : None, 'Y' : None, 'Z' : None}
+        out.append(line.rstrip())
+        return out
+
+    def move(self, m):
+        out = list()
+        mode = m.mode
+        modal_mode = self.modal_mode[mode]
+
+        # F and S that change nothing
+        words = list()
+        for w in m.words:
+            letter = w[0]
+            if letter in self.modal:
+                if self.modal[letter] == w[2] and modal_mode[letter] == w[2]:
+                    self.stats['words'] += 1
+                    continue
+                self.modal[letter] = w[2]
+                modal_mode[letter] = w[2]
+            words.append(w)
+        m.words = words
+
+        axes = [w for w in words if w[0] in self.pos]
+        settings = [w for w in words if w[0] in self.modal]
+
+        # Z only move, keep its settings for the next move
+        if self.drop_z and axes and all(w[0] == 'Z' for w in axes):
+            self.stats['z_moves'] += 1
+            self.pos['Z'] = (axes[0][2], axes[0][1])
+            if settings:
+                if self.pending is not None and self.pending[0] != mode:
+                    out += self.finish()
+                if self.pending is None:
+                    self.pending = (mode, list())
+                self.pending = (mode, [w for w in self.pending[1] if not m.has(w[0])] + settings)
+            return out
+
+        # settings of dropped Z moves go on this one
+        if self.pending is not None:
+            if self.pending[0] != mode:
+                out += self.finish()
+            else:
+                pending = [w for w in self.pending[1] if not m.has(w[0])]
+                self.pending = None
+                m.words = words = words + pending
+                settings = settings + pending
+
+        # a move that goes nowhere
+        if axes and all(self.pos[w[0]] is not None and self.pos[w[0]][0] == w[2] for w in axes):
+            self.stats['zero_length'] += 1
+            m.words = words = settings
+            axes = list()
+
+        if not words:
+            return out
+
+        target = dict(self.pos)
+        for w in axes:
+            target[w[0]] = (w[2], w[1])
+
+        if (mode == 'G1' and not settings and not m.has('Z')
+                and self.pos['X'] is not None and self.pos['Y'] is not None
+                and target['X'] is not None and target['Y'] is not None):
+            out += self.extend_run(m, target)
+        else:
+            out += self.flush_run()
+            out.append(self.format(m))
+        self.pos = target
+        return out
+
+    def extend_run(self, m, target):
+        p = (target['X'][0], target['Y'][0])
+        if self.run_move is not None:
+            pts = self.run_pts + [self.run_end]
+            if _collinear(self.run_start, p, pts, self.tolerance):
+                self.stats['merged'] += 1
+                self.run_pts = pts
+                self.run_move = m
+                self.run_end = p
+                # the axes left out of this move may have changed on the
+                # moves it replaces, write both
+                m.words = [('X', target['X'][1], target['X'][0]),
+                           ('Y', target['Y'][1], target['Y'][0])]
+                return list()
+            out = self.flush_run()
+        else:
+            out = list()
+        self.run_start = (self.pos['X'][0], self.pos['Y'][0])
+        self.run_pts = list()
+        self.run_move = m
+        self.run_end = p
+        return out
+
+    def flush_run(self):
+        if self.run_move is None:
+            return list()
+        m = self.run_move
+        self.run_move = None
+        self.run_pts = list()
+        return [self.format(m)]
+
+    def flush_pending(self):
+        if self.pending is None:
+            return list()
+        mode, words = self.pending
+        self.pending = None
+        return [self.format(Move(None, mode, words))]
+
+    def format(self, m):
+        s = list()
+        if m.number is not None:
+            s.append('N' + m.number)
+        if m.cmd is not None or m.mode != self.out_mode:
+            s.append(m.cmd or m.mode)
+        self.out_mode = m.mode
+        for w in m.words:
+            s.append(w[0] + w[1])
+        return ' '.join(s)
+
+
+# (optimized gcode, statistics)
+def optimize_gcode(gcode, tolerance=DEFAULT_TOLERANCE, drop_z=True):
+    opt = Optimizer(tolerance, drop_z)
+    out = '\n'.join(opt.lines(gcode.splitlines())) + '\n'
+    return out, opt.stats
+
+
+def report(stats):
+    def saved(a, b):
+        return 100.0 * (a - b) / a if a else 0.0
+    return (f'optimize: {stats["lines_in"]} -> {stats["lines_out"]} lines'
+            f' ({saved(stats["lines_in"], stats["lines_out"]):.1f}% saved),'
+            f' {stats["bytes_in"]} -> {stats["bytes_out"]} bytes'
+            f' ({saved(stats["bytes_in"], stats["bytes_out"]):.1f}% saved).'
+            f' {stats["merged"]} collinear moves merged, {stats["zero_length"]} zero length moves,'
+            f' {stats["z_moves"]} Z moves and {stats["words"]} redundant F/S words dropped')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Make G-code for the xTool D1 smaller')
+    parser.add_argument('file', help='G-code file')
+    parser.add_argument('-o', '--output', default=None,
+                        help='output file, default is to print the statistics only')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f'how far merged moves may stray from the line, default {DEFAULT_TOLERANCE}')
+    parser.add_argument('--keep-z', action='store_true', help='keep Z only moves')
+    args = parser.parse_args(argv)
+
+    opt = Optimizer(args.tolerance, not args.keep_z)
+    with open(args.file, 'r') as f:
+        if args.output is None:
+            for line in opt.lines(f):
+                pass
+        else:
+            with open(args.output, 'w') as out:
+                for line in opt.lines(f):
+                    out.write(line + '\n')
+    print(report(opt.stats))
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
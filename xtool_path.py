@@ -0,0 +1,1766 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 whodafloater
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# **************************************************************************
+#
+# xtool_path.py
+#
+# Toolpath core for the XTool post processors. No FreeCAD needed.
+#
+# Commands are plain (name, parameters) tuples, same names and parameter
+# keys as a FreeCAD Path.Command. Lengths are in mm and feeds in mm/s,
+# the FreeCAD internal units.
+#
+# parse_commands() reads the commands once into a CommandTable. The G-code
+# text, the svg paths, their bounds and the job statistics are made from
+# the table.
+#
+# UtilsXTool is the FreeCAD adapter that feeds Path.Commands in here.
+# See main() at the bottom for a stand alone benchmark.
+#
+# parts leveraged from linuxcnc_post.py, refactored_linuxcnc_post.py
+#    Copyright (c) 2014 sliptonic <shopinthewoods@gmail.com>
+#    Copyright (c) 2022 Larry Woestman <LarryWoestman2@gmail.com>
+#
+
+import itertools
+import math
+import os
+import time
+from array import array
+
+import xtool_xcs as xt
+
+# needed for fculps() and svgnum()
+PRECISION = 3
+UNIT_FORMAT = 'mm'
+
+# print progress of the parse
+VERBOSE = True
+
+# value of one unit in FreeCAD internal units, mm and mm/s
+LENGTH_UNITS = {'mm' : 1.0, 'cm' : 10.0, 'm' : 1000.0, 'in' : 25.4}
+VELOCITY_UNITS = {'mm/s' : 1.0, 'mm/min' : 1.0 / 60.0,
+                  'm/min' : 1000.0 / 60.0, 'in/s' : 25.4, 'in/min' : 25.4 / 60.0}
+
+RAPID_MOVES = ["G0", "G00"]
+FEED_MOVES = ["G1", "G01", "G2", "G02", "G3", "G03"]
+LINE_MOVES = ["G1", "G01"]
+ARC_MOVES = ["G2", "G02", "G3", "G03"]
+CCW_MOVES = ["G3", "G03"]
+
+
+# Stand-in for a FreeCAD Path.Command, just the bits we read
+class Command:
+    __slots__ = ('Name', 'Parameters')
+
+    def __init__(self, name, parameters=None):
+        self.Name = name
+        self.Parameters = dict(parameters or {})
+
+    def totuple(self):
+        return (self.Name, self.Parameters)
+
+
+def init_format(values):
+    global PRECISION
+    global UNIT_FORMAT
+    PRECISION = values["AXIS_PRECISION"]
+    UNIT_FORMAT = values["UNIT_FORMAT"]
+
+
+def log(s):
+    if VERBOSE:
+        print(s)
+
+
+def feed_value(f, unit):
+    return f / VELOCITY_UNITS[unit]
+
+
+def svgnum(val):
+    precision_string = "." + str(PRECISION) + "f"
+    return format(float(val / LENGTH_UNITS[UNIT_FORMAT]), precision_string)
+
+def fculps(val, key):
+    precision_string = "." + str(PRECISION) + "f"
+    if key == 'Y':
+       val = -val
+    return format(float(val / LENGTH_UNITS[UNIT_FORMAT]), precision_string)
+
+def linenumber(values):
+    LINENR = values["LINENR"]
+    if values["OUTPUT_LINE_NUMBERS"] is True:
+        LINENR += 10
+        return "N" + str(LINENR) + " "
+    values["LINENR"] = LINENR
+    return ""
+
+
+# radius of an arc from p1 around c, an arc without one can not be drawn
+def arc_radius(name, p1, p2, c):
+    rad = math.hypot(p1[0] - c[0], p1[1] - c[1])
+    if rad == 0 or (p2[0] == c[0] and p2[1] == c[1]):
+        raise ValueError(f'{name} from ({p1[0]:g}, {p1[1]:g}) to ({p2[0]:g}, {p2[1]:g})'
+                         f' around ({c[0]:g}, {c[1]:g}) has no radius, are I and J missing?')
+    return rad
+
+
+# p1, p2, c are (x, y, ...) tuples
+def gcode_arc(name, p1, p2, c):
+    r1x = p1[0] - c[0]
+    r1y = p1[1] - c[1]
+    rad = arc_radius(name, p1, p2, c)
+
+    a1 = math.atan2(r1y, r1x)
+    a2 = math.atan2(p2[1] - c[1], p2[0] - c[0])
+    tarc = arc_sweep(name, a1, a2)
+
+    # chord_err = rad * (1 - cos(arcstep/2))
+    # arcstep = 2 * acos(1 - chord_err / rad)
+    chord_err = 0.01
+    arcstep = 2 * math.acos(1 - chord_err / rad)
+
+    n = int(abs(tarc / arcstep))
+    n = max(n, 2)
+    n = min(n, 128)
+    segs = []
+    for i in range(1, n):
+        a = a1 + tarc * float(i) / float(n-1);
+        x = c[0] + rad * math.cos(a)
+        y = c[1] + rad * math.sin(a)
+        segs.append(f'G1 X{fculps(x, "X")} Y{fculps(y, "Y")}')
+
+    return segs
+
+
+# Running bounding box. Keeps only the extremes so memory use does not
+# grow with the number of points in a path.
+class Bound:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.xmin = math.inf
+        self.xmax = -math.inf
+        self.ymin = math.inf
+        self.ymax = -math.inf
+        return self
+
+    def empty(self):
+        return self.xmin > self.xmax
+
+    def add(self, x, y):
+        if x < self.xmin:
+            self.xmin = x
+        if x > self.xmax:
+            self.xmax = x
+        if y < self.ymin:
+            self.ymin = y
+        if y > self.ymax:
+            self.ymax = y
+        return self
+
+    def merge(self, b):
+        if not b.empty():
+            self.add(b.xmin, b.ymin)
+            self.add(b.xmax, b.ymax)
+        return self
+
+
+def svg_finish_path(dout, svg, feed, power, bound, length=0.0):
+    # capture path only if it draws something
+    if not ("L" in svg or "A" in svg):
+        return
+
+    p = {'svg' : svg, 'feed' : feed, 'power' : power,
+         'xmin' : bound.xmin,
+         'xmax' : bound.xmax,
+         'ymin' : bound.ymin,
+         'ymax' : bound.ymax,
+         'length' : length,
+        }
+    dout['svgps'].append(p)
+
+    # update the global bounding box
+    dout['glob_bound'].merge(bound)
+
+    log(p)
+
+
+# a path starts where the command that starts it starts
+def svg_move(startPoint):
+    return "M" + svgnum(startPoint[0]) + " " + svgnum(-startPoint[1])
+
+
+def svg_line(startPoint, endPoint):
+    return " L" + svgnum(endPoint[0]) + " " + svgnum(-endPoint[1])
+
+
+# unit vector from a to b
+def _unit(ax, ay, bx, by):
+    dx = bx - ax
+    dy = by - ay
+    l = math.hypot(dx, dy)
+    return (dx / l, dy / l)
+
+
+# https://www.w3.org/TR/SVG/implnote.html#ArcImplementationNotes
+# section B.2.3
+#
+# p1, p2, c are (x, y, ...) tuples
+def svg_arc(name, p1, p2, c):
+    if p1[0] == p2[0] and p1[1] == p2[1]:
+        # a full circle, svg draws nothing for an arc that ends where it
+        # starts. Two halves through the point across.
+        across = (2 * c[0] - p1[0], 2 * c[1] - p1[1])
+        return svg_arc(name, p1, across, c) + svg_arc(name, across, p2, c)
+
+    rad = svgnum(arc_radius(name, p1, p2, c))
+    ca = _unit(p1[0], p1[1], c[0], c[1])
+    cb = _unit(p2[0], p2[1], c[0], c[1])
+
+    # cross prod = mag(ra) * mag(rb) * sin( angle(bac) )
+    cp = ca[0] * cb[1] - ca[1] * cb[0]
+
+    # four possible ways to "arc" from p1 to p2:
+    # CCW, small angle, cp will be positive
+    #      large angle, cp will be negative
+    # CW,  small angle, cp will be negative
+    #      large angle, cp will be positive
+
+    # svg arc: A radx rady rot fa fs X Y
+    #
+    # svg arcs are elliptical.
+    # rot is rotation of the ellipse
+    #
+    # four possible paths from p1 to p2
+    # fa 1 large arc
+    #    0 small arc
+    # fs 1 sweep rigth, cw
+    #    0 sweep left, ccw
+    # note that the SVG plane is flipped about the x axis
+    # so cw -> ccw, ccw -> cw
+
+    #  A radx rady
+    s = " A" + " " + rad + " " + rad
+
+    # rot fa fs
+    # rot is always 0 since we do circles only
+    if name in CCW_MOVES:
+        # CW because Y-axis is inverted for svg
+        if(cp > 0):
+           s += " 0 0 0 "
+        else:
+           s += " 0 1 0 "
+    else:
+        # CCW because Y-axis is inverted for svg
+        if(cp < 0):
+           s += " 0 0 1 "
+        else:
+           s += " 0 1 1 "
+
+    #  x y
+    s += svgnum(p2[0]) + " " + svgnum(-p2[1])
+
+    return s
+
+
+# Signed angle an arc sweeps from angle a1 to a2, the way gcode_arc()
+# goes: CCW positive, CW negative. Equal angles are a full circle, the
+# same as arc_length().
+def arc_sweep(name, a1, a2):
+    tarc = a2 - a1
+    if name in CCW_MOVES:
+        if tarc <= 0:
+            tarc += 2 * math.pi
+    else:
+        if tarc >= 0:
+            tarc -= 2 * math.pi
+    return tarc
+
+
+# Exact bounding box of the arc around (cx, cy) with radius rad, starting
+# at angle a1 and sweeping sweep radians, as (xmin, ymin, xmax, ymax).
+#
+# The box holds the end points and each point where the arc crosses an
+# axis through the center, 0, 90, 180 or 270 degrees. Angle k * pi/2 is
+# crossed if it is no further than the sweep from the start, going the
+# way of the arc.
+def arc_extent(cx, cy, rad, a1, sweep):
+    a2 = a1 + sweep
+    x1 = cx + rad * math.cos(a1)
+    y1 = cy + rad * math.sin(a1)
+    x2 = cx + rad * math.cos(a2)
+    y2 = cy + rad * math.sin(a2)
+    xmin, xmax = (x1, x2) if x1 < x2 else (x2, x1)
+    ymin, ymax = (y1, y2) if y1 < y2 else (y2, y1)
+
+    # go CCW from whichever end that is
+    if sweep < 0:
+        a1 = a2
+        sweep = -sweep
+    if sweep >= 2 * math.pi:
+        return (cx - rad, cy - rad, cx + rad, cy + rad)
+
+    if (0.0 - a1) % (2 * math.pi) <= sweep:
+        xmax = cx + rad
+    if (0.5 * math.pi - a1) % (2 * math.pi) <= sweep:
+        ymax = cy + rad
+    if (math.pi - a1) % (2 * math.pi) <= sweep:
+        xmin = cx - rad
+    if (1.5 * math.pi - a1) % (2 * math.pi) <= sweep:
+        ymin = cy - rad
+    return (xmin, ymin, xmax, ymax)
+
+
+# arc_extent() of many arcs, one (xmin, ymin, xmax, ymax) tuple each.
+# The arguments are sequences of the same length. Uses numpy if it is
+# there, else loops over arc_extent().
+def arc_extents(cx, cy, rad, a1, sweep):
+    try:
+        import numpy as np
+    except ImportError:
+        return [arc_extent(*a) for a in zip(cx, cy, rad, a1, sweep)]
+
+    cx = np.asarray(cx, dtype=float)
+    cy = np.asarray(cy, dtype=float)
+    rad = np.asarray(rad, dtype=float)
+    a1 = np.asarray(a1, dtype=float)
+    sweep = np.asarray(sweep, dtype=float)
+
+    a2 = a1 + sweep
+    x1 = cx + rad * np.cos(a1)
+    y1 = cy + rad * np.sin(a1)
+    x2 = cx + rad * np.cos(a2)
+    y2 = cy + rad * np.sin(a2)
+    xmin = np.minimum(x1, x2)
+    xmax = np.maximum(x1, x2)
+    ymin = np.minimum(y1, y2)
+    ymax = np.maximum(y1, y2)
+
+    start = np.where(sweep < 0, a2, a1)
+    sweep = np.abs(sweep)
+    full = sweep >= 2 * math.pi
+
+    def crosses(angle):
+        return full | (np.mod(angle - start, 2 * math.pi) <= sweep)
+
+    xmax = np.where(crosses(0.0), cx + rad, xmax)
+    ymax = np.where(crosses(0.5 * math.pi), cy + rad, ymax)
+    xmin = np.where(crosses(math.pi), cx - rad, xmin)
+    ymin = np.where(crosses(1.5 * math.pi), cy - rad, ymin)
+    return list(zip(xmin.tolist(), ymin.tolist(), xmax.tolist(), ymax.tolist()))
+
+
+# bounding box of an arc in svg coordinates
+def arc_bound(name, p1, p2, c, bound):
+    rad = math.hypot(p1[0] - c[0], p1[1] - c[1])
+    a1 = math.atan2(p1[1] - c[1], p1[0] - c[0])
+    a2 = math.atan2(p2[1] - c[1], p2[0] - c[0])
+    xmin, ymin, xmax, ymax = arc_extent(c[0], c[1], rad, a1, arc_sweep(name, a1, a2))
+    bound.add(xmin, -ymax)
+    bound.add(xmax, -ymin)
+    return bound
+
+
+def new_dout(feed=0, speed=0):
+    return dict(gcode = "", svgps = list(), feed = feed, speed = speed,
+                glob_bound = Bound())
+
+
+# -------------------------------------------------------------------------
+# Command table
+#
+# The commands of a path, one row per command, one array per column.
+# Built in a single pass over the commands. The G-code, svg, bounds and
+# statistics consumers below only read the table.
+#
+#   op       index into names, the command name as given ('G1', 'G01', ...)
+#   x y z    position after the command, mm. Carried from the row before
+#            when the command does not have the word.
+#   i j      arc center offset, mm. 0 if not given.
+#   f        feed after the command, in values["UNIT_SPEED_FORMAT"]
+#   s        power (spindle speed) after the command
+#   mask     which of X Y Z I J F S the command had, see PARAM_BITS
+#
+# Other parameter words (T, H, D, P ...) are rare. They are kept in the
+# extra dict keyed by row.
+#
+# position is where the machine is before the first row, FIRST_MOVE at the
+# start of a program. A table that carries on from another one, see
+# command_chunks(), starts where that one stopped.
+#
+# drop marks the rows dedup_table() takes out, empty when it did not run.
+# The rows stay in the table so start() of the next row is unchanged.
+#
+# The columns are array.array, so numpy.frombuffer() can look at them
+# without a copy, see numpy_columns().
+
+PARAM_BITS = {'X' : 1, 'Y' : 2, 'Z' : 4, 'I' : 8, 'J' : 16, 'F' : 32, 'S' : 64}
+
+# position before the first command
+FIRST_MOVE = (-1.0, -1.0, -1.0)
+
+OP_RAPID = 0
+OP_LINE = 1
+OP_ARC = 2
+OP_COMMENT = 3
+OP_OTHER = 4
+
+def op_kind(name):
+    if name in RAPID_MOVES:
+        return OP_RAPID
+    if name in LINE_MOVES:
+        return OP_LINE
+    if name in ARC_MOVES:
+        return OP_ARC
+    if name[0] == '(':
+        return OP_COMMENT
+    return OP_OTHER
+
+
+class CommandTable:
+    def __init__(self, values, feed=0, speed=0, position=FIRST_MOVE):
+        self.unit_speed = values["UNIT_SPEED_FORMAT"]
+        self.feed0 = feed
+        self.speed0 = speed
+        self.position0 = tuple(position)
+        self.names = list()
+        self.kinds = list()
+        self.name_index = dict()
+        self.op = array('I')
+        self.x = array('d')
+        self.y = array('d')
+        self.z = array('d')
+        self.i = array('d')
+        self.j = array('d')
+        self.f = array('d')
+        self.s = array('q')
+        self.mask = array('H')
+        self.extra = dict()
+        self.drop = bytearray()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.op)
+
+    def name(self, r):
+        return self.names[self.op[r]]
+
+    def kind(self, r):
+        return self.kinds[self.op[r]]
+
+    # position before row r
+    def start(self, r):
+        if r == 0:
+            return self.position0
+        return (self.x[r-1], self.y[r-1], self.z[r-1])
+
+    def feed(self):
+        return self.f[-1] if len(self) else self.feed0
+
+    def speed(self):
+        return self.s[-1] if len(self) else self.speed0
+
+    def extend(self, commands):
+        x, y, z = self.position0
+        if len(self):
+            x, y, z = self.x[-1], self.y[-1], self.z[-1]
+        f = self.feed()
+        s = self.speed()
+
+        for name, params in commands:
+            if VERBOSE:
+                print(name + str(params))
+
+            n = self.name_index.get(name)
+            if n is None:
+                n = len(self.names)
+                self.name_index[name] = n
+                self.names.append(name)
+                self.kinds.append(op_kind(name))
+
+            mask = 0
+            extra = None
+            for k, v in params.items():
+                bit = PARAM_BITS.get(k)
+                if bit is None:
+                    if extra is None:
+                        extra = dict()
+                    extra[k] = v
+                else:
+                    mask |= bit
+
+            if mask & 1:
+                x = params['X']
+            if mask & 2:
+                y = params['Y']
+            if mask & 4:
+                z = params['Z']
+            if mask & 32:
+                f = feed_value(params['F'], self.unit_speed)
+            if mask & 64:
+                s = int(params['S'])
+
+            if extra is not None:
+                self.extra[len(self.op)] = extra
+
+            self.op.append(n)
+            self.x.append(x)
+            self.y.append(y)
+            self.z.append(z)
+            self.i.append(params['I'] if mask & 8 else 0.0)
+            self.j.append(params['J'] if mask & 16 else 0.0)
+            self.f.append(f)
+            self.s.append(s)
+            self.mask.append(mask)
+
+        if self.drop:
+            self.drop.extend(bytes(len(self.op) - len(self.drop)))
+        return self
+
+    # parameters of row r as the command had them.
+    # F is in values["UNIT_SPEED_FORMAT"].
+    def params(self, r):
+        m = self.mask[r]
+        d = dict()
+        if m & 1:
+            d['X'] = self.x[r]
+        if m & 2:
+            d['Y'] = self.y[r]
+        if m & 4:
+            d['Z'] = self.z[r]
+        if m & 8:
+            d['I'] = self.i[r]
+        if m & 16:
+            d['J'] = self.j[r]
+        if m & 32:
+            d['F'] = self.f[r]
+        if m & 64:
+            d['S'] = self.s[r]
+        if r in self.extra:
+            d.update(self.extra[r])
+        return d
+
+
+def numpy_columns(table):
+    import numpy as np
+    return dict(op = np.frombuffer(table.op, dtype=np.uint32),
+                kind = np.asarray(table.kinds, dtype=np.int8)[np.frombuffer(table.op, dtype=np.uint32)]
+                       if len(table) else np.zeros(0, dtype=np.int8),
+                x = np.frombuffer(table.x), y = np.frombuffer(table.y),
+                z = np.frombuffer(table.z), i = np.frombuffer(table.i),
+                j = np.frombuffer(table.j), f = np.frombuffer(table.f),
+                s = np.frombuffer(table.s, dtype=np.int64),
+                mask = np.frombuffer(table.mask, dtype=np.uint16))
+
+
+# Quantization
+#
+# After rounding to AXIS_PRECISION many short moves land on the point they
+# start from, and FreeCAD leaves zero length G1s where contours join. They
+# would still make a G-code line, an svg L and bound entries.
+#
+# dedup_table() marks a G0 or G1 row to drop when it has the same rounded
+# X, Y and Z as the last row that is kept, the same F and S as the row
+# before and no other words. The G-code and svg consumers skip the marked
+# rows. Comparing with the last kept row, not the row before, stops a run
+# of tiny moves from adding up to a real one, so the cut geometry is the
+# same to the last digit. Arcs are never dropped, an arc that ends where it
+# starts is a full circle.
+
+def quantize_table(table):
+    n = len(table)
+    # a table that carries on from another one can drop its first row too
+    carried = table.position0 != FIRST_MOVE
+    if n < (1 if carried else 2):
+        return 0
+    unit = LENGTH_UNITS[UNIT_FORMAT]
+    precision_string = "." + str(PRECISION) + "f"
+    # values this far apart or more never round to the same text
+    q = 10.0 ** -PRECISION * unit
+
+    def same(a, b):
+        return (abs(a - b) < q and
+                format(float(a / unit), precision_string) == format(float(b / unit), precision_string))
+
+    moves = tuple(k == OP_RAPID or k == OP_LINE for k in table.kinds)
+    op = table.op
+    x, y, z, f, s = table.x, table.y, table.z, table.f, table.s
+    extra = table.extra
+    drop = bytearray(n)
+    dropped = 0
+    kx, ky, kz = table.position0 if carried else (x[0], y[0], z[0])
+    for r in range(0 if carried else 1, n):
+        f0, s0 = (f[r-1], s[r-1]) if r else (table.feed0, table.speed0)
+        if (moves[op[r]] and f[r] == f0 and s[r] == s0 and r not in extra and
+                same(x[r], kx) and same(y[r], ky) and same(z[r], kz)):
+            drop[r] = 1
+            dropped += 1
+        else:
+            kx, ky, kz = x[r], y[r], z[r]
+    table.drop = drop if dropped else bytearray()
+    table.dropped = dropped
+    return dropped
+
+
+# quantize the table when values["DEDUP"] is on
+def dedup_table(values, table):
+    if not values.get("DEDUP", False):
+        return 0
+    with xt.phase('dedup'):
+        dropped = quantize_table(table)
+    log(f'dedup: dropped {dropped} of {len(table)} commands')
+    return dropped
+
+
+# G-code consumer
+def table_gcode(values, table):
+    OUTPUT_COMMENTS = values["OUTPUT_COMMENTS"]
+    OUTPUT_DOUBLES = values["OUTPUT_DOUBLES"]
+    MODAL = values["MODAL"]
+    AXIS_PRECISION = values["AXIS_PRECISION"]
+    COMMAND_SPACE = values["COMMAND_SPACE"]
+    OUTPUT_LINE_NUMBERS = values["OUTPUT_LINE_NUMBERS"]
+
+    out = ""
+    lastcommand = None
+    precision_string = "." + str(AXIS_PRECISION) + "f"
+
+    # the order of parameters
+    params = values["PARAMETER_ORDER"]
+
+    currLocation = {}  # keep track for no doubles
+    currLocation.update({"X": -1, "Y": -1, "Z": -1, "F": 0.0})
+
+    drop = table.drop
+    for r in range(len(table)):
+        if drop and drop[r]:
+            continue
+        command = table.name(r)
+        kind = table.kind(r)
+
+        outstring = []
+        outstring.append(command)
+
+        # if modal: suppress the command if it is the same as the last one
+        if MODAL is True:
+            if command == lastcommand:
+                outstring.pop(0)
+
+        if kind == OP_COMMENT and not OUTPUT_COMMENTS:
+            continue
+
+        cparams = table.params(r)
+
+        # Now add the remaining parameters in order
+        for param in params:
+            if param in cparams:
+                if param == "F":
+                    feed_rate = cparams["F"]
+                    if feed_rate > 0.0:
+                        outstring.append(
+                            param + format(float(feed_rate), precision_string)
+                        )
+                elif param in ("T", "H", "D", "S"):
+                    outstring.append(param + str(int(cparams[param])))
+                else:
+                    if (
+                        (not OUTPUT_DOUBLES)
+                        and (param in currLocation)
+                        and (currLocation[param] == cparams[param])
+                    ):
+                        continue
+                    else:
+                        # X20.123
+                        # Y12.567
+                        outstring.append(param + fculps(cparams[param], param))
+
+        arc_segs = []
+        if kind == OP_ARC:
+            p1 = table.start(r)
+            p2 = (table.x[r], table.y[r])
+            arc_segs = gcode_arc(command, p1, p2, (p1[0] + table.i[r], p1[1] + table.j[r]))
+            outstring = []
+
+        # store the latest command
+        lastcommand = command
+        currLocation.update(cparams)
+
+        if command == "message":
+            if OUTPUT_COMMENTS is False:
+                outstring = []
+            else:
+                outstring.pop(0)  # remove the command
+
+        # prepend a line number and append a newline
+        if len(outstring) >= 1:
+            if OUTPUT_LINE_NUMBERS:
+                outstring.insert(0, (linenumber(values)))
+
+            # append the line to the final output
+            for w in outstring:
+                out += w + COMMAND_SPACE
+            # Note: Do *not* strip `out`, since that forces the allocation
+            # of a contiguous string & thus quadratic complexity.
+            out += "\n"
+
+        if len(arc_segs) > 0:
+            for w in arc_segs:
+                out += linenumber(values) + w + "\n"
+
+    return out
+
+
+# A cut path in the table: rows first..last-1, the feed moves among them
+# are drawn. Starts at the position before row first.
+class TablePath:
+    __slots__ = ('first', 'last', 'feed', 'power')
+
+    def __init__(self, first, last, feed, power):
+        self.first = first
+        self.last = last
+        self.feed = feed
+        self.power = power
+
+
+# Path consumer. Splits the table into cut paths.
+#
+# A path starts on a feed move that steps Z down. It finishes when Z goes
+# up or when the feed or power changes. After a feed or power change the
+# cut carries on in a new path.
+def table_paths(table):
+    paths = list()
+
+    svg_feed = table.feed0
+    svg_power = table.speed0
+    start_path = False
+    pathing = False
+    first = 0
+    drop = table.drop
+    z1 = table.position0[2]
+
+    for r in range(len(table)):
+        if drop and drop[r]:
+            continue
+        # Z of the last row kept
+        z0 = z1
+        z1 = table.z[r]
+        kind = table.kind(r)
+        if kind == OP_COMMENT:
+            continue
+
+        feed = table.f[r]
+        power = table.s[r]
+        feed_move = kind == OP_LINE or kind == OP_ARC
+
+        finish_path = False
+        resume_path = False
+        if power != svg_power or feed != svg_feed:
+            if pathing:
+                log("speed or feed change: power=" + str(power) + " feed=" +  str(feed))
+                finish_path = True
+                # still cutting, carry on in a new path with the new settings
+                resume_path = feed_move
+
+        if z1 > z0:
+            if pathing:
+                log("Z up")
+                finish_path = True
+                resume_path = False
+
+        if z1 < z0 and feed_move:
+            if not pathing:
+                start_path = True
+
+        if pathing and finish_path:
+            paths.append(TablePath(first, r, svg_feed, svg_power))
+            svg_feed = feed
+            svg_power = power
+            log("finish path, power = " + str(svg_power))
+            pathing = False
+            start_path = resume_path
+
+        if start_path:
+            log("start path: power=" + str(power) + " feed=" +  str(feed))
+            start_path = False
+            pathing = True
+            first = r
+            svg_feed = feed
+            svg_power = power
+
+    if pathing:
+        paths.append(TablePath(first, len(table), svg_feed, svg_power))
+
+    return paths
+
+
+# svg consumer, the svg path string of a TablePath
+#
+# With arc_tolerance > 0 runs of lines that follow a circle become svg
+# arcs, see svg_fit().
+def path_svg(table, path, arc_tolerance=0.0):
+    svg = svg_move(table.start(path.first))
+    run = None
+    drop = table.drop
+    for r in range(path.first, path.last):
+        if drop and drop[r]:
+            continue
+        kind = table.kind(r)
+        if kind == OP_LINE and arc_tolerance > 0:
+            if run is None:
+                run = [table.start(r)]
+            run.append((table.x[r], table.y[r]))
+            continue
+        if run is not None:
+            svg += svg_fit(run, arc_tolerance)
+            run = None
+        if kind == OP_LINE:
+            svg += svg_line(table.start(r), (table.x[r], table.y[r]))
+        elif kind == OP_ARC:
+            p1 = table.start(r)
+            svg += svg_arc(table.name(r), p1, (table.x[r], table.y[r]),
+                           (p1[0] + table.i[r], p1[1] + table.j[r]))
+    if run is not None:
+        svg += svg_fit(run, arc_tolerance)
+    return svg
+
+
+# -------------------------------------------------------------------------
+# Arc fitting
+#
+# Tessellated or digitized curves come in as long runs of short lines.
+# svg_fit() replaces the parts of a run that follow a circle with svg arcs.
+# Greedy: from each point the arc is grown for as long as it fits. It
+# doubles until it does not fit and then halves the gap back to the longest
+# one that does, so an arc of m lines is checked about log m times, not m.
+#
+# An arc fits when
+#   - every point is within tol of the circle
+#   - every line is within tol of the circle, its sagitta
+#   - the points go around the center one way, less than ARC_FIT_SWEEP
+
+# fewest lines worth replacing, one A is about as long as two L
+ARC_FIT_MIN = 3
+# most lines in one arc, bounds the work per arc
+ARC_FIT_MAX = 256
+ARC_FIT_SWEEP = 1.5 * math.pi
+
+
+# center of the circle through three points, None if they are on a line
+def circle_center(p1, p2, p3):
+    ax = p2[0] - p1[0]
+    ay = p2[1] - p1[1]
+    bx = p3[0] - p1[0]
+    by = p3[1] - p1[1]
+    d = 2.0 * (ax * by - ay * bx)
+    if abs(d) < 1e-12 * (ax * ax + ay * ay + bx * bx + by * by):
+        return None
+    a2 = ax * ax + ay * ay
+    b2 = bx * bx + by * by
+    return (p1[0] + (by * a2 - ay * b2) / d, p1[1] + (ax * b2 - bx * a2) / d)
+
+
+# (center, name) of an arc from pts[a] to pts[b] through the points
+# between them, None if they do not fit one
+def fit_arc(pts, a, b, tol):
+    c = circle_center(pts[a], pts[(a + b) // 2], pts[b])
+    if c is None:
+        return None
+    cx, cy = c
+    rad = math.hypot(pts[a][0] - cx, pts[a][1] - cy)
+
+    ccw = None
+    sweep = 0.0
+    a1 = math.atan2(pts[a][1] - cy, pts[a][0] - cx)
+    for k in range(a + 1, b + 1):
+        px, py = pts[k]
+        if abs(math.hypot(px - cx, py - cy) - rad) > tol:
+            return None
+        a2 = math.atan2(py - cy, px - cx)
+        d = a2 - a1
+        if d > math.pi:
+            d -= 2 * math.pi
+        elif d <= -math.pi:
+            d += 2 * math.pi
+        if d == 0.0:
+            return None
+        if ccw is None:
+            ccw = d > 0
+        elif ccw != (d > 0):
+            return None
+        if rad * (1.0 - math.cos(d / 2)) > tol:
+            return None
+        sweep += abs(d)
+        if sweep > ARC_FIT_SWEEP:
+            return None
+        a1 = a2
+
+    return c, ("G3" if ccw else "G2")
+
+
+# svg path string for a run of lines through pts, arcs where they fit
+def svg_fit(pts, tol):
+    svg = ""
+    n = len(pts)
+    a = 0
+    while a < n - 1:
+        best = None
+        last = min(n - 1, a + ARC_FIT_MAX)
+        bad = last + 1
+        size = ARC_FIT_MIN
+        while a + size <= last:
+            arc = fit_arc(pts, a, a + size, tol)
+            if arc is None:
+                bad = a + size
+                break
+            best = (a + size, ) + arc
+            if a + size == last:
+                break
+            size = min(size * 2, last - a)
+        while best is not None and bad - best[0] > 1:
+            b = (best[0] + bad) // 2
+            arc = fit_arc(pts, a, b, tol)
+            if arc is None:
+                bad = b
+            else:
+                best = (b, ) + arc
+
+        if best is None:
+            svg += svg_line(pts[a], pts[a + 1])
+            a += 1
+        else:
+            b, c, name = best
+            svg += svg_arc(name, pts[a], pts[b], c)
+            a = b
+    return svg
+
+
+# bounds consumer, svg coordinates (y down) of the cuts in a TablePath
+def path_bound(table, path, bound=None):
+    if bound is None:
+        bound = Bound()
+    drop = table.drop
+    for r in range(path.first, path.last):
+        if drop and drop[r]:
+            continue
+        kind = table.kind(r)
+        if kind == OP_LINE:
+            p1 = table.start(r)
+            bound.add(p1[0], -p1[1])
+            bound.add(table.x[r], -table.y[r])
+        elif kind == OP_ARC:
+            p1 = table.start(r)
+            arc_bound(table.name(r), p1, (table.x[r], table.y[r]),
+                      (p1[0] + table.i[r], p1[1] + table.j[r]), bound)
+    return bound
+
+
+# cut length of a TablePath, mm
+def path_length(table, path):
+    length = 0.0
+    drop = table.drop
+    for r in range(path.first, path.last):
+        if drop and drop[r]:
+            continue
+        kind = table.kind(r)
+        if kind == OP_LINE:
+            p1 = table.start(r)
+            length += math.hypot(table.x[r] - p1[0], table.y[r] - p1[1])
+        elif kind == OP_ARC:
+            p1 = table.start(r)
+            length += arc_length(table.name(r), p1, (table.x[r], table.y[r]),
+                                 (p1[0] + table.i[r], p1[1] + table.j[r]))
+    return length
+
+
+def arc_length(name, p1, p2, c):
+    rad = math.hypot(p1[0] - c[0], p1[1] - c[1])
+    a1 = math.atan2(p1[1] - c[1], p1[0] - c[0])
+    a2 = math.atan2(p2[1] - c[1], p2[0] - c[0])
+    tarc = a2 - a1
+    if name in CCW_MOVES:
+        if tarc <= 0:
+            tarc += 2 * math.pi
+    else:
+        if tarc >= 0:
+            tarc -= 2 * math.pi
+    return rad * abs(tarc)
+
+
+# statistics consumer
+#
+# Counts and xy lengths of the moves. The first move starts from an
+# unknown place, its length is not counted.
+def table_stats(table):
+    st = dict(commands = len(table), rapids = 0, lines = 0, arcs = 0,
+              comments = 0, others = 0, cut_length = 0.0, travel_length = 0.0,
+              dropped = table.dropped)
+
+    for r in range(len(table)):
+        kind = table.kind(r)
+        if kind == OP_RAPID:
+            st['rapids'] += 1
+            if r > 0:
+                st['travel_length'] += math.hypot(table.x[r] - table.x[r-1],
+                                                  table.y[r] - table.y[r-1])
+        elif kind == OP_LINE:
+            st['lines'] += 1
+            if r > 0:
+                st['cut_length'] += math.hypot(table.x[r] - table.x[r-1],
+                                               table.y[r] - table.y[r-1])
+        elif kind == OP_ARC:
+            st['arcs'] += 1
+            p1 = table.start(r)
+            st['cut_length'] += arc_length(table.name(r), p1, (table.x[r], table.y[r]),
+                                           (p1[0] + table.i[r], p1[1] + table.j[r]))
+        elif kind == OP_COMMENT:
+            st['comments'] += 1
+        else:
+            st['others'] += 1
+
+    return st
+
+
+# -------------------------------------------------------------------------
+# Path ordering
+#
+# Jobs with many small holes and pockets spend most of their time in
+# rapid travel. order_commands() cuts the commands of an operation into
+# blocks and puts them in the order that needs the least travel:
+# nearest block first, but a block that lies inside another one is cut
+# before it, so parts do not drop out before their holes are cut.
+#
+# A block starts with a rapid that moves X or Y and runs up to the next
+# one. Blocks that do not cut go with the block after them, the ones at
+# the end stay at the end. Each block is made to stand on its own: its
+# first rapid gets both X and Y and its first feed move gets the F and S
+# it had in the original order.
+#
+# feed and speed are the F and S in force before the commands, as the
+# commands give them. A block that cuts at them without an F or S of its
+# own gets them, so it still does after it is moved.
+#
+# Blocks with the same bounding box, like the passes of a profile, keep
+# their order.
+#
+# Both passes of order_blocks() look up blocks in a grid of about one
+# cell per block, not in all of them: the boxes a block may lie inside are
+# the ones over the cell of its corner, and the nearest start is found in
+# rings of cells around the current position.
+
+class PathBlock:
+    __slots__ = ('index', 'commands', 'start', 'end', 'bound')
+
+    def __init__(self, index, commands, start, end, bound):
+        self.index = index
+        self.commands = commands
+        self.start = start
+        self.end = end
+        self.bound = bound
+
+
+# (head, blocks, tail) lists of the commands
+def command_blocks(commands, feed=None, speed=None):
+    head = list()
+    blocks = list()
+    pending = list()
+    x, y = 0.0, 0.0
+    cur = None
+
+    def finish(cur):
+        if cur is None:
+            return
+        cmds, start, bound = cur
+        blocks.append(PathBlock(len(blocks), cmds, start, (x, y), bound))
+
+    for name, params in commands:
+        if name in RAPID_MOVES and ('X' in params or 'Y' in params):
+            params = dict(params)
+            params.setdefault('X', x)
+            params.setdefault('Y', y)
+            # a new block, the cuts come later
+            if cur is not None and cur[1] is not None:
+                finish(cur)
+                cur = None
+            if cur is not None:
+                pending += cur[0]
+            cur = [pending + [(name, params)], None, None]
+            pending = list()
+        else:
+            if name in FEED_MOVES and cur is not None and cur[1] is None:
+                # first cut of the block, make it stand on its own
+                params = dict(params)
+                if 'F' not in params and feed is not None:
+                    params['F'] = feed
+                if 'S' not in params and speed is not None:
+                    params['S'] = speed
+                cur[1] = (x, y)
+                cur[2] = Bound()
+            if cur is None:
+                if blocks:
+                    pending.append((name, params))
+                else:
+                    head.append((name, params))
+            else:
+                cur[0].append((name, params))
+
+        x0, y0 = x, y
+        x = params.get('X', x)
+        y = params.get('Y', y)
+        if 'F' in params:
+            feed = params['F']
+        if 'S' in params:
+            speed = params['S']
+        if name in FEED_MOVES and cur is not None and cur[2] is not None:
+            cur[2].add(x0, y0)
+            cur[2].add(x, y)
+            if name in ARC_MOVES:
+                # whole circle, good enough for containment
+                cx = x0 + params.get('I', 0.0)
+                cy = y0 + params.get('J', 0.0)
+                r = math.hypot(x0 - cx, y0 - cy)
+                cur[2].add(cx - r, cy - r)
+                cur[2].add(cx + r, cy + r)
+
+    if cur is not None and cur[1] is not None:
+        finish(cur)
+        cur = None
+    tail = pending + (cur[0] if cur is not None else [])
+    if not blocks:
+        return head + tail, list(), list()
+    return head, blocks, tail
+
+
+def _inside(a, b):
+    return (b.xmin <= a.xmin and a.xmax <= b.xmax and
+            b.ymin <= a.ymin and a.ymax <= b.ymax)
+
+
+# n x n cells over xmin..xmax, ymin..ymax
+class _Grid:
+    def __init__(self, xmin, ymin, xmax, ymax, n):
+        self.n = n
+        self.x0 = xmin
+        self.y0 = ymin
+        self.w = (xmax - xmin) / n or 1.0
+        self.h = (ymax - ymin) / n or 1.0
+        self.cells = dict()
+
+    def col(self, x):
+        return min(max(int((x - self.x0) / self.w), 0), self.n - 1)
+
+    def row(self, y):
+        return min(max(int((y - self.y0) / self.h), 0), self.n - 1)
+
+
+# after[a], the blocks a lies inside, and before[b], how many lie inside b
+def block_containment(blocks):
+    n = len(blocks)
+    before = [0] * n
+    after = [list() for k in range(n)]
+    grid = _Grid(min(b.bound.xmin for b in blocks), min(b.bound.ymin for b in blocks),
+                 max(b.bound.xmax for b in blocks), max(b.bound.ymax for b in blocks),
+                 max(1, int(math.sqrt(n))))
+    # boxes over more cells than this are checked against every block
+    most = 4 * grid.n
+    big = list()
+    for b in blocks:
+        c0, c1 = grid.col(b.bound.xmin), grid.col(b.bound.xmax)
+        r0, r1 = grid.row(b.bound.ymin), grid.row(b.bound.ymax)
+        if (c1 - c0 + 1) * (r1 - r0 + 1) > most:
+            big.append(b)
+            continue
+        for c in range(c0, c1 + 1):
+            for r in range(r0, r1 + 1):
+                grid.cells.setdefault((c, r), list()).append(b)
+
+    for a in blocks:
+        cell = grid.cells.get((grid.col(a.bound.xmin), grid.row(a.bound.ymin)), ())
+        for b in itertools.chain(cell, big):
+            if a is b or not _inside(a.bound, b.bound):
+                continue
+            # a inside b, or the same box and a came first
+            if not _inside(b.bound, a.bound) or a.index < b.index:
+                before[b.index] += 1
+                after[a.index].append(b.index)
+    return before, after
+
+
+# blocks in cut order, starting from x, y
+def order_blocks(blocks, x=0.0, y=0.0):
+    n = len(blocks)
+    if n == 0:
+        return list()
+    before, after = block_containment(blocks)
+
+    # the starts of the blocks that are ready, by cell
+    grid = _Grid(min(b.start[0] for b in blocks), min(b.start[1] for b in blocks),
+                 max(b.start[0] for b in blocks), max(b.start[1] for b in blocks),
+                 max(1, int(math.sqrt(n))))
+    step = min(grid.w, grid.h)
+    cells = grid.cells
+    cell_of = [(grid.col(b.start[0]), grid.row(b.start[1])) for b in blocks]
+
+    def add(k):
+        cells.setdefault(cell_of[k], set()).add(k)
+
+    def nearest(x, y):
+        best = None
+
+        def look(ks):
+            nonlocal best
+            for k in ks:
+                b = blocks[k]
+                d = math.hypot(b.start[0] - x, b.start[1] - y)
+                if best is None or d < best[0] or (d == best[0] and k < best[1]):
+                    best = (d, k)
+
+        if ready <= 64:
+            for ks in cells.values():
+                look(ks)
+            return best[1]
+        c, r = grid.col(x), grid.row(y)
+        for ring in range(grid.n + 1):
+            edge = [(i, j) for i in range(c - ring, c + ring + 1) for j in {r - ring, r + ring}]
+            edge += [(i, j) for i in {c - ring, c + ring} for j in range(r - ring + 1, r + ring)]
+            for ij in edge:
+                if ij in cells:
+                    look(cells[ij])
+            # starts outside the rings so far are at least ring * step away,
+            # one cell less for rounding
+            if best is not None and best[0] < (ring - 1) * step:
+                break
+        return best[1]
+
+    ready = 0
+    for k in range(n):
+        if before[k] == 0:
+            add(k)
+            ready += 1
+    order = list()
+    while ready:
+        k = nearest(x, y)
+        ks = cells[cell_of[k]]
+        ks.discard(k)
+        if not ks:
+            del cells[cell_of[k]]
+        ready -= 1
+        order.append(blocks[k])
+        x, y = blocks[k].end
+        for j in after[k]:
+            before[j] -= 1
+            if before[j] == 0:
+                add(j)
+                ready += 1
+
+    if len(order) != n:
+        # containment loop, bounds within bounds of each other. Keep the rest in order.
+        done = set(b.index for b in order)
+        order += [b for b in blocks if b.index not in done]
+    return order
+
+
+def block_travel(blocks, x=0.0, y=0.0):
+    t = 0.0
+    for b in blocks:
+        t += math.hypot(b.start[0] - x, b.start[1] - y)
+        x, y = b.end
+    return t
+
+
+# feed and speed before the commands are in values["UNIT_SPEED_FORMAT"]
+# and S, like dout['feed'] and dout['speed']
+def order_commands(values, commands, quiet=False, feed=None, speed=None):
+    if feed is not None:
+        feed = feed * VELOCITY_UNITS[values["UNIT_SPEED_FORMAT"]]
+    head, blocks, tail = command_blocks(commands, feed, speed)
+    if len(blocks) < 2:
+        return head + [c for b in blocks for c in b.commands] + tail
+
+    order = order_blocks(blocks)
+    if not quiet:
+        log(f'order: {len(blocks)} blocks, rapid travel {block_travel(blocks):.1f} mm'
+        f' -> {block_travel(order):.1f} mm')
+
+    out = head
+    for b in order:
+        out += b.commands
+    return out + tail
+
+
+def parse_commands(values, dout, commands, position=FIRST_MOVE):
+    # commands is an iterable of (name, parameters) tuples, position is
+    # where they start from, see CommandTable
+
+    log('---------- parse ------------ feed=' + str(dout['feed']) + ' speed=' + str(dout['speed']))
+
+    if values.get("ORDER_PATHS", False):
+        with xt.phase('order paths'):
+            commands = order_commands(values, commands, feed=dout['feed'], speed=dout['speed'])
+
+    with xt.phase('command table'):
+        table = CommandTable(values, dout['feed'], dout['speed'], position).extend(commands)
+    dedup_table(values, table)
+
+    # svg only callers like gcode2xcs skip the gcode text
+    if values.get("OUTPUT_GCODE", True):
+        with xt.phase('gcode'):
+            dout['gcode'] = dout['gcode'] + table_gcode(values, table)
+
+    svgps, bound = table_svgps(values, table)
+    dout['svgps'] += svgps
+    dout['glob_bound'].merge(bound)
+
+    dout['feed'] = table.feed()
+    dout['speed'] = table.speed()
+    return dout
+
+
+# Commands in lists of about size, so a long program never is in memory
+# as a whole. Yields (position, commands), position is where the list
+# starts from, for parse_commands().
+#
+# A list is only cut after a command that takes Z up. No cut path is open
+# there, so the paths are the same as from one table of all the commands.
+# A program that never lifts Z comes in one list.
+def command_chunks(commands, size):
+    position = FIRST_MOVE
+    x, y, z = position
+    chunk = list()
+    for name, params in commands:
+        chunk.append((name, params))
+        z0 = z
+        if 'X' in params:
+            x = params['X']
+        if 'Y' in params:
+            y = params['Y']
+        if 'Z' in params:
+            z = params['Z']
+        if z > z0 and len(chunk) >= size:
+            yield position, chunk
+            position = (x, y, z)
+            chunk = list()
+    if chunk or position == FIRST_MOVE:
+        yield position, chunk
+
+
+# svg consumer of a whole table, its svg path records and their bounds
+def table_svgps(values, table):
+    dout = new_dout()
+    arc_tolerance = values.get("SVG_ARC_TOLERANCE", 0.0)
+    with xt.phase('split paths'):
+        paths = table_paths(table)
+    for p in paths:
+        with xt.phase('svg'):
+            svg = path_svg(table, p, arc_tolerance)
+        with xt.phase('bounds'):
+            bound = path_bound(table, p)
+            length = path_length(table, p)
+        svg_finish_path(dout, svg, p.feed, p.power, bound, length)
+    return dout['svgps'], dout['glob_bound']
+
+
+# segs of an operation in cut order with values["ORDER_PATHS"], so the
+# tasks of a post are ordered once. feed and speed are the ones before
+# the operation, see carry_state(). The values that go with them turn the
+# ordering off.
+def order_segments(values, segs, feed=None, speed=None):
+    if not values.get("ORDER_PATHS", False):
+        return values, segs
+    with xt.phase('order paths'):
+        ordered = list()
+        for seg in segs:
+            ordered.append(order_commands(values, seg, feed=feed, speed=speed))
+            feed, speed = carry_state(values, [seg], feed, speed)
+        segs = ordered
+    values = dict(values)
+    values["ORDER_PATHS"] = False
+    return values, segs
+
+
+# feed and speed after running through the commands, same as
+# parse_commands(). With values["ORDER_PATHS"] the segs are in cut order
+# already, see order_segments().
+def carry_state(values, segs, feed, speed):
+    for seg in segs:
+        for name, params in seg:
+            if "F" in params:
+                feed = feed_value(params["F"], values["UNIT_SPEED_FORMAT"])
+            if "S" in params:
+                speed = int(params["S"])
+    return feed, speed
+
+
+# Process pool entry point. Only needs this module, not FreeCAD.
+def parse_worker(task):
+    values, segs, feed, speed = task
+
+    # workers may not have gone through init_format()
+    init_format(values)
+
+    dout = new_dout(feed, speed)
+    for seg in segs:
+        parse_commands(values, dout, seg)
+
+    return dout['gcode'], dout['svgps'], dout['feed'], dout['speed']
+
+
+# -------------------------------------------------------------------------
+# Pipeline
+#
+# parse_worker() makes the G-code and the svg of an operation one after
+# the other. pipeline_parse() takes the same tasks but only reads the
+# commands into tables. The G-code and the svg consumers of each table
+# are tasks of their own in pool, a concurrent.futures executor, so they
+# run at the same time. The results are collected in order and are the
+# same as parse_worker() gives.
+#
+# xcs_worker() is the rest of the xcs side, canvases and json, so it can
+# run while the G-code is put together.
+#
+# Threads only overlap the waiting, the python work takes turns. Worker
+# processes run at the same time but the tables are copied to them.
+
+def gcode_worker(task):
+    values, table = task
+    init_format(values)
+    return table_gcode(values, table)
+
+
+def svg_worker(task):
+    values, table = task
+    init_format(values)
+    return table_svgps(values, table)
+
+
+def pipeline_parse(pool, tasks):
+    ops = list()
+    for values, segs, feed, speed in tasks:
+        futures = list()
+        for seg in segs:
+            if values.get("ORDER_PATHS", False):
+                with xt.phase('order paths'):
+                    seg = order_commands(values, seg, feed=feed, speed=speed)
+            with xt.phase('command table'):
+                table = CommandTable(values, feed, speed).extend(seg)
+            dedup_table(values, table)
+            feed = table.feed()
+            speed = table.speed()
+            gcode = None
+            if values.get("OUTPUT_GCODE", True):
+                gcode = pool.submit(gcode_worker, (values, table))
+            futures.append((gcode, pool.submit(svg_worker, (values, table))))
+        ops.append((futures, feed, speed))
+
+    results = list()
+    for futures, feed, speed in ops:
+        gcode = ""
+        svgps = list()
+        for g, s in futures:
+            if g is not None:
+                gcode = gcode + g.result()
+            svgps += s.result()[0]
+        results.append((gcode, svgps, feed, speed))
+    return results
+
+
+# Canvases of a job and the json of the project. elements None makes them
+# from svgps, all in group. Returns the json, the first project with
+# values["SPLIT_FILES"], and the canvases if keep_canvases.
+def xcs_worker(task):
+    values, elements, svgps, glob_bound, group, keep_canvases = task
+    init_format(values)
+    if elements is None:
+        elements = [e.group(group) for e in svg_elements(svgps)]
+    canvases = job_canvases(values, elements, svgps, glob_bound)
+    if values.get("SPLIT_FILES"):
+        xcs = save_split(values["SPLIT_FILES"], canvases, values.get("XCS_VERSION"))
+    else:
+        xt.XcsCanvas.active_canvas = canvases[0]
+        xcs = xt.XcsSave('-', values.get("XCS_VERSION"))
+    return xcs, canvases if keep_canvases else None
+
+
+# One path element per svg path record
+def svg_elements(svgps):
+    elements = list()
+    for p in svgps:
+        log(p)
+
+        pa = xt.XcsPath('path').setpath(0, 0, p['svg'])
+
+        power = int(p['power']/10)
+        feed = int(p['feed']/60)
+
+        pa.add_process('VECTOR_CUTTING', power, feed, 1)
+        elements.append(pa)
+    return elements
+
+
+# svg paths are placed relative to the upper left of their bounding box.
+# This puts the group bounding box at 0,0 (upper left)
+def place_elements(elements, svgps, glob_bound):
+    for pa, p in zip(elements, svgps):
+        pa.place(-glob_bound.xmin + p['xmin'], -glob_bound.ymin + p['ymin'])
+
+
+# Builds a canvas with one path element per svg path record.
+def svg_canvas(svgps, glob_bound, group):
+    canvas = xt.XcsCanvas();
+
+    elements = svg_elements(svgps)
+    place_elements(elements, svgps, glob_bound)
+    for pa in elements:
+        canvas.add_element(pa.group(group));
+
+    return canvas
+
+
+# Like svg_canvas(), split into as many canvases as the limits need,
+# see split_elements(). All of them are placed on the same global bounds.
+def svg_canvases(svgps, glob_bound, group, max_elements=0, max_length=0.0, max_bytes=0):
+    elements = svg_elements(svgps)
+    place_elements(elements, svgps, glob_bound)
+    canvases = list()
+    for part in split_elements(elements, svgps, max_elements, max_length, max_bytes):
+        canvas = xt.XcsCanvas()
+        for pa in part:
+            canvas.add_element(pa.group(group))
+        canvases.append(canvas)
+    return canvases
+
+
+# The canvases of the elements of a job, placed on glob_bound and split
+# by the limits in values
+def job_canvases(values, elements, svgps, glob_bound):
+    with xt.phase("canvas"):
+        xt.XcsCanvas.canvi = list()
+        place_elements(elements, svgps, glob_bound)
+        canvases = list()
+        for part in split_elements(elements, svgps, **split_limits(values)):
+            canvas = xt.XcsCanvas()
+            for e in part:
+                canvas.add_element(e)
+            canvases.append(canvas)
+    if len(canvases) > 1:
+        print(f"split: {len(elements)} elements on {len(canvases)} canvases")
+    return canvases
+
+
+# Saves each canvas as a project of its own, name_1.xcs, name_2.xcs ...
+# and returns the json of the first one.
+def save_split(name, canvases, version=None):
+    base = os.path.splitext(name)[0] if name.endswith(".xcs") else name
+    first = None
+    for n, canvas in enumerate(canvases, 1):
+        xt.XcsCanvas.canvi = [canvas]
+        xt.XcsCanvas.active_canvas = canvas
+        xcs = xt.XcsSave('-', version)
+        fn = f"{base}_{n}.xcs"
+        with open(fn, "w") as f:
+            f.write(xcs)
+        print(f"split: canvas {n} of {len(canvases)}, {len(canvas.elements)} elements, saved to {fn}")
+        if first is None:
+            first = xcs
+    xt.XcsCanvas.canvi = canvases
+    xt.XcsCanvas.active_canvas = canvases[0]
+    return first
+
+
+# bytes an element adds to the saved project, itself and its process
+def element_bytes(e):
+    enc = xt.encoder()
+    n = len(enc.element(e))
+    if hasattr(e, 'process'):
+        n += len(enc.process(e))
+    return n
+
+
+# Splits the elements of a job into canvases, a list of element lists in
+# job order. A canvas is full when the next element would take it over
+# max_elements elements, max_length mm of cut (the 'length' of the svg
+# path records) or about max_bytes of json. 0 is no limit. An element
+# that is over a limit on its own still gets a canvas.
+#
+# Placing the elements is done before, so the parts of a job stay where
+# they are relative to each other, whatever canvas they end up on.
+#
+# The rows of xt.XcsColumns blocks in columns come after the elements and
+# count the same way. A block is cut where a canvas is full, the parts
+# then hold pieces of it, see XcsColumns.take(), for add_columns().
+def split_elements(elements, svgps, max_elements=0, max_length=0.0, max_bytes=0, columns=()):
+    if not (max_elements or max_length or max_bytes):
+        return [list(elements) + list(columns)]
+
+    parts = list()
+    part = list()
+    count = 0
+    length = 0.0
+    nbytes = 0
+    for e, p in zip(elements, svgps):
+        elength = p.get('length', 0.0)
+        ebytes = element_bytes(e) if max_bytes else 0
+        if part and ((max_elements and count + 1 > max_elements)
+                     or (max_length and length + elength > max_length)
+                     or (max_bytes and nbytes + ebytes > max_bytes)):
+            parts.append(part)
+            part = list()
+            count = 0
+            length = 0.0
+            nbytes = 0
+        part.append(e)
+        count += 1
+        length += elength
+        nbytes += ebytes
+
+    if columns:
+        import numpy as np
+    for cols in columns:
+        # running totals of the rows, searched for where a canvas is full
+        lengths = np.cumsum(column_lengths(cols)) if max_length else None
+        sizes = np.cumsum(column_bytes(cols)) if max_bytes else None
+        start = 0
+        while start < len(cols):
+            stop = len(cols)
+            if max_elements:
+                stop = min(stop, start + max_elements - count)
+            for total, used, most in ((lengths, length, max_length), (sizes, nbytes, max_bytes)):
+                if most:
+                    before = total[start - 1] if start else 0
+                    stop = min(stop, start + int(np.searchsorted(total[start:], before + most - used, 'right')))
+            if stop <= start:
+                if part:
+                    parts.append(part)
+                    part = list()
+                    count = 0
+                    length = 0.0
+                    nbytes = 0
+                    continue
+                # a row over a limit on its own
+                stop = start + 1
+            part.append(cols.take(start, stop) if (start, stop) != (0, len(cols)) else cols)
+            count += stop - start
+            if max_length:
+                length += float(lengths[stop - 1] - (lengths[start - 1] if start else 0))
+            if max_bytes:
+                nbytes += int(sizes[stop - 1] - (sizes[start - 1] if start else 0))
+            start = stop
+    parts.append(part)
+    return parts
+
+
+# cut length of each row of a column block, mm
+def column_lengths(cols):
+    import numpy as np
+    w = np.frombuffer(cols.width)
+    h = np.frombuffer(cols.height)
+    if cols.cls is xt.XcsCircle:
+        # Ramanujan's ellipse perimeter
+        a = w / 2
+        b = h / 2
+        return math.pi * (3 * (a + b) - np.sqrt((3 * a + b) * (a + 3 * b)))
+    return 2 * (w + h)
+
+
+# bytes each row of a column block adds to the saved project, like
+# element_bytes()
+def column_bytes(cols):
+    import numpy as np
+    enc = xt.encoder()
+    n = np.fromiter((len(t) for chunk in enc.columns(cols) for t in chunk), dtype=np.int64, count=len(cols))
+    procs = np.frombuffer(cols.proc, dtype=np.int32) >= 0
+    n[procs] += np.fromiter(map(len, enc.column_processes(cols)), dtype=np.int64, count=int(procs.sum()))
+    return n
+
+
+# keyword arguments of split_elements() from the post values
+def split_limits(values):
+    return dict(max_elements = values.get("SPLIT_ELEMENTS", 0),
+                max_length = values.get("SPLIT_LENGTH", 0.0),
+                max_bytes = values.get("SPLIT_BYTES", 0))
+
+
+# Values normally set up by the FreeCAD post processor argument code
+# and UtilsXTool.init_xtool_values(). Enough to run parse_commands().
+def default_values():
+    return {
+        "OUTPUT_COMMENTS" : True,
+        "OUTPUT_HEADER" : True,
+        "OUTPUT_LINE_NUMBERS" : False,
+        "OUTPUT_DOUBLES" : True,
+        "MODAL" : False,
+        "COMMAND_SPACE" : " ",
+        "AXIS_PRECISION" : 3,
+        "UNITS" : "G21",
+        "UNIT_FORMAT" : "mm",
+        "UNIT_SPEED_FORMAT" : "mm/min",
+        "LINENR" : 100,
+        "PARAMETER_ORDER" : ["X", "Y", "Z", "A", "B", "C", "I", "J", "F", "S",
+                             "T", "Q", "R", "L", "H", "D", "P"],
+    }
+
+
+# A pocket like job: squares with round corners, stepping down in Z
+def square_commands(x, y, size, passes, feed, power):
+    r = size / 4
+    s = size
+    cmds = [('G0', {'Z' : 5.0}), ('G0', {'X' : x + r, 'Y' : y})]
+    for n in range(passes):
+        z = -1.0 - n
+        cmds += [
+            ('G1', {'Z' : z, 'F' : feed}),
+            ('G1', {'X' : x + s - r, 'Y' : y, 'S' : power}),
+            ('G3', {'X' : x + s, 'Y' : y + r, 'I' : 0.0, 'J' : r}),
+            ('G1', {'X' : x + s, 'Y' : y + s - r}),
+            ('G3', {'X' : x + s - r, 'Y' : y + s, 'I' : -r, 'J' : 0.0}),
+            ('G1', {'X' : x + r, 'Y' : y + s}),
+            ('G3', {'X' : x, 'Y' : y + s - r, 'I' : 0.0, 'J' : -r}),
+            ('G1', {'X' : x, 'Y' : y + r}),
+            ('G3', {'X' : x + r, 'Y' : y, 'I' : r, 'J' : 0.0}),
+        ]
+    cmds.append(('G0', {'Z' : 5.0}))
+    return cmds
+
+
+def main():
+    global VERBOSE
+    VERBOSE = False
+
+    values = default_values()
+    init_format(values)
+
+    cmds = list()
+    for i in range(20):
+        for j in range(20):
+            cmds += square_commands(i * 12, j * 12, 10, 3, 10, 500)
+
+    t0 = time.perf_counter()
+    dout = parse_commands(values, new_dout(), cmds)
+    t = time.perf_counter() - t0
+
+    print(f'{len(cmds)} commands in {t:.3f} s, {len(cmds) / t:.0f} commands/s')
+    print(f'{len(dout["gcode"])} bytes of gcode, {len(dout["svgps"])} svg paths')
+
+    st = table_stats(CommandTable(values).extend(cmds))
+    print(f'cut {st["cut_length"]:.1f} mm, travel {st["travel_length"]:.1f} mm')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,699 @@
+#!python3
+# ***************************************************************************
+# *   Copyright (c) 2024 whodafloater
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# **************************************************************************
+#
+# xtool_transform.py
+#
+# Moves, scales, rotates and mirrors many canvas elements at once with
+# one affine matrix.
+#
+#    parts = xf.select(canvas, 'part 1')
+#    m = xf.rotation(90, *xf.center(xf.bounds(parts)))
+#    xf.transform(parts, xf.compose(m, xf.translation(50, 0)))
+#
+# A matrix is a tuple (a, b, c, d, e, f) like the svg matrix():
+#
+#    x' = a * x + c * y + e
+#    y' = b * x + d * y + f
+#
+# in canvas coordinates, mm with y down. Positive angles turn clockwise
+# on the canvas.
+#
+# How the elements change:
+# - PEN and PATH keep the shape in their points and dPath and are placed
+#   by the upper left of their bounding box, see
+#   xtool_estimate.element_polylines(). The numbers of a dPath go through
+#   the turn, scale and skew of the matrix, the move is in x and y. The
+#   points of a PEN go through all of it. x, y, width and height are set
+#   from the new bounding box.
+# - LINE moves its start and end point.
+# - RECT, CIRCLE, BITMAP and TEXT move their center and change size and
+#   angle. They can turn and scale but not skew, the matrix must keep
+#   their corners square. RECT and CIRCLE can be mirrored.
+#
+# - the rows of xt.XcsColumns blocks have no angle and stay upright, the
+#   matrix may only move, scale, mirror and turn by multiples of 90
+#   degrees. select() gives the elements of a canvas, select_rows() the
+#   rows, transform_group() and transform_canvas() change both.
+#
+# A matrix that only moves leaves the path data alone. It still sets x
+# and y of every element one by one, so it is no faster than calling
+# place() on each; doing them all at once only pays off for a turn or
+# scale. Path numbers are written with precision digits. Bounding boxes
+# of curved paths come from the lines xtool_estimate draws them with.
+#
+# Needs numpy.
+
+import math
+import operator
+import re
+
+import numpy as np
+
+import xtool_estimate
+import xtool_xcs as xt
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+# element types by how they change
+POINT_TYPES = ('PEN', 'PATH')
+BOX_TYPES = ('RECT', 'CIRCLE', 'BITMAP', 'TEXT')
+MIRROR_TYPES = ('RECT', 'CIRCLE')
+TYPES = frozenset(POINT_TYPES + BOX_TYPES + ('LINE',))
+# a move only changes their x and y
+MOVE_XY = frozenset(('PATH', 'RECT', 'CIRCLE', 'BITMAP'))
+
+_type = operator.attrgetter('type')
+
+# how close to square the corners of a RECT must stay, relative
+SQUARE_TOLERANCE = 1e-9
+
+
+# -------------------------------------------------------------------------
+# Matrices
+
+def translation(tx, ty):
+    return (1.0, 0.0, 0.0, 1.0, float(tx), float(ty))
+
+
+# scale by sx, sy about cx, cy. sy None is sx, -1 mirrors
+def scaling(sx, sy=None, cx=0.0, cy=0.0):
+    if sy is None:
+        sy = sx
+    return (float(sx), 0.0, 0.0, float(sy), cx - sx * cx, cy - sy * cy)
+
+
+# turn by deg degrees about cx, cy
+def rotation(deg, cx=0.0, cy=0.0):
+    a = math.radians(deg)
+    co = math.cos(a)
+    si = math.sin(a)
+    return (co, si, -si, co, cx - co * cx + si * cy, cy - si * cx - co * cy)
+
+
+def skewing(xdeg, ydeg=0.0):
+    return (1.0, math.tan(math.radians(ydeg)), math.tan(math.radians(xdeg)), 1.0, 0.0, 0.0)
+
+
+# one matrix that does the matrices in the order given
+def compose(*ms):
+    a, b, c, d, e, f = IDENTITY
+    for m in ms:
+        ma, mb, mc, md, me, mf = m
+        a, b, c, d, e, f = (ma * a + mc * b, mb * a + md * b,
+                            ma * c + mc * d, mb * c + md * d,
+                            ma * e + mc * f + me, mb * e + md * f + mf)
+    return (a, b, c, d, e, f)
+
+
+def apply(m, x, y):
+    a, b, c, d, e, f = m
+    return a * x + c * y + e, b * x + d * y + f
+
+
+# -------------------------------------------------------------------------
+# Selections
+
+# the elements of canvas, only those of group if given
+def select(canvas, group=None):
+    if group is None:
+        return list(canvas.elements)
+    return [e for e in canvas.elements if e.groupTag == group]
+
+
+# the rows of the column blocks of canvas, only those of group if given,
+# as (block, row index array) pairs
+def select_rows(canvas, group=None):
+    out = list()
+    for cols in canvas.columns:
+        if group is None:
+            rows = np.arange(len(cols))
+        else:
+            n = cols.group_index.get(group)
+            if n is None:
+                continue
+            rows = np.flatnonzero(np.frombuffer(cols.group, dtype=np.uint32) == n)
+        if len(rows):
+            out.append((cols, rows))
+    return out
+
+
+def transform_group(canvas, group, m, precision=3):
+    return _transform_all(select(canvas, group), select_rows(canvas, group), m, precision)
+
+
+def transform_canvas(canvas, m, precision=3):
+    return _transform_all(canvas.elements, select_rows(canvas), m, precision)
+
+
+# the elements and then the rows, nothing changes if one can not go
+# through m
+def _transform_all(elements, blocks, m, precision):
+    if blocks:
+        _upright(m)
+    elements = transform(elements, m, precision)
+    for cols, rows in blocks:
+        transform_rows(cols, rows, m)
+    return elements
+
+
+# -------------------------------------------------------------------------
+# Path data
+#
+# _parse_path() turns svg path data into a % template and its numbers.
+# Every coordinate pair, absolute or relative, goes through the linear
+# part of the matrix the same way, the move is in x and y of the element.
+# H and V become L and l, arcs get new radii and rotation. The end points
+# of the path in absolute coordinates give the bounding box of paths
+# without curves.
+
+_LETTER = {'H' : 'L', 'h' : 'l', 'V' : 'L', 'v' : 'l'}
+_PAIRS = {'M' : 1, 'L' : 1, 'T' : 1, 'C' : 3, 'S' : 2, 'Q' : 2}
+
+# path data of absolute moves and lines only, like the posts write, is
+# all coordinate pairs
+_LINES_ONLY = re.compile(r'[MLZz\d\s,.eE+-]*')
+_NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+
+class _Path:
+    __slots__ = ('template', 'nums', 'pairs', 'arcs', 'sweeps', 'ends', 'curves')
+
+
+def _parse_path(d, numf):
+    if _LINES_ONLY.fullmatch(d):
+        nums = [float(t) for t in _NUMBER.findall(d)]
+        if len(nums) % 2 == 0:
+            p = _Path()
+            p.template = _NUMBER.sub(numf, d)
+            p.nums = nums
+            p.pairs = range(0, len(nums), 2)
+            p.arcs = p.sweeps = ()
+            p.ends = list(zip(nums[0::2], nums[1::2]))
+            p.curves = False
+            return p
+
+    tokens = xtool_estimate.SVG_TOKEN.findall(d)
+    pairf = numf + ' ' + numf
+    out = list()
+    nums = list()
+    pairs = list()
+    arcs = list()
+    sweeps = list()
+    ends = list()
+    curves = False
+    x = y = sx = sy = 0.0
+    cmd = None
+    first = True
+    k = 0
+    n = len(tokens)
+
+    def num():
+        nonlocal k
+        if k >= n or tokens[k].isalpha():
+            raise ValueError(f'path data ends in the middle of a command: {d[:60]}')
+        v = float(tokens[k])
+        k += 1
+        return v
+
+    # arc flags may be run together, "a1 1 0 011 2"
+    def flag():
+        t = tokens[k] if k < n else 'x'
+        if len(t) > 1 and t[0] in '01':
+            tokens[k] = t[1:]
+            return int(t[0])
+        return int(num())
+
+    def pair(px, py):
+        pairs.append(len(nums))
+        nums.append(px)
+        nums.append(py)
+        out.append(pairf)
+
+    while k < n:
+        t = tokens[k]
+        if t.isalpha():
+            cmd = t
+            k += 1
+            out.append(_LETTER.get(cmd, cmd))
+            first = True
+            if cmd in 'Zz':
+                x, y = sx, sy
+                continue
+        elif cmd is None or cmd in 'Zz':
+            k += 1
+            continue
+        if not first:
+            out.append(' ')
+        first = False
+
+        rel = cmd.islower()
+        c = cmd.upper()
+        if c in _PAIRS:
+            if c not in 'ML':
+                curves = True
+            for i in range(_PAIRS[c]):
+                px = num()
+                py = num()
+                if i:
+                    out.append(' ')
+                pair(px, py)
+            x, y = (x + px, y + py) if rel else (px, py)
+            if c == 'M':
+                sx, sy = x, y
+                # more pairs after a moveto are linetos
+                cmd = 'l' if rel else 'L'
+        elif c == 'H':
+            v = num()
+            if rel:
+                pair(v, 0.0)
+                x += v
+            else:
+                pair(v, y)
+                x = v
+        elif c == 'V':
+            v = num()
+            if rel:
+                pair(0.0, v)
+                y += v
+            else:
+                pair(x, v)
+                y = v
+        elif c == 'A':
+            curves = True
+            arcs.append(len(nums))
+            nums.append(num())
+            nums.append(num())
+            nums.append(num())
+            nums.append(flag())
+            sweeps.append(len(nums))
+            nums.append(flag())
+            out.append(' '.join([numf] * 3) + ' %d %d ')
+            px = num()
+            py = num()
+            pair(px, py)
+            x, y = (x + px, y + py) if rel else (px, py)
+        else:
+            raise ValueError(f'unknown path command {cmd}')
+        ends.append((x, y))
+
+    p = _Path()
+    p.template = ''.join(out)
+    p.nums = nums
+    p.pairs = pairs
+    p.arcs = arcs
+    p.sweeps = sweeps
+    p.ends = ends
+    p.curves = curves
+    return p
+
+
+# (xmin, ymin, xmax, ymax) of path data, None if it draws nothing
+def _path_box(p, d):
+    if p.curves:
+        pts = [pt for poly in xtool_estimate.svg_polylines(d) for pt in poly]
+    else:
+        pts = p.ends
+    if not pts:
+        return None
+    a = np.asarray(pts, dtype=float)
+    return (*a.min(axis=0).tolist(), *a.max(axis=0).tolist())
+
+
+# New radii and rotation of svg arcs with radii rx, ry turned by phi
+# degrees after the linear part a b c d. The singular values of
+# [a c; b d] * R(phi) * diag(rx, ry) are the radii, the turn of its left
+# singular vectors the rotation.
+def _arc_params(m, rx, ry, phi):
+    a, b, c, d = m[:4]
+    t = np.radians(phi)
+    co = np.cos(t)
+    si = np.sin(t)
+    p = (a * co + c * si) * rx
+    q = (c * co - a * si) * ry
+    r = (b * co + d * si) * rx
+    s = (d * co - b * si) * ry
+    e = (p + s) / 2
+    f = (p - s) / 2
+    g = (r + q) / 2
+    h = (r - q) / 2
+    qq = np.hypot(e, h)
+    rr = np.hypot(f, g)
+    turn = (np.arctan2(h, e) + np.arctan2(g, f)) / 2
+    return qq + rr, np.abs(qq - rr), np.degrees(turn)
+
+
+# -------------------------------------------------------------------------
+# Transform
+
+def transform(elements, m, precision=3):
+    elements = list(elements)
+    a, b, c, d, e, f = m
+    types = set(map(_type, elements))
+    if not types <= TYPES:
+        raise ValueError(f'can not transform a {min(types - TYPES)}')
+
+    if (a, b, c, d) == (1.0, 0.0, 0.0, 1.0):
+        _move(elements, types, e, f)
+        return elements
+
+    for el in elements:
+        if el.type in POINT_TYPES + ('LINE',) and el.angle:
+            raise ValueError(f'{el.id}: can not turn or scale a {el.type} that has an angle')
+        if el.type == 'PEN' and el.controlPoints:
+            raise ValueError(f'{el.id}: can not turn or scale a PEN with control points')
+
+    boxes = [el for el in elements if el.type in BOX_TYPES]
+    if boxes:
+        _transform_boxes(boxes, m)
+    for el in elements:
+        if el.type == 'LINE':
+            el.x, el.y = apply(m, el.x, el.y)
+            el.p2.p.x, el.p2.p.y = apply(m, el.p2.p.x, el.p2.p.y)
+    pens = [el for el in elements if el.type == 'PEN']
+    if pens:
+        _transform_pens(pens, m)
+    paths = [el for el in elements if el.type == 'PATH']
+    if paths:
+        _transform_paths(paths, m, precision)
+    return elements
+
+
+# one pass, the types of the elements tell if any need more than x and
+# y. Python attribute writes, about as fast as a place() loop.
+def _move(elements, types, tx, ty):
+    if types <= MOVE_XY:
+        for el in elements:
+            el.x += tx
+            el.y += ty
+        return
+
+    pens = list()
+    for el in elements:
+        t = el.type
+        if t in MOVE_XY:
+            el.x += tx
+            el.y += ty
+        elif t == 'TEXT':
+            el.ox += tx
+            el.oy += ty
+        else:
+            el.x += tx
+            el.y += ty
+            if t == 'LINE':
+                el.p2.p.x += tx
+                el.p2.p.y += ty
+            elif el.points:
+                pens.append(el)
+    if pens:
+        _new_points(pens, _points(pens) + (tx, ty))
+
+
+# Rows of a column block, all of them if rows is None. The center of each
+# goes through m, width and height are scaled, or swap for a quarter turn.
+def transform_rows(cols, rows, m):
+    a, b, c, d, e, f = m
+    swap = _upright(m)
+    if rows is None:
+        rows = slice(None)
+    x = np.frombuffer(cols.x)
+    y = np.frombuffer(cols.y)
+    if (a, b, c, d) == (1.0, 0.0, 0.0, 1.0):
+        x[rows] += e
+        y[rows] += f
+        return cols
+    w = np.frombuffer(cols.width)
+    h = np.frombuffer(cols.height)
+    cx = x[rows] + w[rows] / 2
+    cy = y[rows] + h[rows] / 2
+    if swap:
+        nw, nh = abs(c) * h[rows], abs(b) * w[rows]
+    else:
+        nw, nh = abs(a) * w[rows], abs(d) * h[rows]
+    x[rows] = a * cx + c * cy + e - nw / 2
+    y[rows] = b * cx + d * cy + f - nh / 2
+    w[rows] = nw
+    h[rows] = nh
+    return cols
+
+
+# True if m swaps x and y, ValueError if it does not keep rows upright.
+# rotation(90) leaves a cos of 6e-17, not 0.
+def _upright(m):
+    a, b, c, d = (abs(v) for v in m[:4])
+    if b + c <= SQUARE_TOLERANCE * (a + d):
+        return False
+    if a + d <= SQUARE_TOLERANCE * (b + c):
+        return True
+    raise ValueError('can not turn the rows of a column block other than by 90 degrees, they have no angle')
+
+
+# x, y, width and height of the box of a TEXT, see XcsText.encode()
+def _text_box(t):
+    w = t.aspect * len(t.text) * t.height
+    x = t.ox - w * ((t.org - 1) % 3) / 2
+    y = t.oy - t.height * int((t.org - 1) / 3) / 2
+    return x, y, w, t.height
+
+
+def _boxes(elements):
+    out = list()
+    for el in elements:
+        if el.type == 'TEXT':
+            out.append((*_text_box(el), el.angle))
+        else:
+            out.append((el.x, el.y, el.width, el.height, el.angle))
+    return np.asarray(out, dtype=float).reshape(-1, 5)
+
+
+# The sides of each box after the matrix are the columns of
+# [a c; b d] * R(angle). They must stay square, their lengths are the new
+# width and height and the turn of the first one the new angle.
+def _transform_boxes(elements, m):
+    a, b, c, d, e, f = m
+    x, y, w, h, angle = _boxes(elements).T
+    t = np.radians(angle)
+    co = np.cos(t)
+    si = np.sin(t)
+    ux, uy = a * co + c * si, b * co + d * si
+    vx, vy = -a * si + c * co, -b * si + d * co
+    su = np.hypot(ux, uy)
+    sv = np.hypot(vx, vy)
+
+    bad = np.abs(ux * vx + uy * vy) > SQUARE_TOLERANCE * su * sv
+    if bad.any():
+        el = elements[int(np.argmax(bad))]
+        raise ValueError(f'{el.id}: a {el.type} can not be skewed')
+    if a * d - b * c < 0:
+        for el in elements:
+            if el.type not in MIRROR_TYPES:
+                raise ValueError(f'{el.id}: a {el.type} can not be mirrored')
+
+    cx = x + w / 2
+    cy = y + h / 2
+    ncx = a * cx + c * cy + e
+    ncy = b * cx + d * cy + f
+    nw = w * su
+    nh = h * sv
+    nangle = np.degrees(np.arctan2(uy, ux))
+    rows = np.column_stack((ncx - nw / 2, ncy - nh / 2, nw, nh, nangle, su / sv)).tolist()
+    for el, (nx, ny, bw, bh, ba, stretch) in zip(elements, rows):
+        el.angle = ba
+        if el.type == 'TEXT':
+            el.aspect *= stretch
+            el.height = bh
+            el.ox = nx + bw * ((el.org - 1) % 3) / 2
+            el.oy = ny + bh * int((el.org - 1) / 3) / 2
+        else:
+            el.x, el.y, el.width, el.height = nx, ny, bw, bh
+
+
+# Places an element after its shape went through the linear part. o is
+# where its box was, the upper left of its drawing before and after.
+def _place(el, m, old, new):
+    a, b, c, d, e, f = m
+    ox = el.x - old[0]
+    oy = el.y - old[1]
+    el.x = new[0] + a * ox + c * oy + e
+    el.y = new[1] + b * ox + d * oy + f
+    el.width = new[2] - new[0]
+    el.height = new[3] - new[1]
+
+
+def _points(elements):
+    pts = [(p.x, p.y) for el in elements for p in el.points]
+    return np.asarray(pts, dtype=float).reshape(-1, 2)
+
+
+# rows of a in pieces of lengths counts as (xmin, ymin, xmax, ymax) rows
+def _piece_boxes(a, counts):
+    starts = np.cumsum(counts) - counts
+    lo = np.minimum.reduceat(a, starts, axis=0)
+    hi = np.maximum.reduceat(a, starts, axis=0)
+    return np.hstack((lo, hi)).tolist()
+
+
+def _linear(m, a):
+    return np.column_stack((m[0] * a[:, 0] + m[2] * a[:, 1], m[1] * a[:, 0] + m[3] * a[:, 1]))
+
+
+def _new_points(elements, pts):
+    xy = pts.tolist()
+    k = 0
+    for el in elements:
+        n = len(el.points)
+        el.points = [xt.XcsPnt(x, y) for x, y in xy[k:k + n]]
+        k += n
+
+
+def _transform_pens(elements, m):
+    elements = [el for el in elements if el.points]
+    if not elements:
+        return
+    counts = np.array([len(el.points) for el in elements])
+    old = _points(elements)
+    new = _linear(m, old)
+    for el, ob, nb in zip(elements, _piece_boxes(old, counts), _piece_boxes(new, counts)):
+        _place(el, m, ob, nb)
+    _new_points(elements, new + (m[4], m[5]))
+
+
+def _transform_paths(elements, m, precision):
+    numf = '%.' + str(precision) + 'f'
+    parsed = [_parse_path(el.dPath, numf) for el in elements]
+
+    nums = list()
+    pairs = list()
+    arcs = list()
+    sweeps = list()
+    for p in parsed:
+        k = len(nums)
+        nums += p.nums
+        pairs += [i + k for i in p.pairs]
+        arcs += [i + k for i in p.arcs]
+        sweeps += [i + k for i in p.sweeps]
+
+    v = np.asarray(nums, dtype=float)
+    pi = np.asarray(pairs, dtype=np.int64)
+    v[pi], v[pi + 1] = (m[0] * v[pi] + m[2] * v[pi + 1], m[1] * v[pi] + m[3] * v[pi + 1])
+    if arcs:
+        ai = np.asarray(arcs, dtype=np.int64)
+        v[ai], v[ai + 1], v[ai + 2] = _arc_params(m, v[ai], v[ai + 1], v[ai + 2])
+        if m[0] * m[3] - m[1] * m[2] < 0:
+            si = np.asarray(sweeps, dtype=np.int64)
+            v[si] = 1 - v[si]
+    vals = v.tolist()
+
+    # the new boxes of paths with only lines are the old end points
+    # through the matrix, all in one go
+    lines = [p.ends for p in parsed if not p.curves and p.ends]
+    if lines:
+        counts = np.array([len(ends) for ends in lines])
+        ends = np.asarray([pt for ends in lines for pt in ends], dtype=float)
+        line_boxes = iter(zip(_piece_boxes(ends, counts), _piece_boxes(_linear(m, ends), counts)))
+
+    k = 0
+    for el, p in zip(elements, parsed):
+        n = len(p.nums)
+        d = p.template % tuple(vals[k:k + n])
+        k += n
+        if p.curves:
+            old = _path_box(p, el.dPath)
+            new = _path_box(p, d)
+        elif p.ends:
+            old, new = next(line_boxes)
+        else:
+            old = new = None
+        el.dPath = d
+        if old is not None and new is not None:
+            _place(el, m, old, new)
+        else:
+            el.x, el.y = apply(m, el.x, el.y)
+
+    # points of a PATH are not drawn, they only go along
+    with_points = [el for el in elements if el.points]
+    if with_points:
+        _new_points(with_points, _linear(m, _points(with_points)))
+
+
+# -------------------------------------------------------------------------
+# Bounds
+
+# (n, 4) array of the xmin, ymin, xmax, ymax of each element on the canvas
+def element_boxes(elements, precision=3):
+    elements = list(elements)
+    out = np.empty((len(elements), 4))
+    boxes = [i for i, el in enumerate(elements) if el.type in BOX_TYPES]
+    if boxes:
+        x, y, w, h, angle = _boxes([elements[i] for i in boxes]).T
+        t = np.radians(angle)
+        co = np.abs(np.cos(t))
+        si = np.abs(np.sin(t))
+        circle = np.array([elements[i].type == 'CIRCLE' for i in boxes])
+        ex = np.where(circle, np.hypot(w * co, h * si), w * co + h * si) / 2
+        ey = np.where(circle, np.hypot(w * si, h * co), w * si + h * co) / 2
+        cx = x + w / 2
+        cy = y + h / 2
+        out[boxes] = np.column_stack((cx - ex, cy - ey, cx + ex, cy + ey))
+
+    numf = '%.' + str(precision) + 'f'
+    for i, el in enumerate(elements):
+        if el.type == 'LINE':
+            x1, y1 = el.p2.p.x, el.p2.p.y
+            out[i] = (min(el.x, x1), min(el.y, y1), max(el.x, x1), max(el.y, y1))
+        elif el.type in POINT_TYPES:
+            if el.type == 'PEN':
+                box = _piece_boxes(_points([el]), [len(el.points)])[0] if el.points else None
+            else:
+                box = _path_box(_parse_path(el.dPath, numf), el.dPath)
+            if box is None:
+                out[i] = (el.x, el.y, el.x, el.y)
+            else:
+                out[i] = (el.x, el.y, el.x + box[2] - box[0], el.y + box[3] - box[1])
+        elif el.type not in BOX_TYPES:
+            raise ValueError(f'no bounds for a {el.type}')
+    return out
+
+
+# (xmin, ymin, xmax, ymax) of all the elements
+def bounds(elements):
+    b = element_boxes(elements)
+    if len(b) == 0:
+        return None
+    return (*b[:, :2].min(axis=0).tolist(), *b[:, 2:].max(axis=0).tolist())
+
+
+# dict of groupTag to (xmin, ymin, xmax, ymax), '' for the elements not
+# in a group
+def group_bounds(elements):
+    elements = list(elements)
+    tags = dict()
+    codes = np.array([tags.setdefault(el.groupTag, len(tags)) for el in elements], dtype=np.int64)
+    b = element_boxes(elements)
+    lo = np.full((len(tags), 2), np.inf)
+    hi = np.full((len(tags), 2), -np.inf)
+    np.minimum.at(lo, codes, b[:, :2])
+    np.maximum.at(hi, codes, b[:, 2:])
+    return {tag: (*lo[k].tolist(), *hi[k].tolist()) for tag, k in tags.items()}
+
+
+def center(box):
+    return (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
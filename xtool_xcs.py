@@ -25,8 +25,15 @@
 #
 # See example in main() at the bottom of this file.
 
+import base64
+import io
 import json
+import math
+import operator
 import os
+import sys
+import time
+from array import array
 
 class XcsPnt:
     x = 0;
@@ -287,6 +294,69 @@ class XcsText(XcsPrim):
         d['style'] = self.style
         return d
 
+# A raster image, engraved line by line.
+#
+# png is the image as PNG bytes, or a function that returns an iterable
+# of PNG byte chunks, so a big image does not have to be held encoded.
+# xtool_bitmap.py makes them from image files. width and height are the
+# size on the canvas in mm.
+#
+# XcsSave() streams the base64 of the image into the file chunk by chunk,
+# see XcsTemplateEncode.write_canvas(). A plain json.dump() with XcsEncode
+# works too, it holds the whole base64 text while it encodes.
+class XcsBitmap(XcsPrim):
+    type = 'BITMAP'
+
+    def __init__(self, id, png, width, height):
+        XcsPrim.__init__(self)
+        self.id = id
+        self.png = png
+        self.width = width
+        self.height = height
+        self.isFill = True
+        self.colorInverted = False
+        self.grayValue = 0
+        self.filterList = list()
+
+    # density is in lines per mm, mode one of the xTool bitmap modes
+    def add_process(self, proc_type, power, speed, repeat, density=10, mode='dither'):
+        XcsProcess(self, proc_type, power, speed, repeat)
+        self.process.params[proc_type]['parameter']['customize'].update(
+            density = density, bitmapEngraveMode = mode)
+        return self
+
+    def png_chunks(self):
+        if callable(self.png):
+            return self.png()
+        return [self.png]
+
+    def base64_chunks(self):
+        yield 'data:image/png;base64,'
+        yield from base64_chunks(self.png_chunks())
+
+    def encode(self, data=None):
+        d = XcsPrim.encode(self)
+        d['base64'] = ''.join(self.base64_chunks()) if data is None else data
+        d['colorInverted'] = self.colorInverted
+        d['grayValue'] = self.grayValue
+        d['filterList'] = self.filterList
+        return d
+
+
+# base64 text of an iterable of byte chunks, in chunks. Leftover bytes
+# wait for the next chunk so the pieces join up to one base64 string.
+def base64_chunks(chunks):
+    rest = b''
+    for c in chunks:
+        c = rest + c
+        n = len(c) - len(c) % 3
+        rest = c[n:]
+        if n:
+            yield base64.b64encode(c[:n]).decode('ascii')
+    if rest:
+        yield base64.b64encode(rest).decode('ascii')
+
+
 class XcsHeadParam():
     name = 'customize'
     power = 0
@@ -330,10 +400,11 @@ class XcsCanvas():
         XcsCanvas.canvi.append(self)
         numcanvi = len(XcsCanvas.canvi)
         self.id = 'canvas' + str(numcanvi)
-        self.ids = list()
+        self.ids = set()
         self.nid = 0
         self.title = '{panel}' + str(numcanvi)
         self.elements = list()
+        self.columns = list()
         XcsCanvas.active_canvas = self
 
     def add_element(self, e):
@@ -341,39 +412,84 @@ class XcsCanvas():
         self.nid += 1
         if e.id == "":
             e.id = e.type
-        if e.id in self.ids:
-            while e.id + "__" + str(self.nid) in self.ids:
+        if e.id in self.ids or (self.columns and self.column_id(e.id)):
+            while (e.id + "__" + str(self.nid) in self.ids or
+                   (self.columns and self.column_id(e.id + "__" + str(self.nid)))):
                 self.nid += 1;
             e.id =  e.id + "__" + str(self.nid)
-        self.ids.append(e.id)
+        self.ids.add(e.id)
+        XcsCanvas.active_canvas = self
+        return self
+
+    # An XcsColumns block. Its rows come after the elements, the blocks in
+    # the order they are added. Row ids are the prefix of the block and
+    # the row number. All of those ids are the block's, rows added later
+    # too: a prefix whose ids an element or another block has gets a
+    # number added, and add_element() renames an element that would take
+    # one.
+    def add_columns(self, cols):
+        base = cols.prefix
+        n = len(self.columns)
+        while not self.free_prefix(cols.prefix):
+            cols.prefix = base + str(n) + '_'
+            n += 1
+        self.columns.append(cols)
         XcsCanvas.active_canvas = self
         return self
 
+    # True if no element or block has an id that is prefix and a number
+    def free_prefix(self, prefix):
+        for c in self.columns:
+            if prefix == c.prefix or _numbered(prefix, c.prefix) or _numbered(c.prefix, prefix):
+                return False
+        return not any(_numbered(i, prefix) for i in self.ids)
+
+    # True if id is a row id of a block
+    def column_id(self, id):
+        for c in self.columns:
+            if _numbered(id, c.prefix):
+                return True
+        return False
+
+    # the elements and then the rows of the blocks as elements
+    def all_elements(self):
+        yield from self.elements
+        for cols in self.columns:
+            yield from cols
+
     def canvi_encode():
         return dict(canvasId = XcsCanvas.active_canvas.id, canvas = XcsCanvas.canvi)
 
     def encode(self):
-        return dict(id = self.id, title = self.title, displays = self.elements)
+        displays = self.elements
+        if self.columns:
+            displays = list(self.all_elements())
+        return dict(id = self.id, title = self.title, displays = displays)
 
     def device_encode():
         canvas_ops = list()
-        null = 0
-
         for c in XcsCanvas.canvi:
-            laser_plane = dict(material = 0, thickness = null, diameter = null, perimeter = null)
-            mode = dict(material = 1, thickness = 3, LASER_PLANE = laser_plane)
-
             procmap = list()
             for e in c.elements:
                 if hasattr(e, 'process'):
                     procmap.append(list((e.id, e.process)))
+            for cols in c.columns:
+                procs = cols.process_objects()
+                for k, p in enumerate(cols.proc):
+                    if p >= 0:
+                        procmap.append(list((cols.id(k), procs[p])))
+            canvas_ops.append((c.id, XcsCanvas.device_op(procmap)))
+        return XcsCanvas.device(canvas_ops)
+
+    # processing of one canvas, procmap is a list of [element id, process]
+    def device_op(procmap):
+        null = 0
+        laser_plane = dict(material = 0, thickness = null, diameter = null, perimeter = null)
+        mode = dict(material = 1, thickness = 3, LASER_PLANE = laser_plane)
+        displays = dict(dataType = 'Map', value = procmap)
+        return dict(mode = "LASER_PLANE", data = mode, displays = displays)
 
-            displays = dict(dataType = 'Map', value = procmap)
-
-            canvas_op = dict(mode = "LASER_PLANE", data = mode, displays = displays)
-
-            canvas_ops.append((c.id, canvas_op))
-
+    def device(canvas_ops):
         device = dict()
         device['id'] = 'MD1'
         device['power'] = 10
@@ -382,6 +498,11 @@ class XcsCanvas():
         return dict(device = device)
 
 
+# True if s is prefix and a number
+def _numbered(s, prefix):
+    return s.startswith(prefix) and s[len(prefix):].isdecimal()
+
+
 class XcsEncode(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, XcsCanvas):
@@ -394,26 +515,709 @@ class XcsEncode(json.JSONEncoder):
             return obj.encode()
         return json.JSONEncoder.default(self, obj)
 
-def XcsSave(filename):
-    xcs = XcsCanvas.canvi_encode() 
 
-    # 3.9
-    #xcs = xcs | dict(version = "1.1.19", extId = "D1")
-    #xcs = xcs | XcsCanvas.device_encode()
+# -------------------------------------------------------------------------
+# Versions and templates
+#
+# XCS_VERSIONS has what goes in the file header for each xTool Creative
+# Space version we can write. Only 1.1.19 projects are known to load with
+# their processes, see the README. More versions go here once we know
+# what they need.
+#
+# XcsTemplateEncode writes a project the way json.dump() with XcsEncode
+# does, byte for byte, but faster. Most of an element is the same in
+# every element of a job: the type, scale, skew, pivot, offsets, colors,
+# group and so on. A template has all that already in json, only the
+# fields in TEMPLATE_FIELDS are formatted into it. Templates are made
+# from the elements as they turn up, one for each element type and set
+# of values of the other fields. The processes have templates the same
+# way. An element with a float in the other fields, of a type with no
+# templates or past TEMPLATE_VARIANTS goes through XcsEncode.
+#
+#    enc = xt.encoder('1.1.19')
+#    text = enc.element(rect)
+#    enc.write(outfile)          # the whole project, XcsSave() does this
+
+XCS_VERSIONS = {
+    '1.1.19': dict(extID = 'D1'),
+}
+XCS_VERSION = '1.1.19'
+
+# element types with templates, a new element of each
+TEMPLATE_TYPES = {
+    XcsRect: lambda: XcsRect('', XcsPnt(0, 0), XcsPnt(0, 0)),
+    XcsLine: lambda: XcsLine('', XcsPnt(0, 0), XcsPnt(0, 0)),
+    XcsCircle: lambda: XcsCircle('', XcsPnt(0, 0), XcsPnt(0, 0)),
+    XcsPen: lambda: XcsPen(''),
+    XcsPath: lambda: XcsPath(''),
+}
+
+# fields formatted into the templates, the others pick the template
+TEMPLATE_FIELDS = ('id', 'x', 'y', 'width', 'height', 'endPoint', 'points', 'controlPoints', 'dPath')
+
+# templates of each element type at most
+TEMPLATE_VARIANTS = 256
+
+# attributes of the fields not named like them
+_FIELD_ATTR = {'endPoint': 'p2.p'}
+_KEY_ATTR = {'scale': ('scale.p.x', 'scale.p.y'), 'skew': ('skew.p.x', 'skew.p.y'),
+             'pivot': ('pivot.p.x', 'pivot.p.y'), 'localSkew': ('localSkew.p.x', 'localSkew.p.y')}
+
+# what can pick a template. Not floats, 0.0 and -0.0 are the same key
+# but not the same json.
+_KEY_TYPES = {str, int, bool}
+
+_PROCESS_KEYS = {'materialType', 'processIgnore', 'parameter'}
+_CUSTOMIZE = {'customize'}
+
+# json text of a value by its type, the same as json.dumps() gives, but
+# nan and inf come out as python spells them
+_dumps = XcsEncode().encode
+_TEXT = {
+    str: json.encoder.encode_basestring_ascii,
+    float: float.__repr__,
+    int: int.__repr__,
+    bool: {True: 'true', False: 'false'}.__getitem__,
+}
+
+
+def _nonfinite(texts):
+    return 'nan' in texts or 'inf' in texts or '-inf' in texts
+
+
+# json text of a value, the same as json.dumps() gives
+def json_text(v):
+    s = _TEXT.get(type(v), _dumps)(v)
+    return s if not _nonfinite((s,)) else _dumps(v)
+
+
+def _point_text(p):
+    return '{"x": ' + json_text(p.x) + ', "y": ' + json_text(p.y) + '}'
+
+
+# points of pens and paths, mostly none
+def _list_text(v):
+    if not v:
+        return '[]'
+    if all(type(p) is XcsPnt for p in v):
+        return '[' + ', '.join(map(_point_text, v)) + ']'
+    return _dumps(v)
+
+
+_TEXT[XcsPnt] = _point_text
+_TEXT[list] = _list_text
+_TEXT[dict] = lambda v: '{}' if not v else _dumps(v)
+
+
+# Pieces of the json of obj around the strings that start with a '\0',
+# and those strings without it, in the order they are in the text.
+def _template(obj):
+    pieces = json.dumps(obj, cls=XcsEncode).split('"\\u0000')
+    names = list()
+    for n in range(1, len(pieces)):
+        name, rest = pieces[n].split('"', 1)
+        names.append(name)
+        pieces[n] = rest
+    return pieces, names
+
+
+def _format(pieces):
+    return '%s'.join(p.replace('%', '%%') for p in pieces)
+
+
+class XcsTemplateEncode():
+    def __init__(self, version=None):
+        version = version or XCS_VERSION
+        if version not in XCS_VERSIONS:
+            raise ValueError(f'can not write xTool Creative Space version {version},'
+                             f' only {", ".join(XCS_VERSIONS)}')
+        self.version = version
+        header = XCS_VERSIONS[version]
+        self.doc, names = _template(dict(canvasId = '\0canvasId', canvas = '\0canvas',
+                                         version = version, extID = header['extID'],
+                                         device = '\0device'))
+        self.canvas, names = _template(dict(id = '\0id', title = '\0title', displays = '\0displays'))
+        self.device, names = _template(XcsCanvas.device('\0ops')['device'])
+        self.op, names = _template(XcsCanvas.device_op('\0procmap'))
+
+        # per type: key getter, field getter, templates by key
+        self.templates = dict()
+        for cls, new in TEMPLATE_TYPES.items():
+            keys = list()
+            fields = list()
+            for k in cls.encode(new()):
+                if k in TEMPLATE_FIELDS:
+                    fields.append(_FIELD_ATTR.get(k, k))
+                elif k != 'type':
+                    keys.extend(_KEY_ATTR.get(k, (k,)))
+            keys.append('groupTag')
+            self.templates[cls] = (operator.attrgetter(*keys), operator.attrgetter(*fields), dict(),
+                                   tuple(f for f in cls.encode(new()) if f in TEMPLATE_FIELDS))
+        self.processes = dict()
+
+    # template of an element, None if it goes through XcsEncode
+    def element_template(self, e):
+        t = self.templates.get(type(e))
+        if t is None:
+            return None
+        keys, fields, variants, names = t
+        k = keys(e)
+        types = tuple(map(type, k))
+        if not _KEY_TYPES.issuperset(types):
+            return None
+        template = variants.get((k, types))
+        if template is None:
+            if len(variants) >= TEMPLATE_VARIANTS:
+                return None
+            d = type(e).encode(e)
+            for f in TEMPLATE_FIELDS:
+                if f in d:
+                    d[f] = '\0' + f
+            template = variants[(k, types)] = _format(_template(d)[0])
+        return template
+
+    # json text of an element
+    def element(self, e):
+        template = self.element_template(e)
+        if template is None:
+            return _dumps(e)
+        v = [_TEXT.get(type(f), _dumps)(f) for f in self.templates[type(e)][1](e)]
+        if _nonfinite(v):
+            return _dumps(e)
+        return template % tuple(v)
+
+    # json texts of the rows of an XcsColumns block, in lists of at most
+    # COLUMN_CHUNK. Made from the columns, one template per group.
+    def columns(self, cols):
+        proto = cols.blank()
+        templates = list()
+        for tag in cols.groups:
+            proto.groupTag = tag
+            templates.append(self.element_template(proto))
+        if None in templates or self.templates[cols.cls][3] != COLUMN_FIELDS:
+            for start in range(0, len(cols), COLUMN_CHUNK):
+                yield [self.element(cols[k]) for k in range(start, min(start + COLUMN_CHUNK, len(cols)))]
+            return
+
+        idq = json_text(cols.prefix)[:-1]
+        x, y, w, h, group = cols.x, cols.y, cols.width, cols.height, cols.group
+        text = float.__repr__
+        if not all(math.isfinite(sum(c)) for c in (x, y, w, h)):
+            text = json_text
+        for start in range(0, len(cols), COLUMN_CHUNK):
+            stop = min(start + COLUMN_CHUNK, len(cols))
+            yield [templates[g] % (idq + str(k) + '"', text(a), text(b), text(c), text(d))
+                   for k, g, a, b, c, d in zip(range(start, stop), group[start:stop], x[start:stop],
+                                               y[start:stop], w[start:stop], h[start:stop])]
+
+    # json texts of the [element id, process] pairs of the rows of a block
+    def column_processes(self, cols):
+        texts = [_dumps(p) for p in cols.process_objects()]
+        idq = '[' + json_text(cols.prefix)[:-1]
+        return [idq + str(k) + '", ' + texts[p] + ']' for k, p in enumerate(cols.proc) if p >= 0]
+
+    # json text of the [element id, process] pair of an element
+    def process(self, e):
+        proc = e.process
+        if type(proc) is XcsProcess and len(proc.params) == 1:
+            q = proc.params.get(proc.selected)
+            if q is not None and q.keys() == _PROCESS_KEYS and q['parameter'].keys() == _CUSTOMIZE:
+                c = q['parameter']['customize']
+                k = (proc.selected, q['materialType'], q['processIgnore'], proc.primitive.type,
+                     proc.primitive.isFill) + tuple(c)
+                types = tuple(map(type, k))
+                if _KEY_TYPES.issuperset(types):
+                    t = self.processes.get((k, types))
+                    if t is None and len(self.processes) < TEMPLATE_VARIANTS:
+                        t = self.processes[(k, types)] = self.process_template(proc)
+                    if t is not None:
+                        v = [_TEXT.get(type(f), _dumps)(f) for f in (e.id, *map(c.__getitem__, t[1]))]
+                        if not _nonfinite(v):
+                            return t[0] % tuple(v)
+        return _dumps([e.id, proc])
+
+    # template of the [element id, process] pair and the parameters in it
+    def process_template(self, proc):
+        q = proc.params[proc.selected]
+        c = q['parameter']['customize']
+        d = proc.encode()
+        d['data'] = {proc.selected: dict(q, parameter = dict(customize = {k: '\0' + k for k in c}))}
+        pieces, names = _template(['\0id', d])
+        return _format(pieces), names[1:]
+
+    # writes the project of all canvases
+    def write(self, out):
+        doc = self.doc
+        out.write(doc[0])
+        out.write(json_text(XcsCanvas.active_canvas.id))
+        out.write(doc[1])
+        out.write('[')
+        for n, c in enumerate(XcsCanvas.canvi):
+            if n:
+                out.write(', ')
+            self.write_canvas(c, out)
+        out.write(']')
+        out.write(doc[2])
+
+        ops = list()
+        for c in XcsCanvas.canvi:
+            procmap = [self.process(e) for e in c.elements if hasattr(e, 'process')]
+            for cols in c.columns:
+                procmap += self.column_processes(cols)
+            op = self.op[0] + '[' + ', '.join(procmap) + ']' + self.op[1]
+            ops.append('[' + json_text(c.id) + ', ' + op + ']')
+        out.write(self.device[0] + '[' + ', '.join(ops) + ']' + self.device[1])
+        out.write(doc[3])
+
+    def write_canvas(self, c, out):
+        canvas = self.canvas
+        out.write(canvas[0] + json_text(c.id) + canvas[1] + json_text(c.title) + canvas[2] + '[')
+        # elements are written in runs, a bitmap on its own
+        run = list()
+        written = False
+        for e in c.elements:
+            if not isinstance(e, XcsBitmap):
+                run.append(self.element(e))
+                continue
+            if run:
+                out.write((', ' if written else '') + ', '.join(run))
+                run = list()
+                written = True
+            if written:
+                out.write(', ')
+            # the image goes straight to out, chunk by chunk
+            head, tail = json.dumps(e.encode('\0'), cls=XcsEncode).split('"\\u0000"')
+            out.write(head + '"')
+            for b in e.base64_chunks():
+                out.write(b)
+            out.write('"' + tail)
+            written = True
+        if run:
+            out.write((', ' if written else '') + ', '.join(run))
+            written = True
+        for cols in c.columns:
+            for rows in self.columns(cols):
+                out.write((', ' if written else '') + ', '.join(rows))
+                written = True
+        out.write(']' + canvas[3])
+
+
+_encoders = dict()
+
+
+# the encoder of a version, its templates are made once
+def encoder(version=None):
+    version = version or XCS_VERSION
+    enc = _encoders.get(version)
+    if enc is None:
+        enc = _encoders[version] = XcsTemplateEncode(version)
+    return enc
+
+
+# -------------------------------------------------------------------------
+# Columnar elements
+#
+# A canvas of a million rectangles would be a million XcsRect objects.
+# XcsColumns keeps elements of one type in columns instead, one array
+# each for x, y, width and height, and the index of the process and of
+# the group of each row. Rows that share a process or a group share one
+# copy of it.
+#
+#    cols = xt.XcsColumns(xt.XcsRect)
+#    cut = cols.process_id('VECTOR_CUTTING', 100, 6, 1)
+#    cols.grid(0, 0, 1000, 1000, 1.5, 1.5, 1, 1, process=cut)
+#    canvas.add_columns(cols)
+#    xt.XcsSave('grid')
+#
+# XcsSave() and device_encode() write the rows straight from the columns,
+# the text is the same as for the elements one by one.
+#
+# The rows are read-only as elements: cols[k] makes the element of row k,
+# a copy, changing it does not change the row. Change the columns, or
+# move the rows with xtool_transform.transform_rows(). xtool_transform
+# and xtool_path.split_elements() take the blocks on their own, next to
+# the elements of a canvas.
+
+# element types that can be kept in columns, they have these fields
+COLUMN_TYPES = (XcsRect, XcsCircle)
+COLUMN_FIELDS = ('id', 'x', 'y', 'width', 'height')
+
+# rows of a block written at a time
+COLUMN_CHUNK = 65536
+
+
+class XcsColumns():
+    def __init__(self, cls=XcsRect, prefix=None):
+        if cls not in COLUMN_TYPES:
+            raise ValueError(f'can not keep {cls.__name__} elements in columns,'
+                             f' only {", ".join(c.__name__ for c in COLUMN_TYPES)}')
+        self.cls = cls
+        self.prefix = cls.type.lower() + '_' if prefix is None else prefix
+        self.x = array('d')
+        self.y = array('d')
+        self.width = array('d')
+        self.height = array('d')
+        # -1 for no process
+        self.proc = array('i')
+        self.group = array('I')
+        self.processes = list()
+        self.process_index = dict()
+        self.groups = ['']
+        self.group_index = {'': 0}
+        self._process_objects = None
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError('XcsColumns row out of range')
+        e = self.blank()
+        e.id = self.id(k)
+        e.x = self.x[k]
+        e.y = self.y[k]
+        e.width = self.width[k]
+        e.height = self.height[k]
+        e.groupTag = self.groups[self.group[k]]
+        if self.proc[k] >= 0:
+            e.add_process(*self.processes[self.proc[k]])
+        return e
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+
+    # rows start to stop as a block of their own, numbered from 0, with
+    # the same processes and groups
+    def take(self, start, stop):
+        cols = XcsColumns(self.cls, self.prefix)
+        for name in ('x', 'y', 'width', 'height', 'proc', 'group'):
+            setattr(cols, name, getattr(self, name)[start:stop])
+        cols.processes = list(self.processes)
+        cols.process_index = dict(self.process_index)
+        cols.groups = list(self.groups)
+        cols.group_index = dict(self.group_index)
+        return cols
+
+    def id(self, k):
+        return self.prefix + str(k)
+
+    # an element of the type with nothing set
+    def blank(self):
+        return TEMPLATE_TYPES[self.cls]()
+
+    def process_id(self, proc_type, power, speed, repeat):
+        key = (proc_type, power, speed, repeat)
+        n = self.process_index.get(key)
+        if n is None:
+            n = self.process_index[key] = len(self.processes)
+            self.processes.append(key)
+            self._process_objects = None
+        return n
+
+    def group_id(self, tag):
+        n = self.group_index.get(tag)
+        if n is None:
+            n = self.group_index[tag] = len(self.groups)
+            self.groups.append(tag)
+        return n
+
+    # one XcsProcess per process, shared by its rows
+    def process_objects(self):
+        if self._process_objects is None or len(self._process_objects) != len(self.processes):
+            self._process_objects = [XcsProcess(self.blank(), *p) for p in self.processes]
+        return self._process_objects
+
+    def add(self, x, y, width, height, process=None, group=''):
+        return self.extend((x,), (y,), (width,), (height,), process, group)
+
+    # Adds rows. x, y, width and height are sequences, numpy arrays or a
+    # number for all rows. process is a process_id() or a tuple for
+    # process_id(), for all rows or a sequence of ids, group a tag for
+    # all rows.
+    def extend(self, x, y, width, height, process=None, group=''):
+        cols = (x, y, width, height)
+        sizes = set(len(c) for c in cols if hasattr(c, '__len__'))
+        if hasattr(process, '__len__') and not isinstance(process, tuple):
+            sizes.add(len(process))
+        if len(sizes) > 1:
+            raise ValueError(f'columns of different lengths {sorted(sizes)}')
+        n = sizes.pop() if sizes else 1
+
+        if process is None:
+            procs = array('i', [-1]) * n
+        elif isinstance(process, tuple):
+            procs = array('i', [self.process_id(*process)]) * n
+        elif hasattr(process, '__len__'):
+            procs = array('i', map(int, process))
+        else:
+            procs = array('i', [int(process)]) * n
+        if n and not -1 <= min(procs) <= max(procs) < len(self.processes):
+            raise ValueError(f'process ids must be from process_id(), there are {len(self.processes)}')
+
+        for col, v in zip((self.x, self.y, self.width, self.height), cols):
+            _extend_column(col, v, n)
+        self.proc.extend(procs)
+        self.group.extend(array('I', [self.group_id(group)]) * n)
+        return self
+
+    # nx by ny elements of width by height, the first at x, y, the others
+    # dx apart along x and dy apart along y
+    def grid(self, x, y, nx, ny, dx, dy, width, height, process=None, group=''):
+        xs = array('d', [x + i * dx for i in range(nx)]) * ny
+        ys = array('d', [y + j * dy for j in range(ny) for i in range(nx)])
+        return self.extend(xs, ys, width, height, process, group)
+
+
+def _extend_column(col, v, n):
+    if not hasattr(v, '__len__'):
+        col.extend(array('d', [v]) * n)
+    elif isinstance(v, array) and v.typecode == 'd':
+        col.extend(v)
+    elif hasattr(v, 'dtype'):
+        # numpy, without a copy through python floats
+        col.frombytes(v.astype('float64').tobytes())
+    else:
+        col.extend(map(float, v))
+
+
+# -------------------------------------------------------------------------
+# Profiling
+#
+# Where does the time go? Phases are timed with time.perf_counter_ns()
+# and count the memory blocks python allocated while they ran.
+#
+#    prof = xt.profile_start()
+#    with xt.phase('my phase'):
+#        ...
+#    xt.XcsSave('test')          # has a phase of its own
+#    print(xt.profile_stop().report())
+#
+# Modes:
+#   time         timers and allocated blocks, cheap
+#   tracemalloc  also the peak of traced memory in each phase
+#   cprofile     also a cProfile of everything, top functions in the report
+#
+# wrap() puts a timer on module functions, e.g. the number formatting in
+# xtool_path, and unwrap() takes it off again. Times are inclusive, a
+# phase inside a phase counts in both.
+#
+# With no profiler running phase() costs next to nothing.
+
+PROFILE_MODES = ('time', 'tracemalloc', 'cprofile')
+
+class _NoPhase:
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+
+_no_phase = _NoPhase()
+
 
-    # for 3.6
-    xcs['version'] = '1.1.19'
-    xcs['extID'] = 'D1'
-    xcs['device'] = XcsCanvas.device_encode()['device']
+class _Phase:
+    __slots__ = ('prof', 'name', 't0', 'b0', 'frame')
 
+    def __init__(self, prof, name):
+        self.prof = prof
+        self.name = name
+
+    def __enter__(self):
+        self.prof.enter(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.prof.exit(self)
+        return False
+
+
+class XcsProfiler:
+    active = None
+
+    def __init__(self, mode='time'):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f'profile mode {mode} is not one of {PROFILE_MODES}')
+        self.mode = mode
+        # name : [calls, ns, blocks, peak bytes]
+        self.phases = dict()
+        self.stack = list()
+        self.wrapped = list()
+        self.cprofile = None
+        self.cprofile_text = ''
+        self.tracemalloc_top = list()
+        self.t0 = None
+        self.seconds = 0.0
+
+    def start(self):
+        if self.mode == 'tracemalloc':
+            import tracemalloc
+            tracemalloc.start()
+        elif self.mode == 'cprofile':
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        self.t0 = time.perf_counter_ns()
+        XcsProfiler.active = self
+        return self
+
+    def stop(self):
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        self.seconds = (time.perf_counter_ns() - self.t0) / 1e9
+        if XcsProfiler.active is self:
+            XcsProfiler.active = None
+        self.unwrap()
+        if self.cprofile is not None:
+            import io
+            import pstats
+            out = io.StringIO()
+            pstats.Stats(self.cprofile, stream=out).sort_stats('cumulative').print_stats(25)
+            self.cprofile_text = out.getvalue()
+        if self.mode == 'tracemalloc':
+            import tracemalloc
+            snap = tracemalloc.take_snapshot()
+            self.tracemalloc_top = [(str(st.traceback), st.size, st.count)
+                                    for st in snap.statistics('lineno')[:15]]
+            tracemalloc.stop()
+        return self
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def enter(self, ph):
+        ph.frame = None
+        if self.mode == 'tracemalloc':
+            import tracemalloc
+            cur, peak = tracemalloc.get_traced_memory()
+            if self.stack and self.stack[-1].frame is not None:
+                self.stack[-1].frame[1] = max(self.stack[-1].frame[1], peak)
+            tracemalloc.reset_peak()
+            ph.frame = [cur, 0]
+        self.stack.append(ph)
+        ph.b0 = sys.getallocatedblocks()
+        ph.t0 = time.perf_counter_ns()
+
+    def exit(self, ph):
+        t = time.perf_counter_ns() - ph.t0
+        b = sys.getallocatedblocks() - ph.b0
+        self.stack.pop()
+        peak = 0
+        if ph.frame is not None:
+            import tracemalloc
+            cur, p = tracemalloc.get_traced_memory()
+            p = max(p, ph.frame[1])
+            peak = p - ph.frame[0]
+            if self.stack and self.stack[-1].frame is not None:
+                self.stack[-1].frame[1] = max(self.stack[-1].frame[1], p)
+        self.add(ph.name, t, b, peak)
+
+    def add(self, name, ns, blocks=0, peak=0):
+        r = self.phases.get(name)
+        if r is None:
+            r = self.phases[name] = [0, 0, 0, 0]
+        r[0] += 1
+        r[1] += ns
+        r[2] += blocks
+        r[3] = max(r[3], peak)
+
+    # time each call of the named functions of module
+    def wrap(self, module, names):
+        for name in names:
+            f = getattr(module, name)
+            setattr(module, name, self._timed(f, module.__name__.split('.')[-1] + '.' + name))
+            self.wrapped.append((module, name, f))
+        return self
+
+    def _timed(self, f, name):
+        add = self.add
+        clock = time.perf_counter_ns
+        def timed(*args, **kwargs):
+            t0 = clock()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                add(name, clock() - t0)
+        return timed
+
+    def unwrap(self):
+        for module, name, f in reversed(self.wrapped):
+            setattr(module, name, f)
+        self.wrapped = list()
+
+    def encode(self):
+        phases = list()
+        for name, (calls, ns, blocks, peak) in self.phases.items():
+            phases.append(dict(name = name, calls = calls, seconds = ns / 1e9,
+                               blocks = blocks, peak_bytes = peak))
+        d = dict(mode = self.mode, seconds = self.seconds, phases = phases)
+        if self.cprofile_text:
+            d['cprofile'] = self.cprofile_text
+        if self.tracemalloc_top:
+            d['tracemalloc'] = [dict(where = w, bytes = b, count = c)
+                                for w, b, c in self.tracemalloc_top]
+        return d
+
+    def report(self):
+        lines = [f'profile: {self.mode}, {self.seconds:.3f} s',
+                 f'{"phase":28s} {"calls":>9s} {"seconds":>9s} {"us/call":>9s} {"%":>6s} {"blocks":>9s}'
+                 + (f' {"peak kB":>9s}' if self.mode == 'tracemalloc' else '')]
+        for name, (calls, ns, blocks, peak) in self.phases.items():
+            pct = 100.0 * ns / 1e9 / self.seconds if self.seconds else 0.0
+            line = (f'{name[:28]:28s} {calls:9d} {ns / 1e9:9.3f} {ns / 1e3 / calls:9.1f}'
+                    f' {pct:6.1f} {blocks:9d}')
+            if self.mode == 'tracemalloc':
+                line += f' {peak / 1024:9.1f}'
+            lines.append(line)
+        if self.tracemalloc_top:
+            lines.append('largest allocations:')
+            for w, b, c in self.tracemalloc_top:
+                lines.append(f'  {b / 1024:9.1f} kB {c:8d} blocks  {w}')
+        if self.cprofile_text:
+            lines.append(self.cprofile_text)
+        return '\n'.join(lines)
+
+    # the report as json, and the cProfile stats for snakeviz and
+    # friends next to it as path + '.prof'
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.encode(), f, indent=1)
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(path + '.prof')
+
+
+def profile_start(mode='time'):
+    return XcsProfiler(mode).start()
+
+
+def profile_stop():
+    prof = XcsProfiler.active
+    if prof is not None:
+        prof.stop()
+    return prof
+
+
+def phase(name):
+    prof = XcsProfiler.active
+    if prof is None:
+        return _no_phase
+    return prof.phase(name)
+
+
+# Saves all canvases as filename.xcs for an xTool Creative Space version,
+# one of XCS_VERSIONS, XCS_VERSION if None. filename '-' returns the json.
+def XcsSave(filename, version=None):
+    enc = encoder(version)
     print(f'XcsSave filename = {filename}')
 
-    if filename == '-':
-       return json.dumps(xcs, cls=XcsEncode)
-    else:
-       outfile = open(filename + '.xcs', mode='w')
-       json.dump(xcs, outfile, cls=XcsEncode)
-       return
+    with phase('XcsSave encode'):
+        if filename == '-':
+            out = io.StringIO()
+            enc.write(out)
+            return out.getvalue()
+        with open(filename + '.xcs', mode='w') as outfile:
+            enc.write(outfile)
 
 
 def point(x,y):
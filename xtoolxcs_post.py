@@ -30,14 +30,12 @@
 # start from refactored_linxcnc_post.y
 
 import argparse
+import functools
+import os
 
-from typing import Any, Dict, Union
+from typing import Any, Dict, Tuple, Union
 
 import Path.Post.UtilsArguments as PostUtilsArguments
-import Path.Post.UtilsExport as PostUtilsExport
-import Path
-from FreeCAD import Vector
-from importlib import reload
 
 import UtilsXTool
 
@@ -108,6 +106,7 @@ def init_arguments(
     # Add any argument definitions that are not shared with all other
     # postprocessors here.
     #
+    UtilsXTool.init_xtool_arguments(parser, values)
     return parser
 
 
@@ -115,34 +114,64 @@ def init_arguments(
 # Creating global variables and using functions to modify them
 # is useful for being able to test things later.
 #
-global_values: Values = {}
-exec("reload(%s)" % "UtilsXTool")
-UtilsXTool.init_xtool_values(global_values)
+# FreeCAD imports this module whenever the post dialog is populated, so
+# nothing is built at import time. The values, the parsers and TOOLTIP_ARGS
+# are made on first use and kept. Module __getattr__ hands them out under
+# their old global names.
+#
+# Set XTOOL_POST_RELOAD in the environment to reload the helper modules
+# each time FreeCAD reloads this post, handy while editing them.
+#
+if os.environ.get("XTOOL_POST_RELOAD"):
+    UtilsXTool.reload_modules()
 
-global_argument_defaults: Dict[str, bool] = {}
-init_argument_defaults(global_argument_defaults)
 
-global_arguments_visible: Dict[str, bool] = {}
-init_arguments_visible(global_arguments_visible)
+@functools.lru_cache(maxsize=None)
+def get_values() -> Values:
+    values: Values = {}
+    UtilsXTool.init_xtool_values(values)
+    return values
 
-global_parser: Parser = init_arguments(
-    global_values, global_argument_defaults, global_arguments_visible
-)
 
-#
-# The TOOLTIP_ARGS value is created from the help information about the arguments.
-#
-TOOLTIP_ARGS: str = global_parser.format_help()
-#
-# Create another parser just to get a list of all possible arguments
-# that may be output using --output_all_arguments.
-#
-global_all_arguments_visible: Dict[str, bool] = {}
-for k in iter(global_arguments_visible):
-    global_all_arguments_visible[k] = True
-global_all_visible: Parser = init_arguments(
-    global_values, global_argument_defaults, global_all_arguments_visible
-)
+@functools.lru_cache(maxsize=None)
+def get_parsers() -> Tuple[Parser, Parser]:
+    """Build the parser and the parser with all arguments visible."""
+    argument_defaults: Dict[str, bool] = {}
+    init_argument_defaults(argument_defaults)
+
+    arguments_visible: Dict[str, bool] = {}
+    init_arguments_visible(arguments_visible)
+
+    parser: Parser = init_arguments(get_values(), argument_defaults, arguments_visible)
+    #
+    # Create another parser just to get a list of all possible arguments
+    # that may be output using --output_all_arguments.
+    #
+    all_arguments_visible: Dict[str, bool] = {}
+    for k in iter(arguments_visible):
+        all_arguments_visible[k] = True
+    all_visible: Parser = init_arguments(get_values(), argument_defaults, all_arguments_visible)
+
+    return parser, all_visible
+
+
+@functools.lru_cache(maxsize=None)
+def get_tooltip_args() -> str:
+    """The TOOLTIP_ARGS value is created from the help information about the arguments."""
+    return get_parsers()[0].format_help()
+
+
+def __getattr__(name: str) -> Any:
+    if name == "TOOLTIP_ARGS":
+        return get_tooltip_args()
+    if name == "global_values":
+        return get_values()
+    if name == "global_parser":
+        return get_parsers()[0]
+    if name == "global_all_visible":
+        return get_parsers()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def export(objectslist, filename: str, argstring: str) -> str:
     """Postprocess the objects in objectslist to filename."""
@@ -150,6 +179,9 @@ def export(objectslist, filename: str, argstring: str) -> str:
     args: Union[str, argparse.Namespace]
     flag: bool
 
+    global_values = get_values()
+    global_parser, global_all_visible = get_parsers()
+
     (flag, args) = PostUtilsArguments.process_shared_arguments(
         global_values, global_parser, argstring, global_all_visible, filename
     )
@@ -158,13 +190,14 @@ def export(objectslist, filename: str, argstring: str) -> str:
     #
     # Process any additional arguments here
     #
+    UtilsXTool.process_xtool_arguments(global_values, args)
 
     #
     # Update the global variables that might have been modified
     # while processing the arguments.
     #
 
-    gcode, xcs =  UtilsXTool.export_xtool(global_values, objectslist, filename)
+    gcode, xcs =  UtilsXTool.export_shared(global_values, objectslist, filename)
 
     #print(gcode)
     #print(xcs)